@@ -1,14 +1,109 @@
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from operator import itemgetter
+
 from django.contrib import admin
-from django.db.models import Sum
+from django.contrib.admin.views.main import ChangeList
+from django.db.models import DecimalField, Exists, OuterRef, Q, Sum
+from django.db.models.functions import Coalesce
 from django.utils.html import escape
 from django.utils.safestring import mark_safe
+from django.utils.text import smart_split, unescape_string_literal
 from mptt.admin import MPTTModelAdmin
 
 from hordak.models import TransactionCsvImport, TransactionCsvImportColumn
+from hordak.utilities.currency import Balance
+from hordak.utilities.pagination import EstimatedCountPaginator
 
 from . import models
 
 
+def get_account_totals(accounts) -> dict:
+    """Get the credits, debits & balance of each account, including child accounts
+
+    All totals are calculated using a single query, which only reads the legs of the
+    given accounts and their descendants. This is used to populate each page of the
+    account admin without aggregating over the entire ledger.
+
+    Returns:
+        dict: Mapping of account ID to a dict of ``credits``, ``debits`` and ``balance``,
+        each a :class:`~hordak.utilities.currency.Balance`.
+    """
+    accounts = list(accounts)
+    ranges = Q()
+    for account in accounts:
+        ranges |= Q(
+            account__tree_id=account.tree_id,
+            account__lft__gte=account.lft,
+            account__lft__lte=account.rght,
+        )
+
+    # Per-account totals, sorted by tree position: {tree_id: [(lft, credits, debits)]}
+    by_tree = defaultdict(list)
+    if accounts:
+        rows = (
+            models.Leg.objects.filter(ranges)
+            .order_by()
+            .values("account__tree_id", "account__lft", "currency")
+            .annotate(
+                credits=Coalesce(Sum("credit"), 0, output_field=DecimalField()),
+                debits=Coalesce(Sum("debit"), 0, output_field=DecimalField()),
+            )
+        )
+        for row in rows:
+            by_tree[row["account__tree_id"]].append(
+                (
+                    row["account__lft"],
+                    Balance(row["credits"], row["currency"]),
+                    Balance(row["debits"], row["currency"]),
+                )
+            )
+        for tree in by_tree.values():
+            tree.sort(key=itemgetter(0))
+    lfts = {tree_id: [row[0] for row in tree] for tree_id, tree in by_tree.items()}
+
+    totals = {}
+    for account in accounts:
+        # Descendants are those accounts with lft between our lft & rght
+        tree = by_tree[account.tree_id]
+        start = bisect_left(lfts.get(account.tree_id, []), account.lft)
+        end = bisect_right(lfts.get(account.tree_id, []), account.rght)
+        credits = sum((credit for _, credit, _ in tree[start:end]), Balance())
+        debits = sum((debit for _, _, debit in tree[start:end]), Balance())
+        totals[account.pk] = {
+            "credits": credits,
+            "debits": debits,
+            "balance": (credits - debits) * account.sign,
+        }
+    return totals
+
+
+class _AccountLabel(object):
+    def __init__(self, account):
+        self.pk = account.pk
+        self.label = account.get_label(getattr(account, "balance", None))
+
+    def __str__(self):
+        return self.label
+
+
+class AccountChangeList(ChangeList):
+    """Changelist which only calculates account totals for the current page"""
+
+    def get_results(self, request):
+        super().get_results(request)
+        self.result_list = list(self.result_list)
+        totals = get_account_totals(self.result_list)
+        for account in self.result_list:
+            for name, value in totals[account.pk].items():
+                setattr(account, name, value)
+
+    def get_ordering_field(self, field_name):
+        if field_name == "balance" and self.model_admin.balance_ordering_field:
+            return self.model_admin.balance_ordering_field
+        return super().get_ordering_field(field_name)
+
+
 @admin.register(models.Account)
 class AccountAdmin(MPTTModelAdmin):
     list_display = (
@@ -27,38 +122,40 @@ class AccountAdmin(MPTTModelAdmin):
         "name",
     )
     list_filter = ("type",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    #: Balances are calculated per page, so cannot be sorted upon. Set this to the
+    #: name of an (indexed) field holding each account's balance to allow sorting
+    #: by balance.
+    balance_ordering_field = None
+
+    def get_changelist(self, request, **kwargs):
+        return AccountChangeList
+
+    def get_sortable_by(self, request):
+        sortable_by = [
+            name
+            for name in super().get_sortable_by(request)
+            if name not in ("balance", "credits", "debits")
+        ]
+        if self.balance_ordering_field:
+            sortable_by.append("balance")
+        return sortable_by
+
+    def action_checkbox(self, obj):
+        # Django labels the checkbox with str(account), which would
+        # query the balance of every account on the page
+        return super().action_checkbox(_AccountLabel(obj))
 
-    @admin.display(ordering="balance")
     def balance(self, obj):
-        if obj.balance is None:
-            return "-"
         return obj.balance
 
-    balance.admin_order_field = "balance"
-
-    @admin.display(ordering="credits")
     def credits(self, obj):
-        if obj.credits is None:
-            return "-"
         return obj.credits
 
-    @admin.display(ordering="debits")
     def debits(self, obj):
-        if obj.debits is None:
-            return "-"
         return obj.debits
 
-    def get_queryset(self, *args, **kwargs):
-        return (
-            super()
-            .get_queryset(*args, **kwargs)
-            .with_balances_orm()
-            .annotate(
-                credits=Sum("legs__credit"),
-                debits=Sum("legs__debit"),
-            )
-        )
-
     @admin.display(ordering="full_code")
     def code_(self, obj):
         if obj.is_leaf_node():
@@ -78,6 +175,24 @@ class LegInline(admin.TabularInline):
     extra = 0
 
 
+class TransactionChangeList(ChangeList):
+    """Changelist which only loads the transaction view for the current page"""
+
+    def get_results(self, request):
+        super().get_results(request)
+        self.result_list = list(self.result_list)
+        views = (
+            models.TransactionView.objects.defer(
+                "credit_account_ids", "debit_account_ids"
+            )
+            .filter(parent_id__in=[transaction.pk for transaction in self.result_list])
+            .in_bulk()
+        )
+        for transaction in self.result_list:
+            # Transactions without legs do not appear in the view
+            transaction._view = views.get(transaction.pk)
+
+
 @admin.register(models.Transaction)
 class TransactionAdmin(admin.ModelAdmin):
     list_display = [
@@ -90,22 +205,58 @@ class TransactionAdmin(admin.ModelAdmin):
         "date",
         "description",
     ]
-    # Use the TransactionView database view for balances
-    list_select_related = ("view",)
     readonly_fields = ("timestamp",)
+    # Searches are handled by get_search_results()
     search_fields = ("legs__account__name",)
     inlines = [LegInline]
     # Allowing sorting will really harm the performance of the TransactionView database view
     sortable_by = []
+    # Matches the hordak_transaction_date_id index
+    ordering = ("-date", "-id")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_changelist(self, request, **kwargs):
+        return TransactionChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        """Find transactions with legs in accounts matching every search term
+
+        Matching account IDs (including those of any child accounts) are fetched
+        first. Transactions are then filtered using an ``EXISTS`` on the legs
+        table, which avoids both a join and the need for ``DISTINCT``.
+        """
+        for term in smart_split(search_term):
+            if term.startswith(('"', "'")) and term[0] == term[-1]:
+                term = unescape_string_literal(term)
+            accounts = models.Account.objects.filter(name__icontains=term)
+            account_ids = list(
+                models.Account.objects.get_queryset_descendants(
+                    accounts, include_self=True
+                ).values_list("pk", flat=True)
+            )
+            if not account_ids:
+                return queryset.none(), False
+            legs = models.Leg.objects.filter(
+                transaction_id=OuterRef("pk"), account_id__in=account_ids
+            )
+            queryset = queryset.filter(Exists(legs))
+        return queryset, False
 
     def debited_accounts(self, obj):
-        return ", ".join(obj.view.debit_account_names) or None
+        if obj._view is None:
+            return None
+        return ", ".join(obj._view.debit_account_names) or None
 
     def credited_accounts(self, obj):
-        return ", ".join(obj.view.credit_account_names) or None
+        if obj._view is None:
+            return None
+        return ", ".join(obj._view.credit_account_names) or None
 
     def amount(self, obj):
-        return obj.view.amount
+        if obj._view is None:
+            return None
+        return obj._view.amount
 
 
 @admin.register(models.Leg)
@@ -124,6 +275,9 @@ class LegAdmin(admin.ModelAdmin):
         "account__type",
         "transaction__description",
     )
+    ordering = ("-id",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(models.LegView)
@@ -155,6 +309,8 @@ class LegViewAdmin(admin.ModelAdmin):
         "account__type",
     )
     list_select_related = ("account",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     readonly_fields = [
         "uuid",
         "transaction",
@@ -207,6 +363,29 @@ class StatementImportAdmin(admin.ModelAdmin):
 @admin.register(models.StatementLine)
 class StatementLineAdmin(admin.ModelAdmin):
     readonly_fields = ("timestamp",)
+    # Matches the hordak_statementline_date_id index
+    ordering = ("-date", "-id")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(models.StatementRule)
+class StatementRuleAdmin(admin.ModelAdmin):
+    list_display = [
+        "description_pattern",
+        "min_amount",
+        "max_amount",
+        "to_account_name",
+        "priority",
+    ]
+    list_select_related = ["to_account"]
+    ordering = ("priority", "id")
+    raw_id_fields = ("to_account",)
+
+    @admin.display(ordering="to_account__name", description="To account")
+    def to_account_name(self, obj):
+        # Avoids querying the balance of each account, as str(account) would
+        return obj.to_account.name
 
 
 class TransactionImportColumnInline(admin.TabularInline):
@@ -1,16 +1,34 @@
 import datetime
+from decimal import Decimal
 from uuid import UUID
 
 import requests
 from django.db import transaction
+from django.db.models import Q
 
 from hordak.models.core import StatementImport, StatementLine
+from hordak.utilities.statement_import import (
+    iter_batches,
+    statement_line_fingerprint,
+)
+
+#: Number of statement lines to check for & create in each query
+BATCH_SIZE = 1000
 
 
 @transaction.atomic()
-def do_import(token, account_uuid, bank_account, since=None):
+def do_import(token, account_uuid, bank_account, since=None, batch_size=BATCH_SIZE):
     """Import data from teller.io
 
+    Lines which have already been imported (as determined by their teller.io ID)
+    are skipped. Existing lines are found using one query per ``batch_size`` lines,
+    and new lines are created using ``bulk_create()``.
+
+    As ``bulk_create()`` does not call ``StatementLine.save()``, fingerprints are
+    calculated here. As per :meth:`StatementLine.make_fingerprint`, each new line
+    is given the lowest ordinal not already used by an identical line, so lines
+    imported from teller.io are skipped by later CSV imports of the same statement.
+
     Returns the created StatementImport
     """
     response = requests.get(
@@ -26,24 +44,59 @@ def do_import(token, account_uuid, bank_account, since=None):
         bank_account=bank_account,
     )
 
+    lines = {}
     for line_data in data:
+        date = datetime.date.fromisoformat(line_data["date"])
+        if since and date < since:
+            continue
+
         uuid = UUID(hex=line_data["id"])
-        uuid_f = str(uuid)
-        if StatementLine.objects.filter(uuid=uuid_f):
+        if uuid in lines:
             continue
 
         description = ", ".join(
             filter(bool, [line_data["counterparty"], line_data["description"]])
         )
-        date = datetime.date(*map(int, line_data["date"].split("-")))
-
-        if not since or date >= since:
-            StatementLine.objects.create(
-                uuid=uuid,
-                date=line_data["date"],
-                statement_import=statement_import,
-                amount=line_data["amount"],
-                type=line_data["type"],
-                description=description,
-                source_data=line_data,
+        lines[uuid] = StatementLine(
+            uuid=uuid,
+            date=date,
+            statement_import=statement_import,
+            amount=Decimal(line_data["amount"]),
+            type=line_data["type"],
+            description=description,
+            source_data=line_data,
+        )
+
+    for batch in iter_batches(lines.values(), batch_size):
+        # Load the lines with these IDs, and the fingerprints of any lines
+        # which could be identical to those in the batch
+        existing_uuids = set()
+        used_fingerprints = set()
+        existing = StatementLine.objects.filter(
+            Q(uuid__in=[line.uuid for line in batch])
+            | Q(
+                statement_import__bank_account=bank_account,
+                date__in={line.date for line in batch},
+                amount__in={line.amount for line in batch},
+                fingerprint__isnull=False,
             )
+        ).values_list("uuid", "fingerprint")
+        for uuid, fingerprint in existing:
+            existing_uuids.add(uuid)
+            used_fingerprints.add(fingerprint)
+
+        new_lines = [line for line in batch if line.uuid not in existing_uuids]
+        for line in new_lines:
+            ordinal = 0
+            while True:
+                line.fingerprint = statement_line_fingerprint(
+                    bank_account.pk, line.date, line.amount, line.description, ordinal
+                )
+                if line.fingerprint not in used_fingerprints:
+                    break
+                ordinal += 1
+            used_fingerprints.add(line.fingerprint)
+
+        StatementLine.objects.bulk_create(new_lines)
+
+    return statement_import
@@ -21,3 +21,24 @@ DECIMAL_PLACES = getattr(settings, "HORDAK_DECIMAL_PLACES", 2)
 MAX_DIGITS = getattr(settings, "HORDAK_MAX_DIGITS", 20)
 
 UUID_DEFAULT = getattr(settings, "HORDAK_UUID_DEFAULT", uuid4)
+
+ACCOUNT_CHOICE_BALANCES = getattr(settings, "HORDAK_ACCOUNT_CHOICE_BALANCES", True)
+
+TASK_RUNNER = getattr(
+    settings, "HORDAK_TASK_RUNNER", "hordak.utilities.tasks.SynchronousTaskRunner"
+)
+
+STATEMENT_READERS = getattr(
+    settings,
+    "HORDAK_STATEMENT_READERS",
+    [
+        "hordak.utilities.statement_readers.OfxReader",
+        "hordak.utilities.statement_readers.Camt053Reader",
+        "hordak.utilities.statement_readers.QifReader",
+        "hordak.utilities.statement_readers.CsvReader",
+    ],
+)
+
+IMPORT_PROCESSES = getattr(settings, "HORDAK_IMPORT_PROCESSES", None)
+
+IMPORT_TIMEOUT = getattr(settings, "HORDAK_IMPORT_TIMEOUT", 1800)
@@ -0,0 +1,22 @@
+from django import forms
+
+from hordak.utilities.export import EXPORT_FORMATS
+
+
+class ExportForm(forms.Form):
+    format = forms.ChoiceField(
+        choices=[(f, f) for f in EXPORT_FORMATS], required=False, initial="csv"
+    )
+    date_from = forms.DateField(required=False)
+    date_to = forms.DateField(required=False)
+
+    def clean_format(self):
+        return self.cleaned_data["format"] or "csv"
+
+    def clean(self):
+        cleaned_data = super(ExportForm, self).clean()
+        date_from = cleaned_data.get("date_from")
+        date_to = cleaned_data.get("date_to")
+        if date_from and date_to and date_from > date_to:
+            raise forms.ValidationError("date_from must not be after date_to")
+        return cleaned_data
@@ -0,0 +1,148 @@
+from typing import Callable, List, Optional
+
+from django import forms
+from django.forms.models import ModelChoiceIterator
+from django.utils.html import conditional_escape
+from django.utils.safestring import mark_safe
+from mptt.forms import TreeNodeChoiceFieldMixin
+
+from hordak import defaults
+from hordak.utilities.currency import Balance
+
+
+class AccountChoiceCache(object):
+    """Share account choices between fields and forms
+
+    Rendering an account choice field requires a database query. When the same
+    choices are rendered many times (for example, in every form of a formset) a
+    single ``AccountChoiceCache`` can be given to each field so the query is
+    only run once. Create a new cache for each request.
+    """
+
+    def __init__(self):
+        self._choices = {}
+
+    def get(self, key, fetch: Callable) -> List[tuple]:
+        """Get the choices for ``key``, calling ``fetch()`` if they are not yet cached"""
+        if key not in self._choices:
+            self._choices[key] = list(fetch())
+        return self._choices[key]
+
+
+class AccountChoiceIterator(ModelChoiceIterator):
+    """Choice iterator which fetches balances in the same query as the accounts"""
+
+    def __init__(self, field):
+        super(AccountChoiceIterator, self).__init__(field)
+        self.queryset = field.get_choice_queryset()
+
+    def __iter__(self):
+        if self.field.choice_cache is None:
+            return super(AccountChoiceIterator, self).__iter__()
+        return iter(self.field.choice_cache.get(self.get_cache_key(), self._fetch))
+
+    def __len__(self):
+        if self.field.choice_cache is None:
+            return super(AccountChoiceIterator, self).__len__()
+        return len(list(self))
+
+    def __bool__(self):
+        if self.field.choice_cache is None:
+            return super(AccountChoiceIterator, self).__bool__()
+        return bool(list(self))
+
+    def _fetch(self):
+        return super(AccountChoiceIterator, self).__iter__()
+
+    def get_cache_key(self):
+        sql, params = self.queryset.query.sql_with_params()
+        return (
+            type(self.field),
+            sql,
+            repr(params),
+            self.field.to_field_name,
+            self.field.empty_label,
+        )
+
+
+class AccountChoiceFieldMixin(object):
+    """Render account choices without running a balance query per account
+
+    Args:
+        show_balances (bool): Include the balance of leaf accounts in each label.
+            Balances are annotated onto the choice queryset, and are therefore fetched
+            in a single query. Defaults to the ``HORDAK_ACCOUNT_CHOICE_BALANCES`` setting.
+        choice_cache (AccountChoiceCache): Share the choices with other fields
+            using the same cache.
+    """
+
+    iterator = AccountChoiceIterator
+
+    def __init__(
+        self,
+        queryset,
+        *args,
+        show_balances: Optional[bool] = None,
+        choice_cache: Optional[AccountChoiceCache] = None,
+        **kwargs
+    ):
+        self.show_balances = show_balances
+        self.choice_cache = choice_cache
+        super(AccountChoiceFieldMixin, self).__init__(queryset, *args, **kwargs)
+
+    def get_choice_queryset(self):
+        """Get the queryset used to render the choices"""
+        show_balances = self.show_balances
+        if show_balances is None:
+            show_balances = defaults.ACCOUNT_CHOICE_BALANCES
+        if self.queryset is None or not show_balances:
+            return self.queryset
+        return self.queryset.with_balances(to_field_name="choice_balance")
+
+    def label_from_instance(self, obj):
+        balance = getattr(obj, "choice_balance", None)
+        if balance is not None:
+            # Show all of the account's currencies, as per str(account). Accounts
+            # without legs are given a zero balance in the default currency by
+            # the database, which we therefore drop.
+            balance = (balance if balance else Balance()) + obj._zero_balance()
+        return obj.get_label(balance)
+
+
+class AccountChoiceField(AccountChoiceFieldMixin, forms.ModelChoiceField):
+    """A ``ModelChoiceField`` for accounts
+
+    See :class:`AccountChoiceFieldMixin` for the additional arguments.
+    """
+
+    pass
+
+
+class AccountTreeChoiceField(
+    AccountChoiceFieldMixin, TreeNodeChoiceFieldMixin, forms.ModelChoiceField
+):
+    """A ``TreeNodeChoiceField`` for accounts
+
+    See :class:`AccountChoiceFieldMixin` for the additional arguments.
+    """
+
+    def label_from_instance(self, obj):
+        label = super(AccountTreeChoiceField, self).label_from_instance(obj)
+        return mark_safe(
+            self._get_level_indicator(obj) + " " + conditional_escape(label)
+        )
+
+
+def share_account_choices(form, choice_cache: Optional[AccountChoiceCache] = None):
+    """Use a single choice cache for all account fields on ``form``
+
+    Returns:
+        AccountChoiceCache: The cache used. A new cache is created if ``choice_cache``
+        is not provided.
+    """
+    if choice_cache is None:
+        choice_cache = AccountChoiceCache()
+    for field in form.fields.values():
+        if isinstance(field, AccountChoiceFieldMixin):
+            field.choice_cache = choice_cache
+    return choice_cache
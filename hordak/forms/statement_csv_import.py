@@ -26,6 +26,7 @@ class TransactionCsvImportForm(forms.ModelForm):
         obj = super(TransactionCsvImportForm, self).save()
         if not exists:
             obj.create_columns()
+            obj.detect_date_format()
         return obj
 
 
@@ -4,9 +4,14 @@ from django.db import transaction
 from django.forms import BaseInlineFormSet, inlineformset_factory
 from djmoney.forms import MoneyField
 from moneyed import Money
-from mptt.forms import TreeNodeChoiceField
 
 from hordak.defaults import CURRENCIES, DECIMAL_PLACES, DEFAULT_CURRENCY, MAX_DIGITS
+from hordak.forms.fields import (
+    AccountChoiceCache,
+    AccountChoiceField,
+    AccountTreeChoiceField,
+    share_account_choices,
+)
 from hordak.models import Account, AccountType, Leg, Transaction
 
 
@@ -16,15 +21,18 @@ class SimpleTransactionForm(forms.ModelForm):
     This only allows the creation of transactions with two legs. This also uses
     :meth:`Account.transfer_to()`.
 
+    Both account fields share their choices, so the accounts are only
+    fetched once. Pass ``account_choice_cache`` to share them with other forms.
+
     See Also:
 
         * :meth:`hordak.models.Account.transfer_to()`.
     """
 
-    debit_account = TreeNodeChoiceField(
+    debit_account = AccountTreeChoiceField(
         queryset=Account.objects.all(), to_field_name="uuid"
     )
-    credit_account = TreeNodeChoiceField(
+    credit_account = AccountTreeChoiceField(
         queryset=Account.objects.all(), to_field_name="uuid"
     )
     amount = MoneyField(max_digits=MAX_DIGITS, decimal_places=DECIMAL_PLACES)
@@ -34,7 +42,9 @@ class SimpleTransactionForm(forms.ModelForm):
         fields = ["amount", "debit_account", "credit_account", "date", "description"]
 
     def __init__(self, *args, **kwargs):
+        account_choice_cache = kwargs.pop("account_choice_cache", None)
         super().__init__(*args, **kwargs)
+        share_account_choices(self, account_choice_cache)
 
         # Limit currency choices if setup
         default_currency = DEFAULT_CURRENCY
@@ -98,7 +108,7 @@ class LegForm(forms.ModelForm):
 
     Attributes:
 
-        account (TreeNodeChoiceField): Choose an account the leg will interact with
+        account (AccountTreeChoiceField): Choose an account the leg will interact with
         description (forms.CharField): Optional description/notes for this leg
         amount (MoneyField): The amount for this leg.
             Positive values indicate money coming into the transaction,
@@ -109,7 +119,7 @@ class LegForm(forms.ModelForm):
         This is a `ModelForm` for the :class:`Leg model <hordak.models.Leg>`.
     """
 
-    account = TreeNodeChoiceField(Account.objects.all(), to_field_name="uuid")
+    account = AccountTreeChoiceField(Account.objects.all(), to_field_name="uuid")
     description = forms.CharField(required=False)
     amount = MoneyField(
         required=True, max_digits=MAX_DIGITS, decimal_places=DECIMAL_PLACES
@@ -121,7 +131,9 @@ class LegForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         self.statement_line = kwargs.pop("statement_line", None)
+        account_choice_cache = kwargs.pop("account_choice_cache", None)
         super(LegForm, self).__init__(*args, **kwargs)
+        share_account_choices(self, account_choice_cache)
 
     def clean_amount(self):
         amount = self.cleaned_data["amount"]
@@ -147,12 +159,19 @@ class LegForm(forms.ModelForm):
 class BaseLegFormSet(BaseInlineFormSet):
     def __init__(self, **kwargs):
         self.statement_line = kwargs.pop("statement_line")
+        # All forms share the same account choices
+        self.account_choice_cache = (
+            kwargs.pop("account_choice_cache", None) or AccountChoiceCache()
+        )
         self.currency = self.statement_line.statement_import.bank_account.currencies[0]
         super(BaseLegFormSet, self).__init__(**kwargs)
 
     def get_form_kwargs(self, index):
         kwargs = super(BaseLegFormSet, self).get_form_kwargs(index)
-        kwargs.update(statement_line=self.statement_line)
+        kwargs.update(
+            statement_line=self.statement_line,
+            account_choice_cache=self.account_choice_cache,
+        )
         if index == 0:
             kwargs.update(
                 initial=dict(
@@ -185,11 +204,11 @@ LegFormSet = inlineformset_factory(
 
 
 class CurrencyTradeForm(forms.Form):
-    source_account = forms.ModelChoiceField(
+    source_account = AccountChoiceField(
         queryset=Account.objects.filter(children__isnull=True), to_field_name="uuid"
     )
     source_amount = MoneyField(max_digits=MAX_DIGITS, decimal_places=DECIMAL_PLACES)
-    trading_account = forms.ModelChoiceField(
+    trading_account = AccountChoiceField(
         queryset=Account.objects.filter(
             children__isnull=True, type=AccountType.trading
         ),
@@ -198,7 +217,7 @@ class CurrencyTradeForm(forms.Form):
         "This account must support both the source and destination currency. If none exist "
         "perhaps create one.",
     )
-    destination_account = forms.ModelChoiceField(
+    destination_account = AccountChoiceField(
         queryset=Account.objects.filter(children__isnull=True), to_field_name="uuid"
     )
     destination_amount = MoneyField(
@@ -206,6 +225,11 @@ class CurrencyTradeForm(forms.Form):
     )
     description = forms.CharField(widget=forms.Textarea, required=False)
 
+    def __init__(self, *args, **kwargs):
+        account_choice_cache = kwargs.pop("account_choice_cache", None)
+        super(CurrencyTradeForm, self).__init__(*args, **kwargs)
+        share_account_choices(self, account_choice_cache)
+
     def clean(self):
         cleaned_data = super(CurrencyTradeForm, self).clean()
         if self.errors:
@@ -264,3 +288,34 @@ class CurrencyTradeForm(forms.Form):
             debit=destination_amount,
         )
         return transaction
+
+
+class StatementLineFilterForm(forms.Form):
+    """Filter the statement lines listed by ``TransactionsReconcileView``
+
+    Only unreconciled lines are listed, unless ``reconciled`` is checked.
+    """
+
+    account = AccountChoiceField(
+        queryset=Account.objects.filter(is_bank_account=True),
+        to_field_name="uuid",
+        required=False,
+        show_balances=False,
+    )
+    date_from = forms.DateField(required=False)
+    date_to = forms.DateField(required=False)
+    reconciled = forms.BooleanField(required=False, label="Include reconciled lines")
+
+    def filter(self, queryset):
+        """Filter a ``StatementLine`` queryset using any valid fields of this form"""
+        self.is_valid()
+        data = self.cleaned_data
+        if not data.get("reconciled"):
+            queryset = queryset.filter(transaction=None)
+        if data.get("account"):
+            queryset = queryset.filter(statement_import__bank_account=data["account"])
+        if data.get("date_from"):
+            queryset = queryset.filter(date__gte=data["date_from"])
+        if data.get("date_to"):
+            queryset = queryset.filter(date__lte=data["date_to"])
+        return queryset
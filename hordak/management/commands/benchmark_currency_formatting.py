@@ -0,0 +1,58 @@
+import timeit
+from decimal import Decimal
+
+import babel.numbers
+from django.core.management.base import BaseCommand
+from moneyed import Money
+
+from hordak.utilities.formatting import format_monies, get_current_locale
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the speed of Hordak's cached currency formatting with "
+        "formatting every value using babel"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--count",
+            type=int,
+            default=10_000,
+            help="How many values to format",
+        )
+        parser.add_argument(
+            "--currency",
+            default="EUR",
+            help="Currency to format the values in",
+        )
+
+    def handle(self, *args, **options):
+        count = options["count"]
+        monies = [
+            Money(Decimal(i) / 7, options["currency"])
+            for i in range(-count // 2, count // 2)
+        ]
+        locale = get_current_locale()
+
+        def _babel():
+            return [
+                babel.numbers.format_currency(
+                    m.amount, currency=m.currency.code, locale=locale
+                )
+                for m in monies
+            ]
+
+        def _hordak():
+            return format_monies(monies, locale=locale)
+
+        if _babel() != _hordak():
+            self.stderr.write("Warning: Formatted values differ from babel output")
+
+        babel_time = min(timeit.repeat(_babel, number=1, repeat=3))
+        hordak_time = min(timeit.repeat(_hordak, number=1, repeat=3))
+
+        self.stdout.write(f"Formatted {count} values using locale {locale}")
+        self.stdout.write(f"babel:  {babel_time:.3f}s")
+        self.stdout.write(f"hordak: {hordak_time:.3f}s")
+        self.stdout.write(f"Speedup: {babel_time / hordak_time:.1f}x")
@@ -8,6 +8,7 @@ from django.db import transaction as db_transaction
 from moneyed import Money
 
 from hordak.models import Account, Leg, Transaction
+from hordak.utilities.watermark import ledger_changed
 
 
 class Command(BaseCommand):
@@ -78,6 +79,10 @@ def _create_many(debit: Account, credit: Account, count: int):
         with db_transaction.atomic():
             Transaction.objects.bulk_create(transactions)
             Leg.objects.bulk_create(legs)
+            ledger_changed(
+                account_ids=[debit.pk, credit.pk],
+                max_leg_id=max((leg.pk or 0 for leg in legs), default=0),
+            )
         sys.stdout.write(f"{round((total_created / count) * 100, 1)}% ")
         sys.stdout.flush()
 
@@ -0,0 +1,89 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from hordak.models import Account
+from hordak.utilities.export import (
+    DEFAULT_CHUNK_SIZE,
+    EXPORT_FORMATS,
+    iter_account_statement,
+    iter_general_ledger,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Export the general ledger (or the statement for a single account) "
+        "as CSV or NDJSON, including opening, running and closing balances"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--account",
+            help="Only export the account with this full code or UUID",
+        )
+        parser.add_argument(
+            "--format",
+            choices=list(EXPORT_FORMATS),
+            default="csv",
+            help="Output format",
+        )
+        parser.add_argument(
+            "--date-from",
+            type=_date,
+            help="Export legs on or after this date (YYYY-MM-DD)",
+        )
+        parser.add_argument(
+            "--date-to",
+            type=_date,
+            help="Export legs on or before this date (YYYY-MM-DD)",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help="Number of legs to read from the database at a time",
+        )
+        parser.add_argument(
+            "--output",
+            "-o",
+            help="File to write to. Defaults to stdout",
+        )
+
+    def handle(self, *args, **options):
+        kwargs = dict(
+            date_from=options["date_from"],
+            date_to=options["date_to"],
+            chunk_size=options["chunk_size"],
+        )
+        if options["account"]:
+            rows = iter_account_statement(_get_account(options["account"]), **kwargs)
+        else:
+            rows = iter_general_ledger(**kwargs)
+
+        serialise = EXPORT_FORMATS[options["format"]][0]
+        if options["output"]:
+            with open(options["output"], "w", newline="") as f:
+                f.writelines(serialise(rows))
+        else:
+            for line in serialise(rows):
+                self.stdout.write(line, ending="")
+
+
+def _date(value):
+    date = parse_date(value)
+    if not date:
+        raise ValueError(value)
+    return date
+
+
+def _get_account(value):
+    account = Account.objects.filter(full_code=value).first()
+    if account is None:
+        try:
+            account = Account.objects.filter(uuid=value).first()
+        except ValidationError:
+            account = None
+    if account is None:
+        raise CommandError("Account not found: {}".format(value))
+    return account
@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction as db_transaction
+
+from hordak.management.commands.export_ledger import _get_account
+from hordak.models import StatementLine
+from hordak.utilities.reconciliation import (
+    link_statement_lines,
+    match_statement_lines,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconcile statement lines to existing transactions of the same amount "
+        "and a similar date & description"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--account",
+            help="Only reconcile lines for the bank account with this full code or UUID",
+        )
+        parser.add_argument(
+            "--date-window",
+            type=int,
+            default=3,
+            help="Maximum number of days between the line and the transaction",
+        )
+        parser.add_argument(
+            "--min-similarity",
+            type=float,
+            default=0.0,
+            help="Minimum similarity of the descriptions, from 0 to 1",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            default=False,
+            help="Report matches without reconciling any lines",
+        )
+
+    def handle(self, *args, **options):
+        lines = StatementLine.objects.all()
+        if options["account"]:
+            lines = lines.filter(
+                statement_import__bank_account=_get_account(options["account"])
+            )
+
+        with db_transaction.atomic():
+            result = match_statement_lines(
+                lines,
+                date_window=options["date_window"],
+                min_similarity=options["min_similarity"],
+            )
+            if not options["dry_run"]:
+                link_statement_lines(result.matches)
+
+        self.stdout.write(
+            "Matched: {}  Ambiguous: {}  Unmatched: {}".format(
+                len(result.matches), len(result.ambiguous), len(result.unmatched)
+            )
+        )
+        for line_id, transaction_ids in sorted(result.ambiguous.items()):
+            self.stdout.write(
+                "Ambiguous line {}: transactions {}".format(
+                    line_id, ", ".join(map(str, transaction_ids))
+                )
+            )
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 04:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hordak", "0054_check_debit_credit_positive"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="statementline",
+            index=models.Index(
+                fields=["date", "id"], name="hordak_statementline_date_id"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(
+                fields=["date", "id"], name="hordak_transaction_date_id"
+            ),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hordak", "0055_transaction_statementline_date_id_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LedgerWatermark",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "tree_id",
+                    models.PositiveIntegerField(unique=True, verbose_name="tree ID"),
+                ),
+                (
+                    "max_leg_id",
+                    models.BigIntegerField(default=0, verbose_name="max leg ID"),
+                ),
+                ("version", models.BigIntegerField(default=0, verbose_name="version")),
+            ],
+            options={
+                "verbose_name": "ledger watermark",
+            },
+        ),
+    ]
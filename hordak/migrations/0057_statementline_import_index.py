@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hordak", "0056_ledgerwatermark"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="statementline",
+            index=models.Index(
+                fields=["statement_import", "date", "amount"],
+                name="hordak_statementline_import",
+            ),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-19 05:48
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hordak", "0057_statementline_import_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="transactioncsvimport",
+            name="progress",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, verbose_name="rows processed"
+            ),
+        ),
+        migrations.AddField(
+            model_name="transactioncsvimport",
+            name="result",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                editable=False,
+                encoder=django.core.serializers.json.DjangoJSONEncoder,
+                help_text="The result of the most recent dry run or import",
+                verbose_name="result",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="transactioncsvimport",
+            name="state",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("uploaded", "Uploaded, ready to import"),
+                    ("checking", "Checking data"),
+                    ("checked", "Data checked, ready to import"),
+                    ("importing", "Importing"),
+                    ("done", "Import complete"),
+                    ("failed", "Import failed"),
+                ],
+                default="pending",
+                max_length=20,
+                verbose_name="state",
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("hordak", "0058_transactioncsvimport_progress"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="statementline",
+            name="fingerprint",
+            field=models.CharField(
+                blank=True,
+                editable=False,
+                max_length=64,
+                null=True,
+                verbose_name="fingerprint",
+            ),
+        ),
+    ]
@@ -0,0 +1,87 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:08
+import hashlib
+from collections import Counter
+from decimal import Decimal
+
+from django.db import migrations
+
+BATCH_SIZE = 2000
+
+
+# Frozen copies of hordak.utilities.statement_import.normalise_description() &
+# statement_line_fingerprint(), so later changes to them do not alter this migration
+
+
+def _normalise_description(description):
+    return " ".join(description.split()).casefold()
+
+
+def _fingerprint(bank_account_id, date, amount, description, ordinal):
+    value = "\x1f".join(
+        [
+            str(bank_account_id),
+            date.isoformat(),
+            "{:f}".format(Decimal(amount).normalize()),
+            _normalise_description(description),
+            str(ordinal),
+        ]
+    )
+    return hashlib.sha256(value.encode("utf8")).hexdigest()
+
+
+def backfill_fingerprints(apps, schema_editor):
+    """Set the fingerprint of existing statement lines
+
+    Identical lines within a bank account are numbered in order of ID. Lines
+    are read in order of bank account & date, so only the lines for a single
+    day are counted at once, and are updated in batches of BATCH_SIZE.
+    """
+    StatementLine = apps.get_model("hordak", "StatementLine")
+    db_alias = schema_editor.connection.alias
+
+    lines = (
+        StatementLine.objects.using(db_alias)
+        .order_by("statement_import__bank_account_id", "date", "id")
+        .values_list(
+            "id", "statement_import__bank_account_id", "date", "amount", "description"
+        )
+    )
+    ordinals = Counter()
+    current_day = None
+    batch = []
+    for pk, bank_account_id, date, amount, description in lines.iterator(
+        chunk_size=BATCH_SIZE
+    ):
+        if (bank_account_id, date) != current_day:
+            current_day = (bank_account_id, date)
+            ordinals.clear()
+
+        key = (amount, _normalise_description(description))
+        fingerprint = _fingerprint(
+            bank_account_id, date, amount, description, ordinals[key]
+        )
+        ordinals[key] += 1
+
+        batch.append(StatementLine(id=pk, fingerprint=fingerprint))
+        if len(batch) >= BATCH_SIZE:
+            StatementLine.objects.using(db_alias).bulk_update(batch, ["fingerprint"])
+            batch = []
+
+    if batch:
+        StatementLine.objects.using(db_alias).bulk_update(batch, ["fingerprint"])
+
+
+def clear_fingerprints(apps, schema_editor):
+    StatementLine = apps.get_model("hordak", "StatementLine")
+    db_alias = schema_editor.connection.alias
+    StatementLine.objects.using(db_alias).update(fingerprint=None)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("hordak", "0059_statementline_fingerprint"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_fingerprints, clear_fingerprints),
+    ]
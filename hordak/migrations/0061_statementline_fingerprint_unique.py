@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("hordak", "0060_statementline_fingerprint_backfill"),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="statementline",
+            constraint=models.UniqueConstraint(
+                fields=("fingerprint",), name="hordak_statementline_fingerprint"
+            ),
+        ),
+    ]
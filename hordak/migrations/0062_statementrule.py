@@ -0,0 +1,85 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:20
+
+import uuid
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+import hordak.models.statement_rules
+from hordak.defaults import DECIMAL_PLACES, MAX_DIGITS
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hordak", "0061_statementline_fingerprint_unique"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StatementRule",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "uuid",
+                    models.UUIDField(
+                        default=uuid.uuid4, editable=False, verbose_name="uuid"
+                    ),
+                ),
+                (
+                    "description_pattern",
+                    models.CharField(
+                        help_text="A regular expression to search for in the description (ignoring case)",
+                        max_length=255,
+                        validators=[hordak.models.statement_rules.validate_pattern],
+                        verbose_name="description pattern",
+                    ),
+                ),
+                (
+                    "min_amount",
+                    models.DecimalField(
+                        blank=True,
+                        decimal_places=DECIMAL_PLACES,
+                        max_digits=MAX_DIGITS,
+                        null=True,
+                        verbose_name="minimum amount",
+                    ),
+                ),
+                (
+                    "max_amount",
+                    models.DecimalField(
+                        blank=True,
+                        decimal_places=DECIMAL_PLACES,
+                        max_digits=MAX_DIGITS,
+                        null=True,
+                        verbose_name="maximum amount",
+                    ),
+                ),
+                (
+                    "priority",
+                    models.PositiveIntegerField(default=0, verbose_name="priority"),
+                ),
+                (
+                    "to_account",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="statement_rules",
+                        to="hordak.account",
+                        verbose_name="to account",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "statementRule",
+                "ordering": ["priority", "id"],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 06:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hordak", "0062_statementrule"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="statementline",
+            index=models.Index(
+                condition=models.Q(("transaction", None)),
+                fields=["date", "id"],
+                name="hordak_stmtline_unrec",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="statementline",
+            index=models.Index(
+                condition=models.Q(("transaction", None)),
+                fields=["statement_import", "date", "id"],
+                name="hordak_stmtline_unrec_import",
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-19 07:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("hordak", "0063_statementline_unreconciled_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="transactioncsvimport",
+            name="progress_updated",
+            field=models.DateTimeField(
+                blank=True, editable=False, null=True, verbose_name="progress updated"
+            ),
+        ),
+    ]
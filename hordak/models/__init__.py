@@ -1,3 +1,5 @@
 from .core import *  # noqa
 from .db_views import *  # noqa
 from .statement_csv_import import *  # noqa
+from .statement_rules import *  # noqa
+from .watermark import *  # noqa
@@ -23,12 +23,12 @@ Additionally, there are models which related to the import of external bank stat
 
 import warnings
 from datetime import date
-from typing import Tuple
+from typing import List, Optional, Tuple
 
 from django.db import connection, models
 from django.db import transaction
 from django.db import transaction as db_transaction
-from django.db.models import Case, DecimalField, F, JSONField, Sum, When
+from django.db.models import Case, DecimalField, F, JSONField, Q, Sum, When
 from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
@@ -48,6 +48,10 @@ from hordak.defaults import (
 from hordak.utilities.currency import Balance
 from hordak.utilities.db_functions import GetBalance
 from hordak.utilities.dreprecation import deprecated
+from hordak.utilities.statement_import import (
+    normalise_description,
+    statement_line_fingerprint,
+)
 
 #: Debit
 DEBIT = "debit"
@@ -77,6 +81,7 @@ class AccountQuerySet(models.QuerySet):
         to_field_name="balance",
         as_of: date = None,
         as_of_leg_id: int = None,
+        raw: bool = False,
     ):
         """Annotate the account queryset with account balances
 
@@ -90,13 +95,18 @@ class AccountQuerySet(models.QuerySet):
         to ``None`` (the default). This is because the underlying custom database function
         can avoid a join.
 
+        Specify ``raw=True`` to receive each balance as a tuple of
+        ``(amount, currency_code)`` pairs rather than as a :class:`Balance`.
+        This skips the creation of ``Money`` objects, which is noticeably
+        faster when listing a large number of accounts.
+
         Example:
 
             >>> # Will execute in a single database query
             >>> for account in Account.objects.with_balances():
             >>>     print(account.balance)
         """
-        field = GetBalance(F("id"), as_of=as_of, as_of_leg_id=as_of_leg_id)
+        field = GetBalance(F("id"), as_of=as_of, as_of_leg_id=as_of_leg_id, raw=raw)
         return self.annotate(
             **{
                 to_field_name: field,
@@ -280,24 +290,31 @@ class Account(MPTTModel):
             )
 
     def __str__(self):
-        name = self.name or "Unnamed Account"
+        balance = None
         if self.is_leaf_node():
             try:
                 balance = self.get_balance()
             except (ValueError, CurrencyDoesNotExist):
-                if self.full_code:
-                    return "{} {}".format(self.full_code, name)
-                else:
-                    return name
-            else:
-                if self.full_code:
-                    return "{} {} [{}]".format(self.full_code, name, balance)
-                else:
-                    return "{} [{}]".format(name, balance)
+                pass
+        return self.get_label(balance)
 
-        else:
+    def get_label(self, balance: Optional[Balance] = None) -> str:
+        """Get a label for this account, in the same format as ``str(account)``
+
+        Unlike ``str(account)``, this will not query the database for the account
+        balance. Instead, pass the ``balance`` if it should be included in the label
+        (for example, as annotated by :meth:`AccountQuerySet.with_balances()`).
+        Balances are only shown for leaf accounts.
+        """
+        name = self.name or "Unnamed Account"
+        if not self.is_leaf_node():
             return name
 
+        label = "{} {}".format(self.full_code, name) if self.full_code else name
+        if balance is not None:
+            label = "{} [{}]".format(label, balance)
+        return label
+
     def natural_key(self):
         return (self.uuid,)
 
@@ -501,6 +518,10 @@ class Transaction(models.Model):
     class Meta:
         get_latest_by = "date"
         verbose_name = _("transaction")
+        indexes = [
+            # Supports keyset pagination of transactions (see TransactionsListView)
+            models.Index(fields=["date", "id"], name="hordak_transaction_date_id"),
+        ]
 
     def get_balance(self):
         return self.legs.sum_to_balance()
@@ -828,6 +849,80 @@ class StatementLineManager(models.Manager):
         return self.get(uuid=uuid)
 
 
+class StatementLineQuerySet(models.QuerySet):
+    """Utilities available to querysets of StatementLines"""
+
+    def with_bank_account_id(self):
+        """Annotate each line with the ID of its bank account, as ``bank_account_id``
+
+        This avoids loading each line's ``statement_import`` to find its bank account.
+        """
+        return self.annotate(bank_account_id=F("statement_import__bank_account_id"))
+
+    def create_transactions(self, to_account):
+        """Create a transaction for each unreconciled line in this queryset
+
+        This is the bulk equivalent of :meth:`StatementLine.create_transaction()`.
+        The lines' bank accounts are fetched in a single query and, on PostgreSQL,
+        all transactions & legs are created using ``bulk_create()``, and all lines are
+        linked to their transactions in a single ``UPDATE``. The number of queries
+        therefore does not depend on the number of lines.
+        See :func:`hordak.utilities.reconciliation.create_transactions`.
+
+        Lines which are already reconciled are ignored.
+
+        Args:
+            to_account (Account|dict): The account all transactions are into / out of,
+                or a dict of statement line (or ID) → account (or ID).
+                Lines which are not in the dict are ignored.
+
+        Returns:
+            [Transaction]: The newly created transactions
+
+        Example:
+
+            >>> StatementLine.objects.filter(description__icontains="acme").create_transactions(
+            >>>     expenses
+            >>> )
+            >>> StatementLine.objects.create_transactions({line1: sales, line2.pk: expenses.pk})
+        """
+        from hordak.utilities.reconciliation import create_transactions
+
+        lines = self.filter(transaction=None).with_bank_account_id().order_by("pk")
+        if isinstance(to_account, Account):
+            lines = list(lines)
+            to_accounts = {line.pk: to_account.pk for line in lines}
+        else:
+            to_accounts = {
+                getattr(line, "pk", line): getattr(account, "pk", account)
+                for line, account in to_account.items()
+            }
+            lines = lines.filter(pk__in=list(to_accounts))
+        return create_transactions(lines, to_accounts)
+
+    def unreconcile(self, delete_transactions=True) -> int:
+        """Unreconcile all reconciled lines in this queryset
+
+        This is the bulk equivalent of ``UnreconcileView``. By default the lines'
+        transactions are deleted, using a few queries per batch of transactions rather
+        than per line. See :func:`hordak.utilities.reconciliation.unreconcile_statement_lines`.
+
+        Args:
+            delete_transactions (bool): Delete the lines' transactions. Set to ``False`` to keep
+                the transactions and only unlink the lines.
+
+        Returns:
+            int: The number of lines unreconciled
+
+        Example:
+
+            >>> StatementLine.objects.filter(statement_import=statement_import).unreconcile()
+        """
+        from hordak.utilities.reconciliation import unreconcile_statement_lines
+
+        return unreconcile_statement_lines(self, delete_transactions)
+
+
 class StatementLine(models.Model):
     """Records a single imported bank statement line
 
@@ -848,6 +943,10 @@ class StatementLine(models.Model):
         description (str): Any description/memo information provided
         transaction (Transaction): Optionally, the transaction created for this statement line. This normally
             occurs during reconciliation. See also :meth:`StatementLine.create_transaction()`.
+        fingerprint (str): Identifies the line within its bank account, and is used to skip duplicates
+            when importing statements. Unique. Set when the line is first saved, if not already set, and
+            recalculated when a loaded line's date, amount, description or statement import change.
+            See :func:`~hordak.utilities.statement_import.statement_line_fingerprint`.
     """
 
     uuid = models.UUIDField(
@@ -884,12 +983,93 @@ class StatementLine(models.Model):
         help_text="Original data received from the data source.",
         verbose_name=_("source data"),
     )
+    fingerprint = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name=_("fingerprint"),
+    )
 
-    objects = StatementLineManager()
+    objects = StatementLineManager.from_queryset(StatementLineQuerySet)()
 
     def natural_key(self):
         return (self.uuid,)
 
+    #: Fields used to calculate the fingerprint (see :meth:`make_fingerprint`)
+    FINGERPRINT_FIELDS = ("statement_import_id", "date", "amount", "description")
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(StatementLine, cls).from_db(db, field_names, values)
+        # Record the values the fingerprint was calculated from, so we know if it
+        # needs recalculating when saved
+        if all(name in field_names for name in cls.FINGERPRINT_FIELDS):
+            instance._fingerprint_values = instance._get_fingerprint_values()
+        return instance
+
+    def save(self, *args, **kwargs):
+        saved_values = getattr(self, "_fingerprint_values", None)
+        if self.fingerprint is None or (
+            saved_values is not None and saved_values != self._get_fingerprint_values()
+        ):
+            self.fingerprint = self.make_fingerprint()
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None and "fingerprint" not in update_fields:
+                kwargs["update_fields"] = list(update_fields) + ["fingerprint"]
+        result = super(StatementLine, self).save(*args, **kwargs)
+        if not self.get_deferred_fields().intersection(self.FINGERPRINT_FIELDS):
+            self._fingerprint_values = self._get_fingerprint_values()
+        return result
+
+    def _get_fingerprint_values(self) -> tuple:
+        return (
+            self.statement_import_id,
+            # Values may have been given as strings
+            self._meta.get_field("date").to_python(self.date),
+            self._meta.get_field("amount").to_python(self.amount),
+            normalise_description(self.description),
+        )
+
+    def make_fingerprint(self) -> str:
+        """Get a fingerprint for this line which is not used by any other line
+
+        The lowest ordinal not already used by an identical line is used (see
+        :func:`~hordak.utilities.statement_import.statement_line_fingerprint`).
+
+        This is called when saving a line without a fingerprint, and costs one query
+        to find the fingerprints already in use, plus one to find the bank account if
+        ``statement_import`` has not been loaded. Code which creates many lines should
+        set ``fingerprint`` itself, as ``StatementLineResource`` does.
+        """
+        if StatementLine.statement_import.is_cached(self):
+            bank_account_id = self.statement_import.bank_account_id
+        else:
+            bank_account_id = StatementImport.objects.values_list(
+                "bank_account_id", flat=True
+            ).get(pk=self.statement_import_id)
+        # Values may have been given as strings
+        date = self._meta.get_field("date").to_python(self.date)
+        amount = self._meta.get_field("amount").to_python(self.amount)
+        used = set(
+            StatementLine.objects.filter(
+                statement_import__bank_account_id=bank_account_id,
+                date=date,
+                amount=amount,
+                fingerprint__isnull=False,
+            )
+            .exclude(pk=self.pk)
+            .values_list("fingerprint", flat=True)
+        )
+        ordinal = 0
+        while True:
+            fingerprint = statement_line_fingerprint(
+                bank_account_id, date, amount, self.description, ordinal
+            )
+            if fingerprint not in used:
+                return fingerprint
+            ordinal += 1
+
     @property
     def is_reconciled(self):
         """Has this statement line been reconciled?
@@ -918,20 +1098,8 @@ class StatementLine(models.Model):
         from_account = self.statement_import.bank_account
 
         transaction = Transaction.objects.create()
-        if self.amount > 0:
-            Leg.objects.create(
-                transaction=transaction, account=from_account, debit=self.amount
-            )
-            Leg.objects.create(
-                transaction=transaction, account=to_account, credit=self.amount
-            )
-        else:
-            Leg.objects.create(
-                transaction=transaction, account=from_account, credit=abs(self.amount)
-            )
-            Leg.objects.create(
-                transaction=transaction, account=to_account, debit=abs(self.amount)
-            )
+        for leg in self.get_transaction_legs(transaction, from_account, to_account):
+            leg.save(force_insert=True)
 
         transaction.date = self.date
         transaction.save()
@@ -940,8 +1108,60 @@ class StatementLine(models.Model):
         self.save()
         return transaction
 
+    def get_transaction_legs(
+        self, transaction, from_account, to_account
+    ) -> List["Leg"]:
+        """Get the (unsaved) legs of a transaction for this statement line
+
+        Used by :meth:`create_transaction()`, and by
+        :func:`hordak.utilities.reconciliation.create_transactions` so that transactions
+        created in bulk are identical.
+
+        Args:
+            transaction (Transaction): The transaction the legs belong to
+            from_account (Account): The line's bank account
+            to_account (Account): The account the transaction is into / out of.
+        """
+        if self.amount > 0:
+            return [
+                Leg(transaction=transaction, account=from_account, debit=self.amount),
+                Leg(transaction=transaction, account=to_account, credit=self.amount),
+            ]
+        return [
+            Leg(transaction=transaction, account=from_account, credit=abs(self.amount)),
+            Leg(transaction=transaction, account=to_account, debit=abs(self.amount)),
+        ]
+
     class Meta:
         verbose_name = _("statementLine")
+        indexes = [
+            # Supports keyset pagination of statement lines (see TransactionsReconcileView)
+            models.Index(fields=["date", "id"], name="hordak_statementline_date_id"),
+            # Supports duplicate detection when importing statements (see StatementLineResource)
+            models.Index(
+                fields=["statement_import", "date", "amount"],
+                name="hordak_statementline_import",
+            ),
+            # Partial indexes over unreconciled lines only, which are usually a small
+            # fraction of all lines. Support listing unreconciled lines (see
+            # TransactionsReconcileView), optionally for a single bank account (via its imports)
+            models.Index(
+                fields=["date", "id"],
+                condition=Q(transaction=None),
+                name="hordak_stmtline_unrec",
+            ),
+            models.Index(
+                fields=["statement_import", "date", "id"],
+                condition=Q(transaction=None),
+                name="hordak_stmtline_unrec_import",
+            ),
+        ]
+        constraints = [
+            # Fingerprints include the bank account, so are unique within each bank account
+            models.UniqueConstraint(
+                fields=["fingerprint"], name="hordak_statementline_fingerprint"
+            ),
+        ]
 
 
 def mysql_simulate_trigger(proc_name, *args):
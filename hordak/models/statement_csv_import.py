@@ -1,22 +1,56 @@
-import csv
-from io import StringIO
+import logging
+from contextlib import contextmanager, nullcontext
+from datetime import timedelta
+from itertools import islice
+from typing import Iterator, Optional
 
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, connections, models
+from django.db import transaction as db_transaction
 from django.utils import timezone
+from django.utils.module_loading import import_string
 from django.utils.translation import gettext_lazy as _
 from tablib import Dataset
 
+from hordak import defaults
 from hordak.defaults import UUID_DEFAULT
-from hordak.utilities.statement_import import DATE_FORMATS
+from hordak.utilities.statement_import import (
+    DATE_FORMATS,
+    DATE_SAMPLE_SIZE,
+    detect_date_format,
+    iter_batches,
+)
+from hordak.utilities.statement_readers import StatementReader, get_statement_reader
+from hordak.utilities.tasks import get_task_runner
+
+logger = logging.getLogger(__name__)
 
 
 class TransactionCsvImportState(models.TextChoices):
     pending = "pending", _("Pending")
     uploaded = "uploaded", _("Uploaded, ready to import")
+    checking = "checking", _("Checking data")
+    checked = "checked", _("Data checked, ready to import")
+    importing = "importing", _("Importing")
     done = "done", _("Import complete")
+    failed = "failed", _("Import failed")
 
 
 class TransactionCsvImport(models.Model):
+    """An uploaded statement file to be imported as statement lines
+
+    Files are read using the first suitable reader in ``HORDAK_STATEMENT_READERS``
+    (see :mod:`hordak.utilities.statement_readers`), so OFX, QIF & CAMT.053 files
+    are supported as well as CSV. Columns within the file are mapped to statement
+    line fields using ``TransactionCsvImportColumn``.
+
+    Imports are run using :meth:`start()`, which submits the import to the
+    configured task runner (see :mod:`hordak.utilities.tasks`). The progress
+    and result of the import are saved as each batch of rows completes. An import
+    which saves no progress for ``HORDAK_IMPORT_TIMEOUT`` seconds is assumed to
+    have stopped, and may be started again.
+    """
+
     # Warning: Will be removed in Hordak 3. Use TransactionCsvImportState directly instead.
     STATES = TransactionCsvImportState
 
@@ -50,27 +84,195 @@ class TransactionCsvImport(models.Model):
         on_delete=models.CASCADE,
         verbose_name=_("hordak import"),
     )
+    progress = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name=_("rows processed"),
+    )
+    result = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        encoder=DjangoJSONEncoder,
+        verbose_name=_("result"),
+        help_text=_("The result of the most recent dry run or import"),
+    )
+    progress_updated = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name=_("progress updated"),
+    )
+
+    @property
+    def is_running(self) -> bool:
+        return self._is_started() and not self.is_stale
+
+    @property
+    def is_stale(self) -> bool:
+        """Has the import stopped without finishing?
+
+        True if the import has not saved any progress for ``HORDAK_IMPORT_TIMEOUT``
+        seconds, for example because the process running it was killed.
+        """
+        if not self._is_started():
+            return False
+        updated = self.progress_updated or self.timestamp
+        return timezone.now() - updated > timedelta(seconds=defaults.IMPORT_TIMEOUT)
+
+    def _is_started(self) -> bool:
+        return self.state in (
+            TransactionCsvImportState.checking,
+            TransactionCsvImportState.importing,
+        )
+
+    def reset(self):
+        """Clear the state, progress & result of any previous dry run or import
+
+        Used when the column mapping or date format changes, as any previous
+        result no longer applies. The instance is not saved.
+        """
+        self.state = TransactionCsvImportState.uploaded
+        self.progress = 0
+        self.result = {}
+        self.progress_updated = None
+
+    def start(
+        self,
+        dry_run: bool,
+        resource_class: str = "hordak.resources.BulkStatementLineResource",
+        batch_size: int = 1000,
+        atomic: bool = True,
+    ):
+        """Start checking (``dry_run=True``) or importing the file
+
+        The import will be run by the task runner specified by ``HORDAK_TASK_RUNNER``.
+        By default this runs the import immediately. See :meth:`run()` for ``atomic``.
+        """
+        self.state = (
+            TransactionCsvImportState.checking
+            if dry_run
+            else TransactionCsvImportState.importing
+        )
+        self.progress = 0
+        self.result = {}
+        self.progress_updated = timezone.now()
+        self.save(update_fields=["state", "progress", "result", "progress_updated"])
+        get_task_runner().submit(
+            run_import, self.pk, dry_run, resource_class, batch_size, atomic
+        )
+
+    def run(
+        self,
+        dry_run: bool,
+        resource_class: str = "hordak.resources.BulkStatementLineResource",
+        batch_size: int = 1000,
+        atomic: bool = True,
+    ):
+        """Check or import the file now, returning a ``StatementImportResult``
+
+        The file is imported within a single database transaction, so nothing is
+        imported if any row has errors. The ``progress`` & ``result`` are saved after
+        each batch using a separate database connection, so that progress is visible
+        to other requests while the import runs. If the import is run within an existing
+        transaction then progress is saved within that transaction instead.
+
+        Set ``atomic=False`` to commit each batch as it is imported instead. Once a batch
+        contains errors the remaining batches are only checked, and the import will be
+        marked as failed. The batches imported before the error are kept, and will be
+        skipped as duplicates when the import is run again.
+
+        Once the import completes, transactions are created for any imported lines
+        which match a :class:`~hordak.models.StatementRule` (see
+        :func:`~hordak.utilities.statement_rules.apply_statement_rules`). The number
+        of these is saved as ``result["categorised"]``.
+        """
+        from hordak.utilities.statement_rules import apply_statement_rules
+
+        resource = import_string(resource_class)(
+            date_format=self.date_format,
+            statement_import=self.hordak_import,
+        )
+        using = self._state.db or DEFAULT_DB_ALIAS
+        separate_connection = atomic and not connections[using].in_atomic_block
+
+        try:
+            with _progress_saver(self, separate_connection) as save_progress:
 
-    def _get_csv_reader(self):
-        # TODO: Refactor to support multiple readers (xls, quickbooks, etc)
-        csv_buffer = StringIO(self.file.read().decode())
-        return csv.reader(csv_buffer)
+                def on_batch(result):
+                    self.progress = result.total_rows
+                    self.result = dict(result.as_json(), dry_run=dry_run)
+                    self.progress_updated = timezone.now()
+                    save_progress()
+
+                with db_transaction.atomic(using=using) if atomic else nullcontext():
+                    result = resource.import_datasets(
+                        self.iter_datasets(batch_size=batch_size),
+                        dry_run=dry_run,
+                        atomic=atomic,
+                        on_batch=on_batch,
+                        processes=defaults.IMPORT_PROCESSES,
+                        collect_failed_rows=True,
+                    )
+                    categorised = 0
+                    if not dry_run and not result.has_errors():
+                        lines = self.hordak_import.lines.all()
+                        categorised = len(apply_statement_rules(lines))
+        except Exception as e:
+            logger.exception("Failed to import %s", self.file.name)
+            self.state = TransactionCsvImportState.failed
+            self.result = dict(self.result, dry_run=dry_run)
+            self.result.setdefault("base_errors", []).append(str(e))
+            self.progress_updated = timezone.now()
+            self.save(update_fields=["state", "result", "progress_updated"])
+            return None
+
+        if dry_run:
+            self.state = TransactionCsvImportState.checked
+        elif result.has_errors():
+            self.state = TransactionCsvImportState.failed
+        else:
+            self.state = TransactionCsvImportState.done
+        self.progress = result.total_rows
+        self.result = dict(result.as_json(), dry_run=dry_run, categorised=categorised)
+        self.progress_updated = timezone.now()
+        self.save(update_fields=["state", "progress", "result", "progress_updated"])
+        return result
+
+    def get_result(self, dry_run: bool):
+        """Get the saved result of the last dry run (or import), or ``None``
+
+        Nothing is returned while the import is running, or if it stopped without finishing.
+        """
+        from hordak.resources import StatementImportResult
+
+        if (
+            self._is_started()
+            or not self.result
+            or self.result.get("dry_run") != dry_run
+        ):
+            return None
+        return StatementImportResult.from_json(self.result)
+
+    def _get_reader(self) -> StatementReader:
+        self.file.open("rb")
+        return get_statement_reader(self.file)
 
     def create_columns(self):
         """For each column in file create a TransactionCsvImportColumn"""
-        reader = self._get_csv_reader()
-        headings = next(reader)
-        try:
-            examples = next(reader)
-        except StopIteration:
-            examples = []
+        reader = self._get_reader()
+        rows = iter(reader)
+        # Readers for formats other than CSV provide their own headings
+        has_headings = self.has_headings or reader.headers is not None
+        headings = list(reader.headers) if reader.headers else next(rows)
+        examples = next(rows, [])
 
         found_fields = set()
         for i, value in enumerate(headings):
             if i >= 20:
                 break
 
-            infer_field = self.has_headings and value not in found_fields
+            infer_field = has_headings and value not in found_fields
 
             to_field = (
                 {
@@ -90,22 +292,122 @@ class TransactionCsvImport(models.Model):
             TransactionCsvImportColumn.objects.update_or_create(
                 transaction_import=self,
                 column_number=i + 1,
-                column_heading=value if self.has_headings else "",
+                column_heading=value if has_headings else "",
                 to_field=to_field,
-                example=examples[i].strip() if examples else "",
+                example=examples[i].strip()[:200] if examples else "",
             )
 
+    def detect_date_format(self, sample_size: int = DATE_SAMPLE_SIZE) -> Optional[str]:
+        """Detect the format of the date column, and update ``date_format`` to match
+
+        The first ``sample_size`` rows are used (see
+        :func:`~hordak.utilities.statement_import.detect_date_format`). Nothing is
+        changed if there is no date column, or the format cannot be detected.
+
+        Returns the detected format, or ``None``.
+        """
+        reader = self._get_reader()
+        column = self.columns.filter(to_field=ToField.date).first()
+        if reader.date_format:
+            # The reader always produces dates in the same format
+            date_format = reader.date_format
+        elif column:
+            index = column.column_number - 1
+            rows = islice(self._iter_rows(), sample_size)
+            date_format = detect_date_format(
+                row[index] for row in rows if len(row) > index
+            )
+        else:
+            return None
+
+        if date_format and date_format != self.date_format:
+            self.date_format = date_format
+            self.save(update_fields=["date_format"])
+        return date_format
+
     def get_dataset(self):
-        reader = self._get_csv_reader()
-        if self.has_headings:
-            next(reader)
+        """Get all rows to be imported as a single ``Dataset``
+
+        Use :meth:`iter_datasets()` for large files.
+        """
+        headers = self._get_headers()
+        return Dataset(*self._iter_rows(), headers=headers)
+
+    def iter_datasets(self, batch_size: int = 1000) -> Iterator[Dataset]:
+        """Get the rows to be imported as a series of ``Dataset``s
+
+        The file is read incrementally, so memory use is bounded by ``batch_size``
+        regardless of the size of the file.
+        """
+        headers = self._get_headers()
+        for rows in iter_batches(self._iter_rows(), batch_size):
+            yield Dataset(*rows, headers=headers)
 
-        data = list(reader)
-        headers = [
+    def _get_headers(self):
+        reader = self._get_reader()
+        if reader.headers:
+            return list(reader.headers)
+        return [
             column.to_field or "col_%s" % column.column_number
             for column in self.columns.all()
         ]
-        return Dataset(*data, headers=headers)
+
+    def _iter_rows(self):
+        reader = self._get_reader()
+        rows = iter(reader)
+        if self.has_headings and reader.headers is None:
+            next(rows, None)
+        # Skip blank lines, which would otherwise be rows of the wrong length
+        return (row for row in rows if row)
+
+
+_PROGRESS_FIELDS = ["progress", "result", "progress_updated"]
+
+
+@contextmanager
+def _progress_saver(instance: TransactionCsvImport, separate_connection: bool):
+    """Yield a function which saves the progress & result of an import
+
+    If ``separate_connection`` is set then a new database connection is used, which
+    commits each save immediately regardless of any transaction on the main connection.
+    """
+    if not separate_connection:
+        yield lambda: instance.save(update_fields=_PROGRESS_FIELDS)
+        return
+
+    connection = connections.create_connection(instance._state.db or DEFAULT_DB_ALIAS)
+    fields = [instance._meta.get_field(name) for name in _PROGRESS_FIELDS]
+    qn = connection.ops.quote_name
+    sql = "UPDATE {} SET {} WHERE {} = %s".format(
+        qn(instance._meta.db_table),
+        ", ".join("{} = %s".format(qn(field.column)) for field in fields),
+        qn(instance._meta.pk.column),
+    )
+
+    def save():
+        params = [
+            field.get_db_prep_save(getattr(instance, field.attname), connection)
+            for field in fields
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params + [instance.pk])
+
+    try:
+        yield save
+    finally:
+        connection.close()
+
+
+def run_import(
+    pk: int, dry_run: bool, resource_class: str, batch_size: int, atomic: bool = True
+):
+    """Task to check or import a ``TransactionCsvImport``. See ``TransactionCsvImport.start()``"""
+    TransactionCsvImport.objects.get(pk=pk).run(
+        dry_run=dry_run,
+        resource_class=resource_class,
+        batch_size=batch_size,
+        atomic=atomic,
+    )
 
 
 class ToField(models.TextChoices):
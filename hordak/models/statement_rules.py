@@ -0,0 +1,89 @@
+import re
+
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+from hordak.defaults import DECIMAL_PLACES, MAX_DIGITS, UUID_DEFAULT
+from hordak.models.core import Account
+
+
+def validate_pattern(value):
+    try:
+        re.compile(value, re.IGNORECASE)
+    except re.error as e:
+        raise ValidationError(
+            _("Invalid regular expression: %(error)s"), params={"error": e}
+        )
+
+
+class StatementRuleManager(models.Manager):
+    def get_by_natural_key(self, uuid):
+        return self.get(uuid=uuid)
+
+
+class StatementRule(models.Model):
+    """A rule for automatically creating transactions for statement lines
+
+    A statement line matches a rule if its description matches the rule's
+    ``description_pattern`` and its amount is within the rule's amount range.
+    A transaction is then created between the line's bank account and the rule's
+    ``to_account``, as per :meth:`StatementLine.create_transaction()`.
+
+    Rules are checked in order of ``priority``, and the first matching rule is used.
+    All rules are compiled into a single matcher, see :mod:`hordak.utilities.statement_rules`.
+
+    Attributes:
+
+        uuid (UUID): UUID for the rule. Use to prevent leaking of IDs (if desired).
+        description_pattern (str): A regular expression, which is searched for anywhere
+            within the line's description, ignoring case.
+        min_amount (Decimal): Optional minimum amount of the line (inclusive).
+            Note that money leaving the bank account has a negative amount.
+        max_amount (Decimal): Optional maximum amount of the line (inclusive)
+        to_account (Account): The account the transaction is into / out of
+        priority (int): Rules with a lower priority are checked first
+    """
+
+    uuid = models.UUIDField(
+        default=UUID_DEFAULT, editable=False, verbose_name=_("uuid")
+    )
+    description_pattern = models.CharField(
+        max_length=255,
+        validators=[validate_pattern],
+        help_text="A regular expression to search for in the description (ignoring case)",
+        verbose_name=_("description pattern"),
+    )
+    min_amount = models.DecimalField(
+        max_digits=MAX_DIGITS,
+        decimal_places=DECIMAL_PLACES,
+        null=True,
+        blank=True,
+        verbose_name=_("minimum amount"),
+    )
+    max_amount = models.DecimalField(
+        max_digits=MAX_DIGITS,
+        decimal_places=DECIMAL_PLACES,
+        null=True,
+        blank=True,
+        verbose_name=_("maximum amount"),
+    )
+    to_account = models.ForeignKey(
+        Account,
+        related_name="statement_rules",
+        on_delete=models.CASCADE,
+        verbose_name=_("to account"),
+    )
+    priority = models.PositiveIntegerField(default=0, verbose_name=_("priority"))
+
+    objects = StatementRuleManager()
+
+    class Meta:
+        ordering = ["priority", "id"]
+        verbose_name = _("statementRule")
+
+    def __str__(self):
+        return "{} -> {}".format(self.description_pattern, self.to_account.name)
+
+    def natural_key(self):
+        return (self.uuid,)
@@ -0,0 +1,69 @@
+from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+
+from hordak.models import Account, Leg, Transaction
+
+
+class LedgerWatermark(models.Model):
+    """Records when the legs within an account tree last changed
+
+    There is one watermark per account tree (i.e. per root account). Each holds the
+    highest leg ID created within the tree, plus a counter which is incremented
+    every time legs or accounts within the tree change.
+
+    These are used to cheaply determine if cached content (or an HTTP response)
+    is still valid, without querying the legs table.
+    See :mod:`hordak.utilities.watermark`.
+
+    Watermarks are updated after each database transaction commits, whenever a
+    ``Leg``, ``Transaction`` or ``Account`` is saved or deleted. If you modify legs using ``update()``
+    or raw SQL, you should call :func:`hordak.utilities.watermark.ledger_changed()`.
+
+    Attributes:
+
+        tree_id (int): The ``tree_id`` of the accounts in the tree
+        max_leg_id (int): The highest leg ID created within this tree
+        version (int): Incremented on every change within this tree
+    """
+
+    tree_id = models.PositiveIntegerField(unique=True, verbose_name=_("tree ID"))
+    max_leg_id = models.BigIntegerField(default=0, verbose_name=_("max leg ID"))
+    version = models.BigIntegerField(default=0, verbose_name=_("version"))
+
+    class Meta:
+        verbose_name = _("ledger watermark")
+
+    def __str__(self):
+        return "{}-{}".format(self.max_leg_id, self.version)
+
+
+@receiver(post_save, sender=Leg)
+@receiver(post_delete, sender=Leg)
+def _leg_changed(sender, instance, **kwargs):
+    from hordak.utilities.watermark import ledger_changed
+
+    ledger_changed(account_ids=[instance.account_id], max_leg_id=instance.pk or 0)
+
+
+@receiver(post_save, sender=Transaction)
+def _transaction_saved(sender, instance, **kwargs):
+    from hordak.utilities.watermark import ledger_changed
+
+    # Transaction dates & descriptions are shown alongside their legs. Deleting
+    # a transaction deletes its legs, which is handled by _leg_changed()
+    account_ids = Leg.objects.filter(transaction_id=instance.pk).values_list(
+        "account_id", flat=True
+    )
+    ledger_changed(account_ids=set(account_ids))
+
+
+@receiver(post_save, sender=Account)
+@receiver(post_delete, sender=Account)
+def _account_changed(sender, instance, **kwargs):
+    from hordak.utilities.watermark import ledger_changed
+
+    # Account names & codes appear alongside legs from other trees,
+    # and accounts may be moved between trees. So update all watermarks.
+    ledger_changed(all_trees=True)
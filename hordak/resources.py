@@ -1,47 +1,126 @@
-from datetime import datetime
-from decimal import Decimal, DecimalException, InvalidOperation
+import json
+from collections import Counter
+from contextlib import nullcontext
+from typing import Callable, Iterable, Optional, Set
 
+from django.db import transaction as db_transaction
 from import_export import resources
+from import_export.results import Error, Result, RowResult
+from tablib import Dataset
 
 from hordak.models import StatementLine, ToField
-from hordak.utilities.statement_import import DATE_FORMATS
+from hordak.utilities.statement_import import (
+    get_date_parser,
+    iter_parsed_datasets,
+    normalise_description,
+    parse_statement_row,
+    statement_line_fingerprint,
+)
 
 
 class StatementLineResource(resources.ModelResource):
+    """Import statement lines from a ``Dataset``
+
+    Rows which duplicate existing statement lines within the same bank account are skipped.
+    Duplicates are identified using ``StatementLine.fingerprint``.
+    """
+
     class Meta:
         model = StatementLine
         fields = ("date", "amount", "description")
         import_id_fields = ()
 
     def __init__(self, date_format, statement_import):
+        super(StatementLineResource, self).__init__()
         self.date_format = date_format
+        self.parse_date = get_date_parser(date_format)
         self.statement_import = statement_import
 
     def before_import(self, dataset, *args, **kwargs):
         def _strip(s):
             return s.strip() if isinstance(s, str) else s
 
-        # Remove whitespace
-        for index, values in enumerate(dataset):
-            dataset[index] = tuple(map(_strip, values))
-
-        # We're going to need this to check for duplicates (because
-        # there could be multiple identical transactions)
         self.dataset = dataset
-        similar_totals = [0] * len(self.dataset)
+        for i, values in enumerate(dataset):
+            # Remove whitespace, only replacing rows which actually change
+            row = tuple(map(_strip, values))
+            if row != tuple(values):
+                dataset[i] = row
+
+        # We're going to need this to check for duplicates (because there could be
+        # multiple identical transactions). This counts the identical rows seen so
+        # far, and may be carried over from previous datasets (see import_datasets())
+        self.ordinals = kwargs.get("ordinals")
+        if self.ordinals is None:
+            self.ordinals = Counter()
+
+        # Load the fingerprints of lines which have already been imported,
+        # so we can check for duplicates without a query per row
+        self.existing_fingerprints = self._get_existing_fingerprints(dataset)
+
+    def import_datasets(
+        self,
+        datasets: Iterable[Dataset],
+        dry_run: bool = False,
+        atomic: bool = True,
+        on_batch: Optional[Callable[["StatementImportResult"], None]] = None,
+        processes: Optional[int] = None,
+        **kwargs,
+    ) -> "StatementImportResult":
+        """Import a series of datasets, as returned by ``TransactionCsvImport.iter_datasets()``
 
-        for i, row in enumerate(dataset):
-            num_similar = self._get_num_similar_rows(row, until=i)
-            similar_totals[i] = num_similar
+        Each dataset is imported using ``import_data()``. By default all are imported
+        within a single database transaction, and if any dataset has errors then the
+        entire import will be rolled back.
+
+        If ``atomic`` is ``False`` then each dataset is committed as it is imported,
+        and once a dataset has errors the remaining datasets are only checked, not
+        saved. Because duplicates are skipped, a failed import can be fixed and then
+        safely run again.
+
+        ``on_batch`` will be called with the combined result after each dataset.
+
+        If ``processes`` is given then rows are parsed & validated in a pool of that
+        many processes (see :func:`~hordak.utilities.statement_import.iter_parsed_datasets`),
+        while the previous dataset is being saved.
+
+        Duplicates are detected across all datasets. Only failed rows are retained in
+        the returned result, so memory use does not grow with the number of rows.
+        """
+        result = StatementImportResult()
+        ordinals = Counter()
+        if processes:
+            batches = iter_parsed_datasets(datasets, self.date_format, processes)
+        else:
+            batches = ((dataset, None) for dataset in datasets)
 
-        # Add a new 'similar_total' column. This is a integer of how many
-        # identical rows precede this one.
-        self.dataset.append_col(similar_totals, header="similar_total")
+        with db_transaction.atomic() if atomic else nullcontext():
+            for dataset, parsed_rows in batches:
+                result.add(
+                    self.import_data(
+                        dataset,
+                        dry_run=dry_run or result.has_errors(),
+                        use_transactions=True,
+                        ordinals=ordinals,
+                        parsed_rows=parsed_rows,
+                        **kwargs,
+                    ),
+                    num_rows=len(dataset),
+                )
+                if on_batch:
+                    on_batch(result)
+            if atomic and (dry_run or result.has_errors()):
+                db_transaction.set_rollback(True)
+        return result
 
     def before_save_instance(self, instance, *args, **kwargs):
         # We need to record this statement line against the parent statement import
         # instance passed to the constructor
         instance.statement_import = self.statement_import
+        # Readers for formats other than CSV provide the original transaction data
+        source_data = instance._row.get("source_data")
+        if source_data:
+            instance.source_data = json.loads(source_data)
 
     def get_instance(self, instance_loader, row):
         # We never update, we either create or skip
@@ -54,73 +133,55 @@ class StatementLineResource(resources.ModelResource):
         return instance
 
     def skip_row(self, instance, original, *args, **kwargs):
-        # Skip this row if the database already contains the requsite number of
-        # rows identical to this one.
-        return instance._row["similar_total"] < self._get_num_similar_objects(instance)
+        # Skip this row if the database already contains a line with the same
+        # fingerprint. Fingerprints include the number of identical rows which
+        # precede this one, so identical transactions are still imported.
+        return instance.fingerprint in self.existing_fingerprints
+
+    def _get_existing_fingerprints(self, dataset) -> Set[str]:
+        """Get the fingerprints of the existing statement lines for this bank account
 
-    def _get_num_similar_objects(self, obj):
-        """Get any statement lines which would be considered a duplicate of obj"""
-        return StatementLine.objects.filter(
-            date=obj.date, amount=obj.amount, description=obj.description
-        ).count()
+        Only lines within the date range of the dataset are loaded.
+        """
+        dates = []
+        if ToField.date.value in dataset.headers:
+            for value in dataset[ToField.date.value]:
+                try:
+                    dates.append(self.parse_date(value))
+                except (TypeError, ValueError):
+                    pass
+        if not dates:
+            return set()
 
-    def _get_num_similar_rows(self, row, until=None):
-        """Get the number of rows similar to row which precede the index `until`"""
-        return len(list(filter(lambda r: row == r, self.dataset[:until])))
+        return set(
+            StatementLine.objects.filter(
+                statement_import__bank_account_id=self.statement_import.bank_account_id,
+                date__range=(min(dates), max(dates)),
+                fingerprint__isnull=False,
+            ).values_list("fingerprint", flat=True)
+        )
 
     def import_obj(self, obj, data, dry_run, *args, **kwargs):
         return self.import_instance(obj, data, *args, dry_run=dry_run, **kwargs)
 
     def import_instance(self, instance, row, *args, **kwargs):
-        F = ToField
-        use_dual_amounts = F.amount_out.value in row and F.amount_in.value in row
-
-        if F.date.value not in row:
-            raise ValueError("No date column found")
-
-        try:
-            date = datetime.strptime(row[F.date.value], self.date_format).date()
-        except ValueError:
-            raise ValueError(
-                "Invalid value for date. Expected {}".format(
-                    dict(DATE_FORMATS)[self.date_format]
-                )
-            )
-
-        description = row[F.description.value]
-
-        # Do we have in/out columns, or just one amount column?
-        if use_dual_amounts:
-            amount_out = row[F.amount_out.value]
-            amount_in = row[F.amount_in.value]
-
-            if amount_in and amount_out:
-                raise ValueError("Values found for both Amount In and Amount Out")
-            if not amount_in and not amount_out:
-                raise ValueError("Value required for either Amount In or Amount Out")
-
-            if amount_out:
-                try:
-                    amount = abs(Decimal(amount_out)) * -1
-                except DecimalException:
-                    raise ValueError("Invalid value found for Amount Out")
-            else:
-                try:
-                    amount = abs(Decimal(amount_in))
-                except DecimalException:
-                    raise ValueError("Invalid value found for Amount In")
+        # Rows may have already been parsed in parallel (see import_datasets())
+        parsed_rows = kwargs.get("parsed_rows")
+        if parsed_rows is None:
+            date, amount, description = parse_statement_row(row, self.date_format)
         else:
-            if F.amount.value not in row:
-                raise ValueError("No amount column found")
-            if not row[F.amount.value]:
-                raise ValueError("No value found for amount")
-            try:
-                amount = Decimal(row[F.amount.value])
-            except InvalidOperation:
-                raise DecimalException("Invalid value found for Amount")
+            parsed = parsed_rows[kwargs["row_number"] - 1]
+            if isinstance(parsed, Exception):
+                raise parsed
+            date, amount, description = parsed
 
-        if amount == Decimal("0"):
-            raise ValueError("Amount of zero not allowed")
+        # Number identical rows, so that they each have a unique fingerprint
+        key = (date, amount, normalise_description(description))
+        ordinal = self.ordinals[key]
+        self.ordinals[key] += 1
+        instance.fingerprint = statement_line_fingerprint(
+            self.statement_import.bank_account_id, date, amount, description, ordinal
+        )
 
         row = dict(date=date, amount=amount, description=description)
         try:
@@ -131,3 +192,128 @@ class StatementLineResource(resources.ModelResource):
             return super(StatementLineResource, self).import_obj(
                 instance, row, *args, **kwargs
             )
+
+
+class BulkStatementLineResource(StatementLineResource):
+    """Import statement lines using ``bulk_create()``
+
+    Rows are parsed & validated one at a time as per :class:`StatementLineResource`,
+    with any errors reported against each row. Valid statement lines are then created
+    in batches of ``batch_size``, without a savepoint per row and without calculating
+    a diff for each row. This is several times faster than :class:`StatementLineResource`.
+
+    Errors raised when creating a batch are reported in ``base_errors``, rather than
+    against individual rows. Lines which were created by another import since this
+    import started are skipped, and counted as skipped rather than new.
+    """
+
+    class Meta(StatementLineResource.Meta):
+        use_bulk = True
+        batch_size = 1000
+        skip_diff = True
+
+    def bulk_create(
+        self, using_transactions, dry_run, raise_errors, batch_size=None, result=None
+    ):
+        # As per ModelResource.bulk_create(), but lines whose fingerprint now exists
+        # (i.e. which were imported concurrently) are skipped. We don't use
+        # ignore_conflicts, as on MySQL that also ignores unrelated errors.
+        if self.create_instances and (using_transactions or not dry_run):
+            try:
+                fingerprints = set(
+                    StatementLine.objects.filter(
+                        fingerprint__in=[
+                            instance.fingerprint for instance in self.create_instances
+                        ]
+                    ).values_list("fingerprint", flat=True)
+                )
+                instances = [
+                    instance
+                    for instance in self.create_instances
+                    if instance.fingerprint not in fingerprints
+                ]
+                skipped = len(self.create_instances) - len(instances)
+                if skipped and result is not None:
+                    result.totals[RowResult.IMPORT_TYPE_NEW] -= skipped
+                    result.totals[RowResult.IMPORT_TYPE_SKIP] += skipped
+                StatementLine.objects.bulk_create(instances, batch_size=batch_size)
+            except Exception as e:
+                self.handle_import_error(result, e, raise_errors)
+            finally:
+                self.create_instances.clear()
+
+
+class StatementImportResult(Result):
+    """The combined result of importing several datasets
+
+    The row numbers of any errors refer to the row's position across all datasets.
+    Individual row results are not retained.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(StatementImportResult, self).__init__(*args, **kwargs)
+        self._row_errors = []
+
+    def add(self, result: Result, num_rows: int):
+        """Add the result of importing a dataset of ``num_rows`` rows"""
+        offset = self.total_rows
+        self.total_rows += num_rows
+        self.base_errors.extend(result.base_errors)
+        self.diff_headers = result.diff_headers
+        for import_type, total in result.totals.items():
+            self.totals[import_type] += total
+        for number, errors in result.row_errors():
+            self._row_errors.append((number + offset, errors))
+        for row in result.invalid_rows:
+            row.number += offset
+            self.invalid_rows.append(row)
+        for row in result.error_rows:
+            row.number += offset
+            self.error_rows.append(row)
+        if result.failed_dataset.headers:
+            if not self.failed_dataset.headers:
+                self.failed_dataset.headers = result.failed_dataset.headers
+            self.failed_dataset.extend(result.failed_dataset)
+
+    def row_errors(self):
+        return self._row_errors
+
+    def as_json(self) -> dict:
+        """Get a JSON-serialisable summary of this result
+
+        Errors are stored as their messages. Use :meth:`from_json()` to restore the result.
+        """
+        return {
+            "total_rows": self.total_rows,
+            "totals": dict(self.totals),
+            "base_errors": [str(error.error) for error in self.base_errors],
+            "row_errors": [
+                [number, [str(error.error) for error in errors]]
+                for number, errors in self._row_errors
+            ],
+            "failed_dataset": {
+                "headers": self.failed_dataset.headers or [],
+                "rows": [list(row) for row in self.failed_dataset],
+            },
+        }
+
+    @classmethod
+    def from_json(cls, data: dict) -> "StatementImportResult":
+        """Restore a result previously saved using :meth:`as_json()`"""
+        result = cls()
+        result.total_rows = data.get("total_rows", 0)
+        result.totals.update(data.get("totals", {}))
+        result.base_errors = [
+            Error(Exception(message)) for message in data.get("base_errors", [])
+        ]
+        result._row_errors = [
+            (number, [Error(Exception(message), number=number) for message in errors])
+            for number, errors in data.get("row_errors", [])
+        ]
+        failed_dataset = data.get("failed_dataset", {})
+        if failed_dataset.get("headers"):
+            result.failed_dataset.headers = failed_dataset["headers"]
+            result.failed_dataset.extend(
+                tuple(row) for row in failed_dataset.get("rows", [])
+            )
+        return result
@@ -3,13 +3,13 @@ from __future__ import absolute_import
 import logging
 from decimal import Decimal
 
-import babel.numbers
 from django import template
 from django.utils.safestring import mark_safe
-from django.utils.translation import get_language, to_locale
 from moneyed import Money
 
 from hordak.utilities.currency import Balance
+from hordak.utilities.formatting import format_decimal, format_monies
+from hordak.utilities.watermark import get_watermark
 
 register = template.Library()
 logger = logging.getLogger(__name__)
@@ -29,23 +29,13 @@ def inv(value):
 
 @register.filter()
 def currency(value):
-    locale = to_locale(get_language())
-
     if value is None:
         return None
 
     if isinstance(value, Balance):
-        locale_values = []
-        for money in value.monies():
-            locale_value = babel.numbers.format_currency(
-                abs(money.amount), currency=money.currency.code, locale=locale
-            )
-            locale_value = (
-                locale_value if money.amount >= 0 else "({})".format(locale_value)
-            )
-            locale_values.append(locale_value)
+        locale_values = format_monies(value.monies(), accounting=True)
     else:
-        locale_value = babel.numbers.format_decimal(abs(value), locale=locale)
+        locale_value = format_decimal(abs(value))
         locale_value = locale_value if value >= 0 else "({})".format(locale_value)
         locale_values = [locale_value]
 
@@ -132,3 +122,12 @@ def addition(value, arg):
             return value + arg
         except Exception:
             return ""
+
+
+@register.simple_tag()
+def ledger_watermark(account=None):
+    """Get the ledger watermark, for use as a ``{% cache %}`` key
+
+    See :mod:`hordak.utilities.watermark`.
+    """
+    return get_watermark(account)
@@ -1,9 +1,14 @@
+from unittest import mock
+
 from django.contrib.auth import get_user_model
 from django.test.testcases import TestCase
 from django.urls import reverse
+from moneyed import Money
 
+from hordak.admin import AccountAdmin
 from hordak.models import AccountType, Leg, Transaction
 from hordak.tests.utils import DataProvider
+from hordak.utilities.currency import Balance
 
 
 class AdminTestCase(DataProvider, TestCase):
@@ -36,12 +41,61 @@ class AdminTestCase(DataProvider, TestCase):
             html=True,
         )
 
-        qs = res.context_data["cl"].queryset
-        self.assertEqual(qs.count(), 4)
-        self.assertEqual(qs[0].balance, 0)
-        self.assertEqual(qs[1].balance, 0)
-        self.assertEqual(qs[2].balance, 10)
-        self.assertEqual(qs[3].balance, 10)
+        accounts = res.context_data["cl"].result_list
+        self.assertEqual(len(accounts), 4)
+        self.assertEqual(accounts[0].balance, 0)
+        self.assertEqual(accounts[1].balance, 0)
+        self.assertEqual(accounts[2].balance, Balance(10, "EUR"))
+        self.assertEqual(accounts[3].balance, Balance(10, "EUR"))
+
+    def test_account_list_rollup(self):
+        """Test that parent accounts include the totals of their children"""
+        self.income_account.currencies = ["EUR", "USD"]
+        self.income_account.save()
+        child = self.account(
+            name="Child account", parent=self.bank_account, currencies=["EUR", "USD"]
+        )
+        self.income_account.transfer_to(child, Money(5, "EUR"))
+        self.income_account.transfer_to(child, Money(3, "USD"))
+
+        superuser = get_user_model().objects.create_superuser(username="superuser")
+        self.client.force_login(superuser)
+        url = reverse("admin:hordak_account_changelist")
+        # Session, user, count estimate, count, accounts, totals
+        with self.assertNumQueries(6):
+            res = self.client.get(url)
+
+        accounts = {a.pk: a for a in res.context_data["cl"].result_list}
+        self.assertEqual(
+            accounts[self.bank_account.pk].balance,
+            Balance([Money(15, "EUR"), Money(3, "USD")]),
+        )
+        self.assertEqual(
+            accounts[self.bank_account.pk].debits,
+            Balance([Money(15, "EUR"), Money(3, "USD")]),
+        )
+        self.assertEqual(
+            accounts[child.pk].balance, Balance([Money(5, "EUR"), Money(3, "USD")])
+        )
+        self.assertEqual(
+            accounts[self.income_account.pk].credits,
+            Balance([Money(15, "EUR"), Money(3, "USD")]),
+        )
+
+    def test_account_list_sorting(self):
+        superuser = get_user_model().objects.create_superuser(username="superuser")
+        self.client.force_login(superuser)
+        url = reverse("admin:hordak_account_changelist")
+        res = self.client.get(url)
+        self.assertNotIn("balance", res.context_data["cl"].sortable_by)
+
+        with mock.patch.object(AccountAdmin, "balance_ordering_field", "full_code"):
+            res = self.client.get(url + "?o=-5")
+        self.assertIn("balance", res.context_data["cl"].sortable_by)
+        self.assertEqual(
+            [a.full_code for a in res.context_data["cl"].result_list],
+            ["2", "1", "00", "0"],
+        )
 
     def test_account_search_query(self):
         """Test that search query works"""
@@ -115,10 +169,38 @@ class AdminTestCase(DataProvider, TestCase):
         superuser = get_user_model().objects.create_superuser(username="superuser")
         self.client.force_login(superuser)
         url = reverse("admin:hordak_transaction_changelist")
-        with self.assertNumQueries(5):
+        # Session, user, count estimate, count, transactions, transaction views
+        with self.assertNumQueries(6):
             res = self.client.get(url)
         self.assertEqual(res.status_code, 200)
 
+    def test_transaction_search(self):
+        """Test that transactions can be searched by account name"""
+        empty = Transaction.objects.create()
+        child = self.account(name="Petty cash", parent=self.bank_account)
+        self.income_account.transfer_to(child, Money(5, "EUR"))
+
+        superuser = get_user_model().objects.create_superuser(username="superuser")
+        self.client.force_login(superuser)
+        url = reverse("admin:hordak_transaction_changelist")
+
+        res = self.client.get(url)
+        self.assertIn(empty, res.context_data["cl"].result_list)
+
+        res = self.client.get(url + "?q=petty")
+        transactions = res.context_data["cl"].result_list
+        self.assertEqual(transactions, [child.legs.get().transaction])
+
+        # Parent accounts match the transactions of their children
+        res = self.client.get(url + "?q=bank")
+        self.assertEqual(len(res.context_data["cl"].result_list), 2)
+
+        res = self.client.get(url + "?q=bank+petty")
+        self.assertEqual(len(res.context_data["cl"].result_list), 1)
+
+        res = self.client.get(url + "?q=nothing")
+        self.assertEqual(res.context_data["cl"].result_list, [])
+
     def test_leg_list(self):
         """Test the leg listing loads"""
         superuser = get_user_model().objects.create_superuser(username="superuser")
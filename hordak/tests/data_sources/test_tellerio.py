@@ -3,11 +3,13 @@ from decimal import Decimal
 from uuid import UUID
 
 import requests_mock
+import tablib
 from django.test.testcases import TestCase
 
 from hordak.data_sources import tellerio
 from hordak.models import StatementImport
 from hordak.models.core import AccountType, StatementLine
+from hordak.resources import StatementLineResource
 from hordak.tests.utils import DataProvider
 
 
@@ -129,6 +131,98 @@ class TellerIoDataSourceTestCase(DataProvider, TestCase):
         )
         self.assertEqual(StatementLine.objects.count(), 3)
 
+    @requests_mock.mock()
+    def test_batches(self, m):
+        m.get(
+            "https://api.teller.io/accounts/11111111-1111-4111-1111-111111111111/transactions",
+            json=EXAMPLE_JSON + EXAMPLE_JSON[:1],
+        )
+        # The first line exists already, and is also repeated in the data
+        tellerio.do_import(
+            token="testtoken",
+            account_uuid="11111111-1111-4111-1111-111111111111",
+            bank_account=self.bank,
+            since=date(2017, 3, 27),
+        )
+
+        # Import, existing lines & insert for each batch
+        with self.assertNumQueries(7):
+            statement_import = tellerio.do_import(
+                token="testtoken",
+                account_uuid="11111111-1111-4111-1111-111111111111",
+                bank_account=self.bank,
+                batch_size=2,
+            )
+
+        self.assertEqual(StatementLine.objects.count(), 3)
+        self.assertEqual(statement_import.lines.count(), 2)
+
+    @requests_mock.mock()
+    def test_fingerprints(self, m):
+        # The first line is repeated with a different teller.io ID
+        repeated = dict(EXAMPLE_JSON[0], id="11111111-1111-4111-5555-111111111111")
+        m.get(
+            "https://api.teller.io/accounts/11111111-1111-4111-1111-111111111111/transactions",
+            json=EXAMPLE_JSON + [repeated],
+        )
+        tellerio.do_import(
+            token="testtoken",
+            account_uuid="11111111-1111-4111-1111-111111111111",
+            bank_account=self.bank,
+        )
+        self.assertEqual(StatementLine.objects.count(), 4)
+        self.assertFalse(StatementLine.objects.filter(fingerprint=None).exists())
+
+        # A CSV import of the same lines skips them all, and
+        # imports a third identical line
+        dataset = tablib.Dataset(
+            headers=["date", "amount", "description"],
+        )
+        for line_data in EXAMPLE_JSON + [repeated, repeated]:
+            dataset.append(
+                [
+                    line_data["date"],
+                    line_data["amount"],
+                    "{counterparty}, {description}".format(**line_data),
+                ]
+            )
+        statement_import = StatementImport.objects.create(
+            bank_account=self.bank, source="csv"
+        )
+        StatementLineResource("%Y-%m-%d", statement_import).import_data(dataset)
+
+        self.assertEqual(StatementLine.objects.count(), 5)
+        self.assertEqual(statement_import.lines.get().date, date(2017, 3, 27))
+
+    @requests_mock.mock()
+    def test_identical_lines_reordered(self, m):
+        """Identical lines with new teller.io IDs are imported, whatever their order"""
+        first = EXAMPLE_JSON[0]
+        second = dict(first, id="11111111-1111-4111-5555-111111111111")
+        third = dict(first, id="11111111-1111-4111-6666-111111111111")
+        m.get(
+            "https://api.teller.io/accounts/11111111-1111-4111-1111-111111111111/transactions",
+            [
+                {"json": [first]},
+                {"json": [second, first]},
+                {"json": [third, second, first]},
+            ],
+        )
+        for _ in range(3):
+            tellerio.do_import(
+                token="testtoken",
+                account_uuid="11111111-1111-4111-1111-111111111111",
+                bank_account=self.bank,
+            )
+
+        self.assertEqual(
+            set(StatementLine.objects.values_list("uuid", flat=True)),
+            {UUID(line_data["id"]) for line_data in (first, second, third)},
+        )
+        self.assertEqual(
+            len(set(StatementLine.objects.values_list("fingerprint", flat=True))), 3
+        )
+
 
 EXAMPLE_JSON = [
     {
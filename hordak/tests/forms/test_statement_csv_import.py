@@ -23,6 +23,17 @@ class TransactionCsvImportFormTestCase(DataProvider, TestCase):
         self.assertEqual(obj.columns.count(), 6)
         self.assertEqual(obj.hordak_import.bank_account, self.account)
 
+    def test_create_detect_date_format(self):
+        f = SimpleUploadedFile("data.csv", b"Date,Amount\n02/01/2000,1\n02/25/2000,2\n")
+        form = TransactionCsvImportForm(
+            data=dict(bank_account=self.account.pk, has_headings=True),
+            files=dict(file=f),
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        obj = TransactionCsvImport.objects.get()
+        self.assertEqual(obj.date_format, "%m/%d/%Y")
+
     def test_edit(self):
         obj = TransactionCsvImport.objects.create(
             hordak_import=self.statement_import(bank_account=self.account),
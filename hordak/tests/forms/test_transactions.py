@@ -1,8 +1,15 @@
+from decimal import Decimal
+from unittest.mock import patch
+
 from django.test import TestCase
 from moneyed import Money
 
-from hordak.forms.transactions import CurrencyTradeForm, SimpleTransactionForm
-from hordak.models import AccountType, Transaction
+from hordak.forms.transactions import (
+    CurrencyTradeForm,
+    LegFormSet,
+    SimpleTransactionForm,
+)
+from hordak.models import AccountType, StatementImport, StatementLine, Transaction
 from hordak.tests.utils import DataProvider
 from hordak.utilities.currency import Balance
 
@@ -117,6 +124,24 @@ class SimpleTransactionFormTestCase(DataProvider, TestCase):
         )
         self.assertFalse(form.is_valid())
 
+    def test_render_num_queries(self):
+        self.bank.transfer_to(self.income, Money(10, "EUR"))
+        form = SimpleTransactionForm()
+        # Both account fields share a single query, including balances
+        with self.assertNumQueries(1):
+            html = str(form)
+        # Labels match str(account), which queries each balance separately
+        self.assertIn("{}</option>".format(self.income), html)
+        self.assertIn("[-€10.00]", html)
+
+    @patch("hordak.defaults.ACCOUNT_CHOICE_BALANCES", False)
+    def test_render_without_balances(self):
+        form = SimpleTransactionForm()
+        with self.assertNumQueries(1):
+            html = str(form)
+        self.assertIn("Income</option>", html)
+        self.assertNotIn("€", html)
+
 
 class CurrencyTradeFormTestCase(DataProvider, TestCase):
     def setUp(self):
@@ -321,3 +346,36 @@ class CurrencyTradeFormTestCase(DataProvider, TestCase):
         self.assertEqual(
             form.errors, {"__all__": ["Destination account does not support CZK"]}
         )
+
+
+class CurrencyTradeFormRenderTestCase(DataProvider, TestCase):
+    def test_render_num_queries(self):
+        self.account(name="GBP", type=AccountType.asset, currencies=["GBP"])
+        self.account(name="Trading", type=AccountType.trading, currencies=["GBP"])
+        form = CurrencyTradeForm()
+        # The source & destination fields share their choices
+        with self.assertNumQueries(2):
+            html = str(form)
+        self.assertIn("GBP [£0.00]", html)
+
+
+class LegFormSetTestCase(DataProvider, TestCase):
+    def setUp(self):
+        self.bank = self.account(is_bank_account=True, type=AccountType.asset)
+        self.income = self.account(type=AccountType.income)
+        statement_import = StatementImport.objects.create(
+            bank_account=self.bank, source="csv"
+        )
+        self.line = StatementLine.objects.create(
+            date="2000-01-01",
+            statement_import=statement_import,
+            amount=Decimal("100.16"),
+        )
+
+    def test_render_num_queries(self):
+        formset = LegFormSet(statement_line=self.line, prefix="legs")
+        # Account choices are only fetched once for all forms
+        with self.assertNumQueries(1):
+            for form in formset.forms:
+                str(form)
+            str(formset.empty_form)
@@ -4,11 +4,13 @@ import warnings
 from datetime import date
 from decimal import Decimal
 
+from django.db import connection
 from django.db import transaction
 from django.db import transaction as db_transaction
 from django.db.utils import DatabaseError, IntegrityError, OperationalError
 from django.test import TestCase, override_settings
 from django.test.testcases import TransactionTestCase as DbTransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils.translation import activate, get_language, to_locale
 from moneyed.classes import Money
 from parameterized import parameterized
@@ -27,6 +29,7 @@ from hordak.models import (
 )
 from hordak.tests.utils import DataProvider
 from hordak.utilities.currency import Balance
+from hordak.utilities.statement_import import statement_line_fingerprint
 from hordak.utilities.test import postgres_only
 
 warnings.simplefilter("ignore", category=DeprecationWarning)
@@ -561,6 +564,20 @@ class AccountTestCase(DataProvider, DbTransactionTestCase):
         )
         self.assertEqual(src.balance, Balance([Money("100", "EUR")]))
 
+    def test_with_balances_raw(self):
+        src = self.account(type=AccountType.liability)
+        dst = self.account(type=AccountType.expense)
+        src.transfer_to(dst, Money(100, "EUR"))
+        src.transfer_to(dst, Money(10, "EUR"))
+
+        src = Account.objects.filter(pk=src.pk).with_balances(raw=True).get()
+        self.assertEqual(src.balance, ((Decimal("110"), "EUR"),))
+
+    def test_with_balances_raw_no_legs(self):
+        account = self.account()
+        account = Account.objects.filter(pk=account.pk).with_balances(raw=True).get()
+        self.assertEqual(account.balance, ((Decimal("0"), "EUR"),))
+
     @parameterized.expand(
         [
             (None, AccountType.expense),
@@ -1099,6 +1116,74 @@ class StatementLineTestCase(DataProvider, DbTransactionTestCase):
         line.transaction = Transaction()
         self.assertEqual(line.is_reconciled, True)
 
+    def test_fingerprint(self):
+        """Identical lines are given the lowest unused ordinal"""
+
+        def create_line():
+            return StatementLine.objects.create(
+                date="2016-01-01",
+                statement_import=self.statement_import,
+                amount=100,
+                description="Test",
+            )
+
+        line1, line2, line3 = create_line(), create_line(), create_line()
+        self.assertEqual(
+            len({line1.fingerprint, line2.fingerprint, line3.fingerprint}), 3
+        )
+
+        fingerprint = line2.fingerprint
+        line2.delete()
+        self.assertEqual(create_line().fingerprint, fingerprint)
+
+        # Saving again does not change the fingerprint
+        fingerprint = line1.fingerprint
+        line1.description = " TEST "
+        line1.save()
+        line1.refresh_from_db()
+        self.assertEqual(line1.fingerprint, fingerprint)
+
+    def test_fingerprint_changed(self):
+        """The fingerprint is recalculated when the line is edited"""
+        line = StatementLine.objects.create(
+            date="2016-01-01",
+            statement_import=self.statement_import,
+            amount=100,
+            description="Test",
+        )
+        line = StatementLine.objects.get(pk=line.pk)
+        line.description = "Corrected"
+        line.amount = Decimal("101")
+        line.save(update_fields=["description", "amount"])
+        line.refresh_from_db()
+        self.assertEqual(
+            line.fingerprint,
+            statement_line_fingerprint(
+                self.bank.pk, date(2016, 1, 1), Decimal("101"), "Corrected", 0
+            ),
+        )
+
+        # Saving without changing these fields does not recalculate the fingerprint
+        with self.assertNumQueries(1):
+            line.save()
+
+    def test_fingerprint_queries(self):
+        """The statement import is only fetched if it has not been loaded"""
+        line = StatementLine(
+            date="2016-01-01", statement_import=self.statement_import, amount=100
+        )
+        with self.assertNumQueries(2):  # Used fingerprints, insert
+            line.save()
+
+        line = StatementLine(
+            date="2016-01-01",
+            statement_import_id=self.statement_import.pk,
+            amount=100,
+        )
+        with self.assertNumQueries(3):  # Bank account, used fingerprints, insert
+            line.save()
+        self.assertFalse(StatementLine.statement_import.is_cached(line))
+
     def test_create_transaction_money_in(self):
         """Call StatementLine.create_transaction() for a sale"""
         line = StatementLine.objects.create(
@@ -1131,6 +1216,89 @@ class StatementLineTestCase(DataProvider, DbTransactionTestCase):
         self.assertEqual(line.transaction, transaction)
         Account.validate_accounting_equation()
 
+    def test_create_transactions(self):
+        """Call StatementLine.objects.create_transactions() with a single account"""
+        for amount in (-100, -20):
+            StatementLine.objects.create(
+                date="2016-01-01", statement_import=self.statement_import, amount=amount
+            )
+        reconciled = StatementLine.objects.create(
+            date="2016-01-01", statement_import=self.statement_import, amount=-5
+        )
+        reconciled.create_transaction(self.sales)
+
+        transactions = StatementLine.objects.create_transactions(self.expenses)
+        self.assertEqual(len(transactions), 2)
+        self.assertEqual(transactions[0].legs.count(), 2)
+        self.assertEqual(transactions[0].date, date(2016, 1, 1))
+        self.assertEqual(self.bank.get_balance(), Balance(-125, "EUR"))
+        self.assertEqual(self.expenses.get_balance(), Balance(120, "EUR"))
+        self.assertFalse(StatementLine.objects.filter(transaction=None).exists())
+        Account.validate_accounting_equation()
+
+        # Nothing left to reconcile
+        self.assertEqual(StatementLine.objects.create_transactions(self.expenses), [])
+
+    def test_create_transactions_mapping(self):
+        """Call StatementLine.objects.create_transactions() with a dict of accounts"""
+        sale = StatementLine.objects.create(
+            date="2016-01-01", statement_import=self.statement_import, amount=100
+        )
+        expense = StatementLine.objects.create(
+            date="2016-01-02", statement_import=self.statement_import, amount=-30
+        )
+        other = StatementLine.objects.create(
+            date="2016-01-03", statement_import=self.statement_import, amount=-10
+        )
+
+        transactions = StatementLine.objects.filter(
+            pk__in=[sale.pk, expense.pk]
+        ).create_transactions(
+            {sale: self.sales, expense.pk: self.expenses.pk, other: self.sales}
+        )
+        self.assertEqual(len(transactions), 2)
+        self.assertEqual(self.bank.get_balance(), Balance(70, "EUR"))
+        self.assertEqual(self.sales.get_balance(), Balance(100, "EUR"))
+        self.assertEqual(self.expenses.get_balance(), Balance(30, "EUR"))
+        sale.refresh_from_db()
+        expense.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(sale.transaction.date, date(2016, 1, 1))
+        self.assertEqual(expense.transaction.date, date(2016, 1, 2))
+        self.assertIsNone(other.transaction)
+        Account.validate_accounting_equation()
+
+    @postgres_only("Other databases create each transaction individually")
+    def test_create_transactions_queries(self):
+        """The number of queries does not depend upon the number of lines"""
+
+        def create_transactions(num_lines):
+            for _ in range(num_lines):
+                StatementLine.objects.create(
+                    date="2016-01-01", statement_import=self.statement_import, amount=-1
+                )
+            with CaptureQueriesContext(connection) as queries:
+                transactions = StatementLine.objects.create_transactions(self.expenses)
+            self.assertEqual(len(transactions), num_lines)
+            return len(queries)
+
+        self.assertEqual(create_transactions(2), create_transactions(20))
+        self.assertEqual(self.expenses.get_balance(), Balance(22, "EUR"))
+
+    def test_unreconcile(self):
+        """Call StatementLine.objects.unreconcile()"""
+        for amount in (100, -30):
+            StatementLine.objects.create(
+                date="2016-01-01", statement_import=self.statement_import, amount=amount
+            )
+        StatementLine.objects.create_transactions(self.sales)
+        self.assertEqual(Transaction.objects.count(), 2)
+
+        self.assertEqual(StatementLine.objects.unreconcile(), 2)
+        self.assertEqual(Transaction.objects.count(), 0)
+        self.assertEqual(self.bank.get_balance(), Balance(0, "EUR"))
+        self.assertEqual(StatementLine.objects.filter(transaction=None).count(), 2)
+
 
 class TestQueryAccount(DataProvider, TestCase):
     def test_contains_currency(self):
@@ -1,7 +1,13 @@
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import TestCase, TransactionTestCase
 
-from hordak.models import TransactionCsvImport
+from hordak.models import StatementLine, StatementRule, TransactionCsvImport
+from hordak.tests.utilities.test_statement_readers import OFX_SGML
 from hordak.tests.utils import DataProvider
 
 
@@ -49,3 +55,196 @@ class TransactionCsvImportTestCase(DataProvider, TestCase):
         self.assertEqual(columns[5].column_heading, "Memo")
         self.assertEqual(columns[5].to_field, "description")
         self.assertEqual(columns[5].example, "Some random notes")
+
+    def test_iter_datasets(self):
+        f = SimpleUploadedFile(
+            "data.csv",
+            "Date;Amount;Memo\n1/1/2000;1,50;Café\n2/1/2000;2;\n\n3/1/2000;3;\n".encode(
+                "cp1252"
+            ),
+        )
+        inst = TransactionCsvImport.objects.create(
+            has_headings=True, file=f, hordak_import=self.statement_import()
+        )
+        inst.create_columns()
+        self.assertEqual(
+            [c.to_field for c in inst.columns.all()], ["date", "amount", "description"]
+        )
+
+        datasets = list(inst.iter_datasets(batch_size=2))
+        self.assertEqual([len(d) for d in datasets], [2, 1])
+        self.assertEqual(datasets[0].headers, ["date", "amount", "description"])
+        self.assertEqual(datasets[0][0], ("1/1/2000", "1,50", "Café"))
+        self.assertEqual(len(inst.get_dataset()), 3)
+
+    def test_detect_date_format(self):
+        f = SimpleUploadedFile(
+            "data.csv", b"Amount,When\n1,01/02/2000\n2,\n3\n4,03/02/2000\n"
+        )
+        inst = TransactionCsvImport.objects.create(
+            has_headings=True, file=f, hordak_import=self.statement_import()
+        )
+        inst.create_columns()
+        # No date column
+        self.assertIsNone(inst.detect_date_format())
+
+        inst.columns.filter(column_number=2).update(to_field="date")
+        # Ambiguous, so not changed
+        self.assertIsNone(inst.detect_date_format())
+        self.assertEqual(inst.date_format, "%d-%m-%Y")
+
+        self.assertEqual(inst.detect_date_format(sample_size=1), None)
+        inst.file = SimpleUploadedFile(
+            "data.csv", b"Amount,When\n1,01/02/2000\n2,\n3\n4,13/02/2000\n"
+        )
+        inst.save()
+        self.assertEqual(inst.detect_date_format(), "%d/%m/%Y")
+        inst.refresh_from_db()
+        self.assertEqual(inst.date_format, "%d/%m/%Y")
+
+    def create_import(self):
+        f = SimpleUploadedFile(
+            "data.csv",
+            b"Date,Amount,Memo\n1/1/2000,1,A\n2/1/2000,2,B\n3/1/2000,3,C\n",
+        )
+        inst = TransactionCsvImport.objects.create(
+            has_headings=True,
+            file=f,
+            date_format="%d/%m/%Y",
+            hordak_import=self.statement_import(),
+        )
+        inst.create_columns()
+        return inst
+
+    def test_start_progress(self):
+        inst = self.create_import()
+        saved = []
+        with mock.patch.object(
+            TransactionCsvImport,
+            "save",
+            autospec=True,
+            side_effect=lambda inst, **kw: saved.append(inst.progress),
+        ):
+            inst.start(dry_run=False, batch_size=2)
+
+        # Progress is saved after each batch
+        self.assertEqual(saved, [0, 2, 3, 3])
+
+    def test_run(self):
+        inst = self.create_import()
+        result = inst.run(dry_run=False, batch_size=2)
+
+        self.assertEqual(result.totals["new"], 3)
+        inst.refresh_from_db()
+        self.assertEqual(inst.state, "done")
+        self.assertEqual(inst.progress, 3)
+        self.assertEqual(inst.result["totals"]["new"], 3)
+        self.assertEqual(inst.result["dry_run"], False)
+        self.assertEqual(StatementLine.objects.count(), 3)
+        self.assertEqual(inst.get_result(dry_run=False).totals["new"], 3)
+        self.assertIsNone(inst.get_result(dry_run=True))
+
+    def test_run_rules(self):
+        """Statement rules are applied to the imported lines"""
+        inst = self.create_import()
+        StatementRule.objects.create(
+            description_pattern="^[AB]$", to_account=DataProvider.account(self)
+        )
+        inst.run(dry_run=True)
+        self.assertEqual(inst.result["categorised"], 0)
+
+        inst.run(dry_run=False)
+        self.assertEqual(inst.result["categorised"], 2)
+        self.assertEqual(StatementLine.objects.exclude(transaction=None).count(), 2)
+
+    def test_run_ofx(self):
+        f = SimpleUploadedFile("statement.ofx", OFX_SGML.replace(b"Caf\xe9", b"Cafe"))
+        inst = TransactionCsvImport.objects.create(
+            has_headings=False, file=f, hordak_import=self.statement_import()
+        )
+        inst.create_columns()
+        self.assertEqual(
+            [(c.column_heading, c.to_field) for c in inst.columns.all()],
+            [
+                ("date", "date"),
+                ("amount", "amount"),
+                ("description", "description"),
+                ("source_data", None),
+            ],
+        )
+        self.assertEqual(inst.columns.all()[0].example, "2000-01-03")
+        self.assertEqual(inst.detect_date_format(), "%Y-%m-%d")
+
+        result = inst.run(dry_run=False)
+        self.assertEqual(result.totals["new"], 2, result.as_json())
+
+        line = StatementLine.objects.order_by("date").first()
+        self.assertEqual(line.date, date(2000, 1, 3))
+        self.assertEqual(line.amount, Decimal("-10.50"))
+        self.assertEqual(line.description, "Cafe & Bar")
+        self.assertEqual(line.source_data["fitid"], "1001")
+
+        # Importing again skips the existing lines
+        self.assertEqual(inst.run(dry_run=False).totals["skip"], 2)
+
+
+class TransactionCsvImportAtomicTestCase(DataProvider, TransactionTestCase):
+    def create_import(
+        self, data=b"Date,Amount,Memo\n1/1/2000,1,A\n2/1/2000,2,B\n3/1/2000,x,C\n"
+    ):
+        inst = TransactionCsvImport.objects.create(
+            has_headings=True,
+            file=SimpleUploadedFile("data.csv", data),
+            date_format="%d/%m/%Y",
+            hordak_import=self.statement_import(),
+        )
+        inst.create_columns()
+        return inst
+
+    def test_run_error_rolls_back(self):
+        """Batches imported before an error are rolled back"""
+        inst = self.create_import()
+        inst.run(dry_run=False, batch_size=2)
+        self.assertEqual(inst.state, "failed")
+        self.assertEqual(StatementLine.objects.count(), 0)
+        inst.refresh_from_db()
+        self.assertEqual(inst.progress, 3)
+
+    def test_run_not_atomic(self):
+        """Batches are committed as they are imported"""
+        inst = self.create_import()
+        inst.run(dry_run=False, batch_size=2, atomic=False)
+        self.assertEqual(inst.state, "failed")
+        self.assertEqual(StatementLine.objects.count(), 2)
+
+    def test_run_progress(self):
+        """Progress is visible to other connections before the import commits"""
+        inst = self.create_import(b"Date,Amount,Memo\n1/1/2000,1,A\n2/1/2000,2,B\n")
+        seen = []
+
+        def apply_statement_rules(lines):
+            other = connections.create_connection(DEFAULT_DB_ALIAS)
+            try:
+                seen.append(TransactionCsvImport.objects.get(pk=inst.pk).progress)
+                with other.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT progress FROM hordak_transactioncsvimport WHERE id = %s",
+                        [inst.pk],
+                    )
+                    seen.append(cursor.fetchone()[0])
+                    cursor.execute("SELECT COUNT(*) FROM hordak_statementline")
+                    seen.append(cursor.fetchone()[0])
+            finally:
+                other.close()
+            return []
+
+        with mock.patch(
+            "hordak.utilities.statement_rules.apply_statement_rules",
+            apply_statement_rules,
+        ):
+            inst.run(dry_run=False, batch_size=1)
+
+        # Progress was committed, but the statement lines were not
+        self.assertEqual(seen, [2, 2, 0])
+        self.assertEqual(inst.state, "done")
+        self.assertEqual(StatementLine.objects.count(), 2)
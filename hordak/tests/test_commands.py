@@ -1,7 +1,12 @@
-from django.core.management import call_command
+import json
+from io import StringIO
+
+from django.core.management import CommandError, call_command
 from django.test.testcases import TestCase
+from moneyed import Money
 
-from hordak.models import Account
+from hordak.models import Account, AccountType, StatementLine
+from hordak.tests.utils import DataProvider
 
 
 class CreateChartOfAccountsTestCase(TestCase):
@@ -16,3 +21,44 @@ class CreateChartOfAccountsTestCase(TestCase):
         self.assertGreater(Account.objects.count(), 10)
         account = Account.objects.all()[0]
         self.assertEqual(account.currencies, ["USD", "EUR"])
+
+
+class ExportLedgerTestCase(DataProvider, TestCase):
+    def test_export(self):
+        bank = self.account(type=AccountType.asset, code="9")
+        income = self.account(type=AccountType.income)
+        income.transfer_to(bank, Money(100, "EUR"), date="2000-01-01")
+
+        out = StringIO()
+        call_command(
+            "export_ledger", "--account", "9", "--format", "ndjson", stdout=out
+        )
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([r["row_type"] for r in rows], ["opening", "leg", "closing"])
+        self.assertEqual(rows[-1]["balance"], "100.00")
+
+    def test_export_missing_account(self):
+        with self.assertRaises(CommandError):
+            call_command("export_ledger", "--account", "foo")
+
+
+class ReconcileStatementLinesTestCase(DataProvider, TestCase):
+    def test_reconcile(self):
+        bank = self.account(type=AccountType.asset, code="9", is_bank_account=True)
+        income = self.account(type=AccountType.income)
+        transaction = income.transfer_to(bank, Money(100, "EUR"), date="2000-01-01")
+        line = StatementLine.objects.create(
+            statement_import=self.statement_import(bank_account=bank),
+            date="2000-01-02",
+            amount=100,
+        )
+
+        out = StringIO()
+        call_command("reconcile_statement_lines", "--dry-run", stdout=out)
+        self.assertIn("Matched: 1  Ambiguous: 0  Unmatched: 0", out.getvalue())
+        line.refresh_from_db()
+        self.assertIsNone(line.transaction)
+
+        call_command("reconcile_statement_lines", "--account", "9", stdout=StringIO())
+        line.refresh_from_db()
+        self.assertEqual(line.transaction, transaction)
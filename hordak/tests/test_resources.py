@@ -1,12 +1,15 @@
 import logging
 from datetime import date
 from decimal import Decimal
+from unittest import mock
 
 import tablib
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
 from hordak.models import AccountType, StatementImport, StatementLine
-from hordak.resources import StatementLineResource
+from hordak.resources import BulkStatementLineResource, StatementLineResource
 from hordak.tests.utils import DataProvider
 
 
@@ -51,6 +54,41 @@ class StatementLineResourceTestCase(DataProvider, TestCase):
         # The record in the second should have been ignored
         self.assertEqual(StatementLine.objects.count(), 1)
 
+    def test_import_duplicates_other_bank_account(self):
+        """Lines in other bank accounts are not considered duplicates"""
+        dataset = tablib.Dataset(
+            ["15/6/2016", "5.10", "Example payment"],
+            headers=["date", "amount", "description"],
+        )
+        other_account = DataProvider.account(
+            self, is_bank_account=True, type=AccountType.asset
+        )
+        other_import = StatementImport.objects.create(
+            bank_account=other_account, source="csv"
+        )
+        StatementLineResource("%d/%m/%Y", other_import).import_data(dataset)
+        self.makeResource().import_data(dataset)
+
+        self.assertEqual(StatementLine.objects.count(), 2)
+
+    def test_import_skip_duplicates_queries(self):
+        """Existing lines are loaded once, rather than queried for each row"""
+        rows = [["15/6/2016", "5.10", "Payment {}".format(i)] for i in range(10)]
+        self.makeResource().import_data(
+            tablib.Dataset(*rows, headers=["date", "amount", "description"])
+        )
+
+        resource = self.makeResource()
+        dataset = tablib.Dataset(*rows, headers=["date", "amount", "description"])
+        with self.assertNumQueries(1):
+            resource.before_import(dataset)
+        self.assertEqual(len(resource.existing_fingerprints), 10)
+
+        resource.import_data(
+            tablib.Dataset(*rows, headers=["date", "amount", "description"])
+        )
+        self.assertEqual(StatementLine.objects.count(), 10)
+
     def test_import_skip_duplicates_whitespace(self):
         dataset1 = tablib.Dataset(
             ["15/6/2016", "5.10", "Example payment"],
@@ -82,6 +120,70 @@ class StatementLineResourceTestCase(DataProvider, TestCase):
 
         self.assertEqual(StatementLine.objects.count(), 2)
 
+    def test_import_identical_after_whitespace(self):
+        dataset = tablib.Dataset(
+            ["15/6/2016", "5.10", "Example payment"],
+            ["15/6/2016", "5.10", " Example payment "],
+            ["15/6/2016", "5.10", "Example payment"],
+            headers=["date", "amount", "description"],
+        )
+        resource = self.makeResource()
+        resource.import_data(dataset)
+
+        # Each identical line has a different fingerprint
+        self.assertEqual(
+            len(set(StatementLine.objects.values_list("fingerprint", flat=True))), 3
+        )
+        self.assertEqual(resource.dataset[1][2], "Example payment")
+        self.assertEqual(StatementLine.objects.count(), 3)
+
+        # Importing again, with an additional identical row, only imports that row
+        dataset = tablib.Dataset(
+            *[["15/6/2016", "5.10", "Example payment"]] * 4,
+            headers=["date", "amount", "description"],
+        )
+        self.makeResource().import_data(dataset)
+        self.assertEqual(StatementLine.objects.count(), 4)
+
+    def test_import_skip_duplicates_normalised(self):
+        """Descriptions differing only in case & spacing are duplicates"""
+        self.makeResource().import_data(
+            tablib.Dataset(
+                ["15/6/2016", "5.10", "Example  payment"],
+                headers=["date", "amount", "description"],
+            )
+        )
+        self.makeResource().import_data(
+            tablib.Dataset(
+                ["15/6/2016", "5.1", "EXAMPLE payment"],
+                headers=["date", "amount", "description"],
+            )
+        )
+        self.assertEqual(StatementLine.objects.count(), 1)
+
+    def test_import_skip_existing_line(self):
+        """Lines created elsewhere are also detected as duplicates"""
+        statement_import = StatementImport.objects.create(
+            bank_account=self.account, source="manual"
+        )
+        line = StatementLine.objects.create(
+            statement_import=statement_import,
+            date="2016-06-15",
+            amount="5.10",
+            description="Example payment",
+        )
+        self.assertEqual(len(line.fingerprint), 64)
+
+        dataset = tablib.Dataset(
+            ["15/6/2016", "5.10", "Example payment"],
+            ["15/6/2016", "5.10", "Example payment"],
+            headers=["date", "amount", "description"],
+        )
+        result = self.makeResource().import_data(dataset)
+        self.assertEqual(result.totals["skip"], 1)
+        self.assertEqual(result.totals["new"], 1)
+        self.assertEqual(StatementLine.objects.count(), 2)
+
     def test_import_a_few(self):
         dataset = tablib.Dataset(
             ["15/6/2016", "5.10", "Example payment"],
@@ -254,3 +356,93 @@ class StatementLineResourceTestCase(DataProvider, TestCase):
         result = self.makeResource().import_data(dataset)
         self.assertEqual(len(result.row_errors()), 1)
         self.assertIn("zero not allowed", str(result.row_errors()[0][1][0].error))
+
+
+class BulkStatementLineResourceTestCase(StatementLineResourceTestCase):
+    """Run the same tests against the bulk resource"""
+
+    def makeResource(self):
+        statement_import = StatementImport.objects.create(
+            bank_account=self.account, source="csv"
+        )
+        return BulkStatementLineResource("%d/%m/%Y", statement_import)
+
+    def test_import_queries(self):
+        def import_rows(num_rows):
+            rows = [["15/6/2016", "5.10", f"{num_rows}-{i}"] for i in range(num_rows)]
+            dataset = tablib.Dataset(*rows, headers=["date", "amount", "description"])
+            with CaptureQueriesContext(connection) as queries:
+                result = self.makeResource().import_data(dataset, use_transactions=True)
+            self.assertEqual(result.totals["new"], num_rows)
+            return len(queries)
+
+        # The number of queries does not depend upon the number of rows
+        self.assertEqual(import_rows(5), import_rows(50))
+        self.assertEqual(StatementLine.objects.count(), 55)
+
+    def test_import_errors(self):
+        rows = [["15/6/2016", "5.10", f"Payment {i}"] for i in range(5)]
+        rows.append(["15/6/2016", "0", "Zero"])
+        dataset = tablib.Dataset(*rows, headers=["date", "amount", "description"])
+        result = self.makeResource().import_data(dataset, use_transactions=True)
+
+        self.assertEqual(result.totals["new"], 5)
+        self.assertEqual([number for number, _ in result.row_errors()], [6])
+        # Errors roll back the import
+        self.assertEqual(StatementLine.objects.count(), 0)
+
+    def test_import_datasets_parallel(self):
+        """Rows can be parsed in worker processes, with the same result"""
+        rows = [["15/6/2016", "5.10", f"Payment {i}"] for i in range(7)]
+        rows[4] = ["15/6/2016", "0", "Zero"]
+        rows[5] = ["31/6/2016", "1", "Bad date"]
+        headers = ["date", "amount", "description"]
+
+        def import_datasets(**kwargs):
+            datasets = [
+                tablib.Dataset(*batch, headers=headers)
+                for batch in (rows[:3], rows[3:6], rows[6:])
+            ]
+            result = self.makeResource().import_datasets(
+                datasets, dry_run=True, **kwargs
+            )
+            return (
+                dict(result.totals),
+                [
+                    (n, [str(e.error) for e in errors])
+                    for n, errors in result.row_errors()
+                ],
+            )
+
+        expected = import_datasets()
+        self.assertEqual(import_datasets(processes=2), expected)
+        self.assertEqual(
+            expected[1],
+            [
+                (5, ["Amount of zero not allowed"]),
+                (6, ["Invalid value for date. Expected dd/mm/yyyy"]),
+            ],
+        )
+        self.assertEqual(expected[0]["new"], 5)
+
+    def test_import_conflicting_fingerprint(self):
+        """Rows conflicting with lines inserted concurrently are skipped"""
+        dataset = tablib.Dataset(
+            ["15/6/2016", "5.10", "Example payment"],
+            ["16/6/2016", "5.10", "Example payment"],
+            headers=["date", "amount", "description"],
+        )
+        self.makeResource().import_data(
+            tablib.Dataset(dataset[0], headers=dataset.headers)
+        )
+
+        resource = self.makeResource()
+        with mock.patch.object(
+            resource, "_get_existing_fingerprints", return_value=set()
+        ):
+            result = resource.import_data(dataset, use_transactions=True)
+
+        self.assertFalse(result.has_errors())
+        self.assertEqual(result.totals["new"], 1)
+        self.assertEqual(result.totals["skip"], 1)
+        self.assertEqual(StatementLine.objects.count(), 2)
@@ -0,0 +1,55 @@
+import json
+from decimal import Decimal
+
+from django.test import TestCase
+from moneyed import Money
+
+from hordak.utilities.currency import Balance
+from hordak.utilities.db import (
+    get_interned_currency,
+    json_to_balance,
+    json_to_raw_balance,
+)
+
+
+class JsonToBalanceTestCase(TestCase):
+    def test_from_string(self):
+        value = json.dumps(
+            [{"amount": 100.5, "currency": "EUR"}, {"amount": -3, "currency": "USD"}]
+        )
+        self.assertEqual(
+            json_to_balance(value),
+            Balance([Money("100.5", "EUR"), Money("-3", "USD")]),
+        )
+
+    def test_from_bytes(self):
+        value = b'[{"amount": 100.5, "currency": "EUR"}]'
+        self.assertEqual(json_to_balance(value), Balance([Money("100.5", "EUR")]))
+
+    def test_already_parsed(self):
+        value = [{"amount": 100.5, "currency": "EUR"}]
+        self.assertEqual(json_to_balance(value), Balance([Money("100.5", "EUR")]))
+
+    def test_empty(self):
+        self.assertEqual(json_to_balance("[]"), Balance())
+
+    def test_currencies_are_shared(self):
+        balance1 = json_to_balance('[{"amount": 1, "currency": "EUR"}]')
+        balance2 = json_to_balance('[{"amount": 2, "currency": "EUR"}]')
+        self.assertIs(balance1["EUR"].currency, balance2["EUR"].currency)
+        self.assertIs(balance1["EUR"].currency, get_interned_currency("EUR"))
+
+
+class JsonToRawBalanceTestCase(TestCase):
+    def test_from_string(self):
+        value = json.dumps(
+            [{"amount": 100.5, "currency": "EUR"}, {"amount": -3, "currency": "USD"}]
+        )
+        self.assertEqual(
+            json_to_raw_balance(value),
+            ((Decimal("100.5"), "EUR"), (Decimal("-3"), "USD")),
+        )
+
+    def test_already_parsed(self):
+        value = [{"amount": Decimal("1.10"), "currency": "EUR"}]
+        self.assertEqual(json_to_raw_balance(value), ((Decimal("1.10"), "EUR"),))
@@ -0,0 +1,82 @@
+import datetime
+import json
+from decimal import Decimal
+
+from django.test import TestCase
+from moneyed import Money
+
+from hordak.models import AccountType
+from hordak.tests.utils import DataProvider
+from hordak.utilities.export import (
+    iter_account_statement,
+    iter_csv,
+    iter_general_ledger,
+    iter_ndjson,
+)
+
+
+class ExportTestCase(DataProvider, TestCase):
+    def setUp(self):
+        self.bank = self.account(type=AccountType.asset, currencies=["EUR", "USD"])
+        self.income = self.account(type=AccountType.income)
+        self.unused = self.account(type=AccountType.expense)
+
+        self.income.transfer_to(self.bank, Money(100, "EUR"), date="2000-01-01")
+        self.income.transfer_to(self.bank, Money(20, "EUR"), date="2000-01-02")
+        self.bank.transfer_to(self.income, Money(5, "EUR"), date="2000-01-03")
+
+    def test_account_statement(self):
+        rows = list(iter_account_statement(self.bank))
+        self.assertEqual(
+            [(r["row_type"], r["currency"], r["balance"]) for r in rows],
+            [
+                ("opening", "EUR", Decimal(0)),
+                ("opening", "USD", Decimal(0)),
+                ("leg", "EUR", Decimal(100)),
+                ("leg", "EUR", Decimal(120)),
+                ("leg", "EUR", Decimal(115)),
+                ("closing", "EUR", Decimal(115)),
+                ("closing", "USD", Decimal(0)),
+            ],
+        )
+        self.assertEqual(rows[-2]["balance"], self.bank.get_balance()["EUR"].amount)
+
+    def test_account_statement_date_range(self):
+        rows = list(
+            iter_account_statement(
+                self.income,
+                date_from=datetime.date(2000, 1, 2),
+                date_to=datetime.date(2000, 1, 2),
+            )
+        )
+        self.assertEqual(
+            [(r["row_type"], r["date"], r["balance"]) for r in rows],
+            [
+                ("opening", datetime.date(2000, 1, 2), Decimal(100)),
+                ("leg", datetime.date(2000, 1, 2), Decimal(120)),
+                ("closing", datetime.date(2000, 1, 2), Decimal(120)),
+            ],
+        )
+
+    def test_general_ledger(self):
+        rows = list(iter_general_ledger(chunk_size=2))
+        accounts = {r["account"] for r in rows}
+        # Accounts with no activity are omitted
+        self.assertEqual(accounts, {self.bank.full_code, self.income.full_code})
+        self.assertEqual(len([r for r in rows if r["row_type"] == "leg"]), 6)
+
+    def test_general_ledger_num_queries(self):
+        with self.assertNumQueries(3):
+            list(iter_general_ledger(date_from=datetime.date(2000, 1, 2)))
+
+    def test_csv(self):
+        lines = list(iter_csv(iter_account_statement(self.income)))
+        self.assertEqual(lines[0].split(",")[0], "row_type")
+        self.assertEqual(len(lines), 6)
+
+    def test_ndjson(self):
+        lines = list(iter_ndjson(iter_account_statement(self.income)))
+        row = json.loads(lines[1])
+        self.assertEqual(row["row_type"], "leg")
+        self.assertEqual(row["balance"], "100.00")
+        self.assertEqual(row["date"], "2000-01-01")
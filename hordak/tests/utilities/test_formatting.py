@@ -0,0 +1,88 @@
+from decimal import Decimal
+
+import babel.numbers
+from django.test import TestCase
+from django.utils.translation import activate, get_language, to_locale
+from moneyed import Money
+from parameterized import parameterized
+
+from hordak.utilities.formatting import (
+    format_currency,
+    format_decimal,
+    format_monies,
+    get_currency_formatter,
+)
+
+LOCALES = ["en_US", "en_GB", "de_DE", "fr_FR", "hi_IN", "ja_JP", "ar_EG", "de_CH"]
+CURRENCIES = ["EUR", "USD", "GBP", "JPY", "BHD", "INR"]
+AMOUNTS = [
+    Decimal("0"),
+    Decimal("-0"),
+    Decimal("0.004"),
+    Decimal("0.005"),
+    Decimal("1"),
+    Decimal("-1.5"),
+    Decimal("1234.5"),
+    Decimal("-1234567.891"),
+    Decimal("12345678901234.56"),
+    Decimal("1E+3"),
+    10,
+    "42.10",
+]
+
+
+class FormattingTestCase(TestCase):
+    def setUp(self):
+        self.orig_locale = to_locale(get_language())
+        activate("en-US")
+
+    def tearDown(self):
+        activate(self.orig_locale)
+
+    @parameterized.expand([(locale,) for locale in LOCALES])
+    def test_format_currency_matches_babel(self, locale):
+        for currency in CURRENCIES:
+            for amount in AMOUNTS:
+                self.assertEqual(
+                    format_currency(amount, currency, locale=locale),
+                    babel.numbers.format_currency(
+                        Decimal(str(amount)), currency=currency, locale=locale
+                    ),
+                    f"{amount} {currency} {locale}",
+                )
+
+    @parameterized.expand([(locale,) for locale in LOCALES])
+    def test_format_decimal_matches_babel(self, locale):
+        for amount in AMOUNTS:
+            self.assertEqual(
+                format_decimal(amount, locale=locale),
+                babel.numbers.format_decimal(Decimal(str(amount)), locale=locale),
+            )
+
+    def test_format_currency_active_locale(self):
+        self.assertEqual(format_currency(Decimal("1234.5"), "EUR"), "€1,234.50")
+        activate("de")
+        self.assertEqual(format_currency(Decimal("1234.5"), "EUR"), "1.234,50\xa0€")
+
+    def test_format_monies(self):
+        self.assertEqual(
+            format_monies([Money("1", "EUR"), (Decimal("-2"), "USD")]),
+            ["€1.00", "-$2.00"],
+        )
+
+    def test_format_monies_accounting(self):
+        self.assertEqual(
+            format_monies([Money("1", "EUR"), Money("-2", "USD")], accounting=True),
+            ["€1.00", "($2.00)"],
+        )
+        # Amounts may be given as strings or floats
+        self.assertEqual(
+            format_monies([("-2", "USD"), (1.5, "EUR")], accounting=True),
+            ["($2.00)", "€1.50"],
+        )
+
+    def test_formatter_cached(self):
+        self.assertIs(
+            get_currency_formatter("en_US", "EUR"),
+            get_currency_formatter("en_US", "EUR"),
+        )
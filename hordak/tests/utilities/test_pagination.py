@@ -0,0 +1,121 @@
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import TestCase
+from moneyed import Money
+
+from hordak.models import Leg, Transaction
+from hordak.tests.utils import DataProvider
+from hordak.utilities.pagination import (
+    EstimatedCountPaginator,
+    InvalidCursor,
+    KeysetPaginator,
+    decode_cursor,
+    encode_cursor,
+    estimate_count,
+)
+
+
+class CursorTestCase(TestCase):
+    def test_round_trip(self):
+        cursor = encode_cursor(["2000-01-01", 5], reverse=True)
+        self.assertEqual(decode_cursor(cursor), (["2000-01-01", 5], True))
+
+    def test_invalid(self):
+        with self.assertRaises(InvalidCursor):
+            decode_cursor("not a cursor")
+
+
+class KeysetPaginatorTestCase(DataProvider, TestCase):
+    def setUp(self):
+        account1 = self.account()
+        account2 = self.account()
+        # Several transactions share a date, so the ordering relies on the ID
+        for day in [1, 1, 2, 2, 2, 3, 4]:
+            account1.transfer_to(account2, Money(1, "EUR"), date=f"2000-01-0{day}")
+        self.expected = list(Transaction.objects.order_by("-date", "-pk"))
+        self.paginator = KeysetPaginator(
+            Transaction.objects.all(), per_page=3, ordering=("-date", "-pk")
+        )
+
+    def test_forwards(self):
+        page1 = self.paginator.page()
+        self.assertEqual(list(page1), self.expected[0:3])
+        self.assertFalse(page1.has_previous())
+        self.assertTrue(page1.has_next())
+
+        page2 = self.paginator.page(page1.next_cursor)
+        self.assertEqual(list(page2), self.expected[3:6])
+        self.assertTrue(page2.has_previous())
+        self.assertTrue(page2.has_next())
+
+        page3 = self.paginator.page(page2.next_cursor)
+        self.assertEqual(list(page3), self.expected[6:])
+        self.assertTrue(page3.has_previous())
+        self.assertFalse(page3.has_next())
+
+    def test_backwards(self):
+        page2 = self.paginator.page(self.paginator.page().next_cursor)
+        page3 = self.paginator.page(page2.next_cursor)
+
+        page2_again = self.paginator.page(page3.previous_cursor)
+        self.assertEqual(list(page2_again), self.expected[3:6])
+        self.assertTrue(page2_again.has_next())
+        self.assertTrue(page2_again.has_previous())
+
+        page1_again = self.paginator.page(page2_again.previous_cursor)
+        self.assertEqual(list(page1_again), self.expected[0:3])
+        self.assertTrue(page1_again.has_next())
+        self.assertFalse(page1_again.has_previous())
+
+    def test_ascending(self):
+        paginator = KeysetPaginator(
+            Transaction.objects.all(), per_page=4, ordering=("date", "pk")
+        )
+        page1 = paginator.page()
+        page2 = paginator.page(page1.next_cursor)
+        self.assertEqual(list(page1) + list(page2), list(reversed(self.expected)))
+
+    def test_cursor_mismatch(self):
+        with self.assertRaises(InvalidCursor):
+            self.paginator.page(encode_cursor([1]))
+
+    def test_cursor_invalid_values(self):
+        for values in (["nope", "x"], ["2000-01-01", "x"], [["2000-01-01"], 1]):
+            with self.assertRaises(InvalidCursor):
+                self.paginator.page(encode_cursor(values))
+
+    def test_cursor_related_field(self):
+        paginator = KeysetPaginator(
+            Leg.objects.all(), per_page=3, ordering=("-transaction__date", "-pk")
+        )
+        page2 = paginator.page(paginator.page().next_cursor)
+        self.assertEqual(len(page2), 3)
+        with self.assertRaises(InvalidCursor):
+            paginator.page(encode_cursor(["nope", 1]))
+
+
+class EstimatedCountPaginatorTestCase(DataProvider, TestCase):
+    def setUp(self):
+        account1 = self.account()
+        account2 = self.account()
+        for _ in range(3):
+            account1.transfer_to(account2, Money(1, "EUR"))
+
+    def test_estimate_count(self):
+        estimate = estimate_count(Transaction.objects.all())
+        if connection.vendor in ("postgresql", "mysql"):
+            self.assertIsInstance(estimate, int)
+            self.assertEqual(estimate_count(Transaction.objects.none()), 0)
+        else:
+            self.assertIsNone(estimate)
+
+    def test_small_count_is_exact(self):
+        paginator = EstimatedCountPaginator(Transaction.objects.order_by("pk"), 2)
+        self.assertEqual(paginator.count, 3)
+        self.assertEqual(paginator.num_pages, 2)
+
+    @patch("hordak.utilities.pagination.estimate_count", return_value=50_000)
+    def test_large_count_is_estimated(self, estimate_count):
+        paginator = EstimatedCountPaginator(Transaction.objects.order_by("pk"), 2)
+        self.assertEqual(paginator.count, 50_000)
@@ -0,0 +1,268 @@
+from datetime import date
+from decimal import Decimal
+
+from django.db import connection
+from django.db.models.signals import post_delete
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from moneyed import Money
+
+from hordak.exceptions import ZeroAmountError
+from hordak.models import Account, AccountType, StatementLine, Transaction
+from hordak.tests.utils import DataProvider
+from hordak.utilities.currency import Balance
+from hordak.utilities.reconciliation import (
+    create_transactions,
+    description_similarity,
+    description_words,
+    link_statement_lines,
+    match_statement_lines,
+    reconcile_statement_lines,
+    unreconcile_statement_lines,
+)
+
+
+class DescriptionSimilarityTestCase(TestCase):
+    def test_similarity(self):
+        def similarity(a, b):
+            return description_similarity(description_words(a), description_words(b))
+
+        self.assertEqual(similarity("Acme Ltd", "CARD PAYMENT  ACME LTD 1234"), 1)
+        self.assertEqual(similarity("Acme Ltd", "Acme Inc"), 0.5)
+        self.assertEqual(similarity("Acme", "Other"), 0)
+        self.assertEqual(similarity("", "Acme"), 0)
+
+
+class ReconciliationTestCase(DataProvider, TestCase):
+    def setUp(self):
+        self.bank = self.account(type=AccountType.asset, is_bank_account=True)
+        self.income = self.account(type=AccountType.income)
+        self.statement_import = self.statement_import(bank_account=self.bank)
+
+    def line(self, date, amount, description=""):
+        return StatementLine.objects.create(
+            statement_import=self.statement_import,
+            date=date,
+            amount=Decimal(amount),
+            description=description,
+        )
+
+    def transfer_in(self, date, amount, description=""):
+        return self.income.transfer_to(
+            self.bank, Money(amount, "EUR"), date=date, description=description
+        )
+
+    def test_match(self):
+        transaction_in = self.transfer_in("2000-01-02", 10, "Acme")
+        transaction_out = self.bank.transfer_to(
+            self.income, Money(5, "EUR"), date="2000-01-01"
+        )
+        line_in = self.line("2000-01-01", "10", "Payment from ACME")
+        line_out = self.line("2000-01-01", "-5")
+        # Wrong amount, and outside date window
+        line_none1 = self.line("2000-01-01", "11")
+        line_none2 = self.line("2000-01-10", "10")
+
+        with self.assertNumQueries(2):
+            result = match_statement_lines()
+        self.assertEqual(
+            result.matches,
+            {line_in.pk: transaction_in.pk, line_out.pk: transaction_out.pk},
+        )
+        self.assertEqual(result.ambiguous, {})
+        self.assertEqual(result.unmatched, sorted([line_none1.pk, line_none2.pk]))
+        # Nothing is saved
+        self.assertEqual(StatementLine.objects.exclude(transaction=None).count(), 0)
+
+    def test_match_best(self):
+        """The most similar description is matched, then the closest date"""
+        acme = self.transfer_in("2000-01-03", 10, "Acme")
+        other = self.transfer_in("2000-01-01", 10, "Other")
+        acme_later = self.transfer_in("2000-01-04", 10, "Acme")
+        line = self.line("2000-01-01", "10", "ACME LTD")
+
+        result = match_statement_lines()
+        self.assertEqual(result.matches, {line.pk: acme.pk})
+
+        # A closer line takes the transaction, so the first line gets the next best
+        line2 = self.line("2000-01-02", "10", "ACME LTD")
+        result = match_statement_lines()
+        self.assertEqual(result.ambiguous, {})
+        self.assertEqual(result.matches, {line.pk: acme_later.pk, line2.pk: acme.pk})
+
+        result = match_statement_lines(min_similarity=1)
+        self.assertNotIn(other.pk, result.matches.values())
+
+    def test_ambiguous(self):
+        transaction1 = self.transfer_in("2000-01-01", 10)
+        transaction2 = self.transfer_in("2000-01-01", 10)
+        line = self.line("2000-01-01", "10")
+
+        result = match_statement_lines()
+        self.assertEqual(result.matches, {})
+        self.assertEqual(
+            sorted(result.ambiguous[line.pk]), [transaction1.pk, transaction2.pk]
+        )
+
+    def test_ambiguous_lines(self):
+        """Two lines equally matching one transaction are ambiguous"""
+        transaction = self.transfer_in("2000-01-02", 10)
+        line1 = self.line("2000-01-01", "10")
+        line2 = self.line("2000-01-03", "10")
+
+        result = match_statement_lines()
+        self.assertEqual(result.matches, {})
+        self.assertEqual(
+            result.ambiguous, {line1.pk: [transaction.pk], line2.pk: [transaction.pk]}
+        )
+
+    def test_other_bank_account(self):
+        other_bank = DataProvider.account(
+            self, type=AccountType.asset, is_bank_account=True
+        )
+        self.income.transfer_to(other_bank, Money(10, "EUR"), date="2000-01-01")
+        self.line("2000-01-01", "10")
+        self.assertEqual(match_statement_lines().matches, {})
+
+    def test_reconcile(self):
+        transaction = self.transfer_in("2000-01-01", 10)
+        line = self.line("2000-01-01", "10")
+        reconciled = self.line("2000-01-01", "10")
+        reconciled.transaction = self.transfer_in("2000-01-01", 10)
+        reconciled.save()
+
+        result = reconcile_statement_lines(
+            StatementLine.objects.filter(statement_import__bank_account=self.bank)
+        )
+        self.assertEqual(result.matches, {line.pk: transaction.pk})
+        line.refresh_from_db()
+        self.assertEqual(line.transaction, transaction)
+
+        # Everything is now reconciled
+        self.assertEqual(reconcile_statement_lines().matches, {})
+
+    def test_link_statement_lines(self):
+        transaction = self.transfer_in("2000-01-01", 10)
+        line1 = self.line("2000-01-01", "10")
+        line2 = self.line("2000-01-01", "10")
+        line2.transaction = self.transfer_in("2000-01-01", 10)
+        line2.save()
+
+        with self.assertNumQueries(1):
+            updated = link_statement_lines(
+                {line1.pk: transaction.pk, line2.pk: transaction.pk}
+            )
+        self.assertEqual(updated, 1)
+        line1.refresh_from_db()
+        line2.refresh_from_db()
+        self.assertEqual(line1.transaction, transaction)
+        self.assertNotEqual(line2.transaction, transaction)
+        self.assertEqual(link_statement_lines({}), 0)
+
+    def test_create_transactions(self):
+        expenses = DataProvider.account(self, type=AccountType.expense)
+        line1 = self.line("2000-01-01", "10", "In")
+        line2 = self.line("2000-01-02", "-3", "Out")
+        ignored = self.line("2000-01-02", "-3", "Ignored")
+
+        lines = StatementLine.objects.select_related("statement_import__bank_account")
+        transactions = create_transactions(
+            lines, {line1.pk: self.income.pk, line2.pk: expenses.pk}
+        )
+        self.assertEqual(len(transactions), 2)
+        self.assertEqual(self.bank.get_balance(), Balance(7, "EUR"))
+        self.assertEqual(expenses.get_balance(), Balance(3, "EUR"))
+        line2.refresh_from_db()
+        self.assertEqual(line2.transaction.date, date(2000, 1, 2))
+        self.assertIsNone(StatementLine.objects.get(pk=ignored.pk).transaction)
+
+        # Reconciled lines are ignored
+        self.assertEqual(create_transactions(lines, {line1.pk: expenses.pk}), [])
+
+    def test_create_transactions_same_as_create_transaction(self):
+        """Transactions created in bulk match those from StatementLine.create_transaction()"""
+
+        def describe(transaction):
+            transaction.refresh_from_db()
+            legs = transaction.legs.order_by("pk")
+            return (
+                transaction.date,
+                transaction.description,
+                [(leg.account_id, leg.debit, leg.credit) for leg in legs],
+            )
+
+        for amount in ("10", "-3"):
+            line = self.line("2000-01-01", amount, "Payment")
+            bulk_line = self.line("2000-01-01", amount, "Payment")
+            (bulk_transaction,) = create_transactions(
+                StatementLine.objects.filter(pk=bulk_line.pk),
+                {bulk_line.pk: self.income.pk},
+            )
+            transaction = line.create_transaction(self.income)
+            self.assertEqual(describe(bulk_transaction), describe(transaction))
+
+    def test_create_transactions_zero(self):
+        line = self.line("2000-01-01", "0")
+        with self.assertRaises(ZeroAmountError):
+            create_transactions([line], {line.pk: self.income.pk})
+
+    def test_unreconcile(self):
+        line1 = self.line("2000-01-01", "10")
+        line2 = self.line("2000-01-02", "-3")
+        other = self.line("2000-01-03", "5")
+        unreconciled = self.line("2000-01-04", "1")
+        for line in (line1, line2, other):
+            line.create_transaction(self.income)
+        kept = other.transaction
+
+        lines = StatementLine.objects.exclude(pk=other.pk)
+        self.assertEqual(unreconcile_statement_lines(lines), 2)
+        self.assertEqual(StatementLine.objects.filter(transaction=None).count(), 3)
+        self.assertEqual(list(Transaction.objects.all()), [kept])
+        self.assertEqual(self.bank.get_balance(), Balance(5, "EUR"))
+        self.assertIsNone(StatementLine.objects.get(pk=unreconciled.pk).transaction)
+        Account.validate_accounting_equation()
+
+        self.assertEqual(unreconcile_statement_lines(lines), 0)
+
+    def test_unreconcile_queries(self):
+        """The number of queries does not depend on the number of transactions"""
+
+        def unreconcile(num_lines):
+            for _ in range(num_lines):
+                self.line("2000-01-01", "10").create_transaction(self.income)
+            with CaptureQueriesContext(connection) as queries:
+                count = unreconcile_statement_lines(StatementLine.objects.all())
+            self.assertEqual(count, num_lines)
+            return len(queries)
+
+        self.assertEqual(unreconcile(2), unreconcile(20))
+        self.assertEqual(Transaction.objects.count(), 0)
+        self.assertEqual(self.bank.get_balance(), Balance(0, "EUR"))
+
+    def test_unreconcile_delete_signals(self):
+        """Transactions are deleted using delete(), so on_delete & signals apply"""
+        line = self.line("2000-01-01", "10")
+        transaction = line.create_transaction(self.income)
+        deleted = []
+
+        def receiver(sender, instance, **kwargs):
+            deleted.append(instance.pk)
+
+        post_delete.connect(receiver, sender=Transaction)
+        self.addCleanup(post_delete.disconnect, receiver, sender=Transaction)
+        unreconcile_statement_lines(StatementLine.objects.all())
+        self.assertEqual(deleted, [transaction.pk])
+
+    def test_unreconcile_keep_transactions(self):
+        transaction = self.transfer_in("2000-01-01", 10)
+        line = self.line("2000-01-01", "10")
+        link_statement_lines({line.pk: transaction.pk})
+
+        lines = StatementLine.objects.all()
+        self.assertEqual(
+            unreconcile_statement_lines(lines, delete_transactions=False), 1
+        )
+        self.assertIsNone(StatementLine.objects.get(pk=line.pk).transaction)
+        self.assertEqual(list(Transaction.objects.all()), [transaction])
+        self.assertEqual(self.bank.get_balance(), Balance(10, "EUR"))
@@ -0,0 +1,121 @@
+import codecs
+import csv
+from datetime import date, datetime
+from io import BytesIO
+
+from django.test import TestCase
+
+from hordak.utilities.statement_import import (
+    DATE_FORMATS,
+    detect_date_format,
+    get_date_parser,
+    iter_batches,
+    iter_lines,
+    read_csv,
+    sniff_dialect,
+    sniff_encoding,
+)
+
+
+class StatementImportUtilitiesTestCase(TestCase):
+    def test_sniff_encoding(self):
+        self.assertEqual(sniff_encoding(b"a,b\n"), "utf-8")
+        self.assertEqual(sniff_encoding("a,€\n".encode("utf-8")), "utf-8")
+        self.assertEqual(sniff_encoding(codecs.BOM_UTF8 + b"a,b\n"), "utf-8-sig")
+        self.assertEqual(sniff_encoding("a,b\n".encode("utf-16")), "utf-16")
+        self.assertEqual(sniff_encoding("a,€\n".encode("cp1252")), "cp1252")
+        # Truncated multi-byte character
+        self.assertEqual(sniff_encoding("a,€".encode("utf-8")[:-1]), "utf-8")
+
+    def test_sniff_dialect(self):
+        self.assertEqual(sniff_dialect("a;b;c\n1;2;3\n4;5").delimiter, ";")
+        self.assertEqual(sniff_dialect("a\tb\tc\n1\t2\t3\n").delimiter, "\t")
+        self.assertIs(sniff_dialect(""), csv.excel)
+
+    def test_iter_lines(self):
+        data = b'a,b\r\n1,"x\ny"\r\n2,z'
+        for chunk_size in (1, 2, 3, 100):
+            lines = list(iter_lines(BytesIO(data), "utf-8", chunk_size=chunk_size))
+            self.assertEqual(lines, ["a,b\r\n", '1,"x\n', 'y"\r\n', "2,z"])
+
+    def test_iter_lines_multibyte(self):
+        data = "€1\n€2\n".encode("utf-16")
+        lines = list(iter_lines(BytesIO(data), "utf-16", chunk_size=3))
+        self.assertEqual(lines, ["€1\n", "€2\n"])
+
+    def test_read_csv(self):
+        data = 'Date;Amount;Memo\r\n1/1/2000;"1,50";"Caf\xe9\nLondon"\r\n'.encode(
+            "cp1252"
+        )
+        rows = list(read_csv(BytesIO(data), chunk_size=4))
+        self.assertEqual(
+            rows, [["Date", "Amount", "Memo"], ["1/1/2000", "1,50", "Café\nLondon"]]
+        )
+
+    def test_iter_batches(self):
+        self.assertEqual(list(iter_batches(range(5), 2)), [[0, 1], [2, 3], [4]])
+        self.assertEqual(list(iter_batches([], 2)), [])
+
+    def test_get_date_parser(self):
+        values = [
+            "1/2/2000",
+            "01/02/2000",
+            "31/12/1999",
+            "1/2/69",
+            "1/2/68",
+            "29/2/2000",
+            # Python's strptime() requires four digit years for %Y
+            "1/2/20",
+            "1/2/200",
+            "1/2/02000",
+            " 1/2/2000",
+            "00/2/2000",
+            "1/13/2000",
+            "1/2/\u0662\u0660\u0660\u0660",
+        ]
+        for date_format, _ in DATE_FORMATS:
+            parse = get_date_parser(date_format)
+            for value in values:
+                value = value.replace("/", date_format[2])
+                try:
+                    expected = datetime.strptime(value, date_format).date()
+                except ValueError:
+                    with self.assertRaises(ValueError, msg=(value, date_format)):
+                        parse(value)
+                else:
+                    self.assertEqual(parse(value), expected, (value, date_format))
+
+        self.assertEqual(get_date_parser("%d/%m/%Y")("25/02/2000"), date(2000, 2, 25))
+        with self.assertRaises(ValueError):
+            get_date_parser("%d/%m/%Y")("25/02/20")
+        self.assertIs(get_date_parser("%d/%m/%Y"), get_date_parser("%d/%m/%Y"))
+        with self.assertRaises(ValueError):
+            get_date_parser("%d/%m/%Y")("25/02/2000 ")
+        with self.assertRaises(ValueError):
+            get_date_parser("%d/%m/%Y")("30/02/2000")
+        # Other formats use strptime()
+        self.assertEqual(get_date_parser("%d %b %Y")("25 Feb 2000"), date(2000, 2, 25))
+
+    def test_detect_date_format(self):
+        self.assertEqual(detect_date_format(["01/02/2000", "25/02/2000"]), "%d/%m/%Y")
+        self.assertEqual(detect_date_format(["02/01/2000", "02/25/2000"]), "%m/%d/%Y")
+        self.assertEqual(detect_date_format(["2000-02-25", ""]), "%Y-%m-%d")
+        self.assertEqual(detect_date_format(["25.02.00"]), "%d.%m.%y")
+        # The format which parses the most values wins
+        self.assertEqual(
+            detect_date_format(["25/02/2000", "26/02/2000", "02/27/2000"]), "%d/%m/%Y"
+        )
+        # Identical days & months give the same dates in either order
+        self.assertEqual(detect_date_format(["01/01/2000"]), "%d/%m/%Y")
+
+    def test_detect_date_format_ambiguous(self):
+        self.assertIsNone(detect_date_format(["01/02/2000", "03/02/2000"]))
+        self.assertIsNone(detect_date_format(["25/02/2000", "02/25/2000"]))
+        self.assertIsNone(detect_date_format(["2000-02-03"]))
+        self.assertIsNone(detect_date_format(["1/1/1", "not a date"]))
+        self.assertIsNone(detect_date_format([]))
+
+    def test_detect_date_format_sample_size(self):
+        values = ["01/02/2000"] * 10 + ["25/02/2000"]
+        self.assertIsNone(detect_date_format(values, sample_size=10))
+        self.assertEqual(detect_date_format(values), "%d/%m/%Y")
@@ -0,0 +1,231 @@
+import xml.etree.ElementTree as ET
+from datetime import date
+from decimal import Decimal
+from io import BytesIO
+from unittest import mock
+
+from django.test import TestCase
+
+from hordak.utilities import statement_readers
+from hordak.utilities.statement_readers import (
+    Camt053Reader,
+    CsvReader,
+    OfxReader,
+    QifReader,
+    get_statement_reader,
+)
+
+OFX_SGML = b"""OFXHEADER:100
+DATA:OFXSGML
+VERSION:102
+ENCODING:USASCII
+CHARSET:1252
+
+<OFX>
+<BANKMSGSRSV1><STMTTRNRS><STMTRS>
+<CURDEF>GBP
+<BANKTRANLIST>
+<DTSTART>20000101
+<STMTTRN>
+<TRNTYPE>DEBIT
+<DTPOSTED>20000103120000[-5:EST]
+<TRNAMT>-10.50
+<FITID>1001
+<NAME>Caf\xe9 &amp; Bar
+<MEMO>Card payment
+</STMTTRN>
+<STMTTRN>
+<TRNTYPE>CREDIT
+<DTPOSTED>20000104
+<TRNAMT>200
+<FITID>1002
+<MEMO>Salary
+</STMTTRN>
+</BANKTRANLIST>
+</STMTRS></STMTTRNRS></BANKMSGSRSV1>
+</OFX>
+"""
+
+OFX_XML = (
+    b'<?xml version="1.0" encoding="UTF-8"?><?OFX OFXHEADER="200" VERSION="220"?>'
+    b"<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>"
+    b"<STMTTRN><TRNTYPE>DEBIT</TRNTYPE><DTPOSTED>20000103</DTPOSTED>"
+    b"<TRNAMT>-10.50</TRNAMT><FITID>1001</FITID><NAME>Caf\xc3\xa9 &amp; Bar</NAME>"
+    b"<MEMO>Card payment</MEMO></STMTTRN>"
+    b"<STMTTRN><TRNTYPE>CREDIT</TRNTYPE><DTPOSTED>20000104</DTPOSTED>"
+    b"<TRNAMT>200</TRNAMT><FITID>1002</FITID><MEMO>Salary</MEMO></STMTTRN>"
+    b"</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>"
+)
+
+QIF = b"""!Account
+NCurrent account
+TBank
+^
+!Type:Bank
+D13/01/2000
+T-1,010.50
+PCafe & Bar
+MCard payment
+N101
+^
+D14/01'2000
+T200.00
+MSalary
+^
+!Type:Cat
+NFood
+^
+"""
+
+CAMT = b"""<?xml version="1.0" encoding="UTF-8"?>
+<Document xmlns="urn:iso:std:iso:20022:tech:xsd:camt.053.001.02">
+  <BkToCstmrStmt>
+    <GrpHdr><MsgId>1</MsgId></GrpHdr>
+    <Stmt>
+      <Id>1</Id>
+      <Bal><Amt Ccy="EUR">100.00</Amt></Bal>
+      <Ntry>
+        <NtryRef>E1</NtryRef>
+        <Amt Ccy="EUR">10.50</Amt>
+        <CdtDbtInd>DBIT</CdtDbtInd>
+        <Sts>BOOK</Sts>
+        <BookgDt><Dt>2000-01-03</Dt></BookgDt>
+        <ValDt><Dt>2000-01-04</Dt></ValDt>
+        <AcctSvcrRef>REF1</AcctSvcrRef>
+        <NtryDtls><TxDtls>
+          <Refs><EndToEndId>E2E1</EndToEndId></Refs>
+          <RltdPties><Cdtr><Nm>Cafe</Nm></Cdtr></RltdPties>
+          <RmtInf><Ustrd>Invoice 1</Ustrd><Ustrd>Table 2</Ustrd></RmtInf>
+        </TxDtls></NtryDtls>
+      </Ntry>
+      <Ntry>
+        <Amt Ccy="EUR">200</Amt>
+        <CdtDbtInd>CRDT</CdtDbtInd>
+        <Sts><Cd>BOOK</Cd></Sts>
+        <BookgDt><DtTm>2000-01-05T10:00:00</DtTm></BookgDt>
+        <AddtlNtryInf>Salary</AddtlNtryInf>
+      </Ntry>
+      <Ntry>
+        <Amt Ccy="EUR">5</Amt>
+        <CdtDbtInd>CRDT</CdtDbtInd>
+        <Sts>PDNG</Sts>
+        <BookgDt><Dt>2000-01-06</Dt></BookgDt>
+      </Ntry>
+    </Stmt>
+  </BkToCstmrStmt>
+</Document>
+"""
+
+
+class StatementReadersTestCase(TestCase):
+    def assertOfxRows(self, rows):
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0].date, date(2000, 1, 3))
+        self.assertEqual(rows[0].amount, Decimal("-10.50"))
+        self.assertEqual(rows[0].description, "Café & Bar")
+        self.assertEqual(rows[0].source_data["fitid"], "1001")
+        self.assertEqual(rows[0].source_data["memo"], "Card payment")
+        self.assertEqual(rows[1].date, date(2000, 1, 4))
+        self.assertEqual(rows[1].amount, Decimal("200"))
+        self.assertEqual(rows[1].description, "Salary")
+
+    def test_ofx_sgml(self):
+        self.assertOfxRows(list(OfxReader(BytesIO(OFX_SGML)).iter_statement_rows()))
+
+    def test_ofx_xml(self):
+        self.assertOfxRows(list(OfxReader(BytesIO(OFX_XML)).iter_statement_rows()))
+
+    @mock.patch("hordak.utilities.statement_readers.SNIFF_SIZE", 7)
+    @mock.patch("hordak.utilities.statement_readers.CHUNK_SIZE", 5)
+    def test_ofx_chunks(self):
+        """Tags split across chunks are parsed correctly"""
+        self.assertOfxRows(list(OfxReader(BytesIO(OFX_XML)).iter_statement_rows()))
+
+    def test_ofx_rows(self):
+        self.assertEqual(
+            list(OfxReader(BytesIO(OFX_XML)))[1],
+            [
+                "2000-01-04",
+                "200",
+                "Salary",
+                '{"trntype": "CREDIT", "dtposted": "20000104", "trnamt": "200", '
+                '"fitid": "1002", "memo": "Salary"}',
+            ],
+        )
+
+    def test_qif(self):
+        rows = list(QifReader(BytesIO(QIF)).iter_statement_rows())
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0].date, date(2000, 1, 13))
+        self.assertEqual(rows[0].amount, Decimal("-1010.50"))
+        self.assertEqual(rows[0].description, "Cafe & Bar")
+        self.assertEqual(rows[0].source_data["number"], "101")
+        self.assertEqual(rows[1].date, date(2000, 1, 14))
+        self.assertEqual(rows[1].description, "Salary")
+
+    def test_qif_ambiguous_dates(self):
+        """US date ordering is assumed if it cannot be detected"""
+        rows = list(
+            QifReader(
+                BytesIO(b"!Type:Bank\nD01/02/2000\nT1\n^\n")
+            ).iter_statement_rows()
+        )
+        self.assertEqual(rows[0].date, date(2000, 1, 2))
+
+    def test_camt053(self):
+        rows = list(Camt053Reader(BytesIO(CAMT)).iter_statement_rows())
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0].date, date(2000, 1, 3))
+        self.assertEqual(rows[0].amount, Decimal("-10.50"))
+        self.assertEqual(rows[0].description, "Invoice 1 Table 2")
+        self.assertEqual(rows[0].source_data["counterparty"], "Cafe")
+        self.assertEqual(rows[0].source_data["end_to_end_id"], "E2E1")
+        self.assertEqual(rows[0].source_data["account_servicer_reference"], "REF1")
+        self.assertEqual(rows[0].source_data["value_date"], "2000-01-04")
+        self.assertEqual(rows[0].source_data["currency"], "EUR")
+        self.assertEqual(rows[1].date, date(2000, 1, 5))
+        self.assertEqual(rows[1].amount, Decimal("200"))
+        self.assertEqual(rows[1].description, "Salary")
+
+    def test_camt053_discards_entries(self):
+        """Entries are removed from the document once read"""
+        events = list(ET.iterparse(BytesIO(CAMT), events=("start", "end")))
+        with mock.patch.object(
+            statement_readers, "_iterparse", return_value=iter(events)
+        ):
+            rows = list(Camt053Reader(BytesIO(CAMT)).iter_statement_rows())
+
+        self.assertEqual(len(rows), 2)
+        statement = next(e for _, e in events if e.tag.endswith("}Stmt"))
+        self.assertEqual([e.tag.split("}")[1] for e in statement], ["Id", "Bal"])
+
+    def test_xml_entities_not_expanded(self):
+        """Files declaring entities are rejected (CAMT.053) or the entities ignored (OFX)"""
+        doctype = (
+            b'<!DOCTYPE Document [<!ENTITY a "aaaaaaaaaa">'
+            b'<!ENTITY b "&a;&a;&a;&a;&a;&a;&a;&a;&a;&a;">]>'
+        )
+        camt = CAMT.replace(b"<Document", doctype + b"<Document", 1).replace(
+            b"Salary", b"&b;"
+        )
+        with self.assertRaisesMessage(ValueError, "DOCTYPE"):
+            list(Camt053Reader(BytesIO(camt)).iter_statement_rows())
+
+        ofx = OFX_XML.replace(b"<OFX>", doctype + b"<OFX>", 1).replace(
+            b"<NAME>", b"<NAME>&b;", 1
+        )
+        rows = list(OfxReader(BytesIO(ofx)).iter_statement_rows())
+        self.assertTrue(rows[0].description.startswith("&b;"))
+
+    def test_get_statement_reader(self):
+        self.assertIsInstance(get_statement_reader(BytesIO(OFX_SGML)), OfxReader)
+        self.assertIsInstance(get_statement_reader(BytesIO(OFX_XML)), OfxReader)
+        self.assertIsInstance(get_statement_reader(BytesIO(QIF)), QifReader)
+        self.assertIsInstance(get_statement_reader(BytesIO(CAMT)), Camt053Reader)
+        self.assertIsInstance(get_statement_reader(BytesIO(b"a,b\n1,2")), CsvReader)
+
+        with self.assertRaises(ValueError):
+            get_statement_reader(
+                BytesIO(b"a,b"),
+                readers=["hordak.utilities.statement_readers.OfxReader"],
+            )
@@ -0,0 +1,180 @@
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from hordak.models import Account, AccountType, StatementLine, StatementRule
+from hordak.tests.utils import DataProvider
+from hordak.utilities.currency import Balance
+from hordak.utilities.statement_rules import (
+    apply_statement_rules,
+    compile_rules,
+    required_literal,
+)
+
+
+class RequiredLiteralTestCase(TestCase):
+    def test_required_literal(self):
+        for pattern, literal in [
+            (r"\bacme\b", "acme"),
+            (r"^card payment to \w+ ltd", "card payment to "),
+            (r"colou?r", "colo"),
+            (r"ab*cd", "cd"),
+            (r"abc+", "abc"),
+            (r"a{2}bcd", "bcd"),
+            (r"\x41bc", "bc"),
+            (r"foo\.bar", "foo.bar"),
+            (r"[abc]def(gh)?ij", "def"),
+            (r"(?i)tesco", "tesco"),
+            (r"\d+", ""),
+            (r"acme|tesco", ""),
+            (r"(?x) a b c", ""),
+            ("caf\u00e9", "caf"),
+        ]:
+            with self.subTest(pattern=pattern):
+                self.assertEqual(required_literal(pattern), literal)
+
+
+class StatementRulesTestCase(DataProvider, TestCase):
+    def setUp(self):
+        self.bank = self.account(type=AccountType.asset, is_bank_account=True)
+        self.sales = self.account(type=AccountType.income)
+        self.groceries = self.account(type=AccountType.expense)
+        self.rent = self.account(type=AccountType.expense)
+        self.statement_import = self.statement_import(bank_account=self.bank)
+
+    def line(self, amount, description, date="2000-01-01"):
+        return StatementLine.objects.create(
+            statement_import=self.statement_import,
+            date=date,
+            amount=Decimal(amount),
+            description=description,
+        )
+
+    def rule(self, pattern, to_account, **kwargs):
+        return StatementRule.objects.create(
+            description_pattern=pattern, to_account=to_account, **kwargs
+        )
+
+    def test_match(self):
+        rent = self.rule(r"\brent\b", self.rent, max_amount=0)
+        small = self.rule("acme", self.groceries, min_amount=-100, max_amount=0)
+        sales = self.rule("acme", self.sales, min_amount=0, priority=1)
+        rules = compile_rules()
+
+        self.assertEqual(rules.match("MONTHLY RENT", Decimal("-500")), rent)
+        self.assertEqual(rules.match("Rent", Decimal("500")), None)
+        self.assertEqual(rules.match("Parent", Decimal("-500")), None)
+        self.assertEqual(rules.match("Card payment ACME", Decimal("-50")), small)
+        self.assertEqual(rules.match("Card payment ACME", Decimal("-500")), None)
+        self.assertEqual(rules.match("Refund from\nAcme", Decimal("50")), sales)
+        self.assertEqual(rules.match("Other", Decimal("50")), None)
+
+    def test_match_without_literal(self):
+        """Rules without any required text are still matched"""
+        rent = self.rule("rent|mortgage", self.rent, priority=1)
+        acme = self.rule(r"\w+ limited", self.groceries, priority=2)
+        rules = compile_rules()
+        self.assertEqual(rules.unfiltered, [0])
+        self.assertEqual(rules.match("ACME LIMITED", Decimal(1)), acme)
+        self.assertEqual(rules.match("Mortgage", Decimal(1)), rent)
+        self.assertEqual(rules.match("LIMITED", Decimal(1)), None)
+        # Characters which only match ASCII letters when ignoring case
+        self.assertEqual(rules.match("ACME L\u0131MITED", Decimal(1)), acme)
+
+    def test_priority(self):
+        self.rule("acme", self.sales, priority=2)
+        groceries = self.rule("acme", self.groceries, priority=1)
+        self.assertEqual(compile_rules().match("acme", Decimal(1)), groceries)
+
+    def test_no_rules(self):
+        rules = compile_rules()
+        self.assertFalse(rules)
+        self.assertEqual(rules.match("acme", Decimal(1)), None)
+        self.line("10", "Acme")
+        self.assertEqual(apply_statement_rules(), [])
+
+    def test_invalid_pattern(self):
+        rule = StatementRule(description_pattern="acme(", to_account=self.sales)
+        with self.assertRaises(ValidationError):
+            rule.full_clean()
+
+    def test_groups_and_backreferences(self):
+        pattern = r"(?P<name>acme) (?P=name) (\d+) \2"
+        rule = self.rule(pattern, self.sales)
+        rule.full_clean()
+        StatementRule(
+            description_pattern="(?P<rule>x)", to_account=self.sales
+        ).full_clean()
+        line = self.line("10", "Paid ACME acme 12 12")
+        self.line("10", "Paid acme acme 12 13")
+        self.assertEqual(
+            [t.pk for t in apply_statement_rules()],
+            [StatementLine.objects.get(pk=line.pk).transaction_id],
+        )
+
+    def test_apply(self):
+        self.rule("acme", self.groceries, max_amount=0)
+        self.rule("invoice", self.sales)
+        self.rule("transfer", self.bank)
+        line1 = self.line("-10", "Acme Ltd")
+        line2 = self.line("100", "Invoice 123", date="2000-01-02")
+        unmatched = self.line("-10", "Other")
+        own_account = self.line("-10", "Transfer")
+        reconciled = self.line("-10", "Acme")
+        reconciled.create_transaction(self.rent)
+
+        transactions = apply_statement_rules()
+        self.assertEqual(len(transactions), 2)
+
+        line1.refresh_from_db()
+        line2.refresh_from_db()
+        self.assertEqual(line1.transaction.date, line1.date)
+        self.assertEqual(line2.transaction.legs.count(), 2)
+        self.assertEqual(line2.transaction.date, line2.date)
+        self.assertIsNone(StatementLine.objects.get(pk=unmatched.pk).transaction)
+        self.assertIsNone(StatementLine.objects.get(pk=own_account.pk).transaction)
+
+        self.assertEqual(self.bank.get_balance(), Balance(80, "EUR"))
+        self.assertEqual(self.groceries.get_balance(), Balance(10, "EUR"))
+        self.assertEqual(self.rent.get_balance(), Balance(10, "EUR"))
+        self.assertEqual(self.sales.get_balance(), Balance(100, "EUR"))
+        Account.validate_accounting_equation()
+
+        # Applying again does nothing
+        self.assertEqual(apply_statement_rules(), [])
+
+    def test_apply_queries(self):
+        """The number of queries does not depend upon the number of lines"""
+        self.rule("acme", self.groceries)
+
+        def apply(num_lines):
+            for i in range(num_lines):
+                self.line("-10", "Acme {}".format(i))
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(len(apply_statement_rules()), num_lines)
+            return len(queries)
+
+        self.assertEqual(apply(5), apply(50))
+        self.assertEqual(self.groceries.get_balance(), Balance(550, "EUR"))
+
+    def test_apply_lines(self):
+        self.rule("acme", self.groceries)
+        line = self.line("-10", "Acme")
+        other_import = DataProvider.statement_import(self, bank_account=self.bank)
+        StatementLine.objects.create(
+            statement_import=other_import,
+            date="2000-01-01",
+            amount=-10,
+            description="Acme",
+        )
+
+        transactions = apply_statement_rules(
+            StatementLine.objects.filter(statement_import=self.statement_import),
+            batch_size=1,
+        )
+        self.assertEqual(len(transactions), 1)
+        line.refresh_from_db()
+        self.assertEqual(line.transaction, transactions[0])
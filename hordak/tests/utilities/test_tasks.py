@@ -0,0 +1,46 @@
+import threading
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from hordak.utilities.tasks import (
+    SynchronousTaskRunner,
+    ThreadPoolTaskRunner,
+    get_task_runner,
+)
+
+calls = []
+done = threading.Event()
+
+
+def record_call(*args):
+    calls.append((threading.current_thread().name, args))
+    done.set()
+
+
+class TaskRunnerTestCase(TestCase):
+    def setUp(self):
+        calls.clear()
+        done.clear()
+
+    def test_synchronous(self):
+        SynchronousTaskRunner().submit(record_call, 1, "a")
+        self.assertEqual(calls, [(threading.current_thread().name, (1, "a"))])
+
+    def test_thread_pool(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ThreadPoolTaskRunner().submit(record_call, 1, "a")
+            # Nothing runs until the transaction commits
+            self.assertEqual(calls, [])
+
+        self.assertTrue(done.wait(timeout=10))
+        thread_name, args = calls[0]
+        self.assertEqual(args, (1, "a"))
+        self.assertTrue(thread_name.startswith("hordak"))
+
+    def test_get_task_runner(self):
+        self.assertIsInstance(get_task_runner(), SynchronousTaskRunner)
+
+    @patch("hordak.defaults.TASK_RUNNER", "hordak.utilities.tasks.ThreadPoolTaskRunner")
+    def test_get_task_runner_setting(self):
+        self.assertIsInstance(get_task_runner(), ThreadPoolTaskRunner)
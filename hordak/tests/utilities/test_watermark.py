@@ -0,0 +1,99 @@
+from django.db import transaction as db_transaction
+from django.test import TestCase
+from moneyed import Money
+
+from hordak.models import Account, AccountType, LedgerWatermark, Transaction
+from hordak.tests.utils import DataProvider
+from hordak.utilities.watermark import (
+    bump_watermarks,
+    get_watermark,
+    ledger_changed,
+    watermark_cache_key,
+)
+
+
+class WatermarkTestCase(DataProvider, TestCase):
+    def setUp(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bank = self.account(type=AccountType.asset)
+            self.income = self.account(type=AccountType.income)
+            self.other = self.account(type=AccountType.expense)
+
+    def test_changes_after_commit(self):
+        before = get_watermark()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.income.transfer_to(self.bank, Money(10, "EUR"))
+            # Not updated until the transaction commits
+            self.assertEqual(get_watermark(), before)
+        self.assertNotEqual(get_watermark(), before)
+
+    def test_per_tree(self):
+        bank = get_watermark(self.bank)
+        other = get_watermark(self.other)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.income.transfer_to(self.bank, Money(10, "EUR"))
+        self.assertNotEqual(get_watermark(self.bank), bank)
+        self.assertEqual(get_watermark(self.other), other)
+
+    def test_one_update_per_commit(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.income.transfer_to(self.bank, Money(10, "EUR"))
+            self.income.transfer_to(self.bank, Money(10, "EUR"))
+        self.assertGreater(len(callbacks), 1)
+        watermark = LedgerWatermark.objects.get(tree_id=self.bank.tree_id)
+        self.assertEqual(watermark.version, 2)
+        self.assertEqual(watermark.max_leg_id, self.bank.legs.latest("pk").pk)
+
+    def test_account_change_updates_all_trees(self):
+        other = get_watermark(self.other)
+        with self.captureOnCommitCallbacks(execute=True):
+            Account.objects.get(pk=self.bank.pk).save()
+        self.assertNotEqual(get_watermark(self.other), other)
+
+    def test_transaction_change(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            transaction = self.income.transfer_to(self.bank, Money(10, "EUR"))
+        bank, other = get_watermark(self.bank), get_watermark(self.other)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            transaction.description = "Changed"
+            transaction.save()
+        self.assertNotEqual(get_watermark(self.bank), bank)
+        self.assertEqual(get_watermark(self.other), other)
+
+        bank = get_watermark(self.bank)
+        with self.captureOnCommitCallbacks(execute=True):
+            Transaction.objects.get(pk=transaction.pk).delete()
+        self.assertNotEqual(get_watermark(self.bank), bank)
+
+    def test_ledger_changed(self):
+        other = get_watermark(self.other)
+        with self.captureOnCommitCallbacks(execute=True):
+            ledger_changed(account_ids=[self.bank.pk], max_leg_id=123)
+        self.assertEqual(get_watermark(self.other), other)
+        self.assertEqual(get_watermark(self.bank), f"{self.bank.tree_id}.123-2")
+
+    def test_rolled_back_savepoint(self):
+        """Changes are applied even if the savepoint of an earlier change is rolled back"""
+        bank = get_watermark(self.bank)
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with db_transaction.atomic():
+                    ledger_changed(account_ids=[self.other.pk])
+                    raise ValueError()
+            except ValueError:
+                pass
+            ledger_changed(account_ids=[self.bank.pk])
+        self.assertNotEqual(get_watermark(self.bank), bank)
+
+    def test_bump_watermarks_never_lowers_max_leg_id(self):
+        bump_watermarks([self.bank.tree_id], max_leg_id=10)
+        bump_watermarks([self.bank.tree_id], max_leg_id=5)
+        self.assertEqual(get_watermark(self.bank), f"{self.bank.tree_id}.10-3")
+
+    def test_cache_key(self):
+        key = watermark_cache_key("report", account=self.bank)
+        self.assertTrue(key.startswith("hordak:report:"))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.income.transfer_to(self.bank, Money(10, "EUR"))
+        self.assertNotEqual(watermark_cache_key("report", account=self.bank), key)
@@ -1,10 +1,14 @@
 from django.test import TestCase
 from django.urls import reverse
 from django.utils.translation import activate, get_language, to_locale
+from mock import patch
+from moneyed import Money
 
 from hordak.forms.accounts import AccountForm
 from hordak.models import Account, AccountType, Leg, Transaction
 from hordak.tests.utils import DataProvider
+from hordak.utilities.currency import Balance
+from hordak.views import AccountTransactionsView
 
 
 class AccountTransactionsViewTestCase(DataProvider, TestCase):
@@ -33,8 +37,71 @@ class AccountTransactionsViewTestCase(DataProvider, TestCase):
     def test_get(self):
         response = self.client.get(self.view_url)
         self.assertContains(response, "<td>€10.00</td>", html=True)
+
+    def test_transaction_change_etag(self):
+        etag = self.client.get(self.view_url)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            transaction = Transaction.objects.get()
+            transaction.description = "Changed"
+            transaction.save()
+        response = self.client.get(self.view_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Changed")
         self.assertContains(response, "<h5>Balance: €10.00</h5>", html=True)
 
+    def test_running_balance(self):
+        self.income_account.transfer_to(
+            self.bank_account, Money(5, "EUR"), date="2000-01-01"
+        )
+        self.bank_account.transfer_to(
+            self.income_account, Money(2, "EUR"), date="2000-01-02"
+        )
+
+        response = self.client.get(self.view_url)
+        legs = response.context["legs"]
+        self.assertEqual(
+            [leg.account_balance_after for leg in legs],
+            [Balance(13, "EUR"), Balance(3, "EUR"), Balance(5, "EUR")],
+        )
+        self.assertEqual(
+            [leg.account_balance_before for leg in legs],
+            [Balance(3, "EUR"), Balance(5, "EUR"), Balance(0, "EUR")],
+        )
+        self.assertEqual(legs[0].counterpart_names, [self.income_account.name])
+
+    @patch.object(AccountTransactionsView, "paginate_by", 4)
+    def test_pagination(self):
+        for i in range(1, 6):
+            self.income_account.transfer_to(
+                self.bank_account, Money(1, "EUR"), date=f"2000-01-0{i}"
+            )
+
+        # Session, user, account & watermark (for the ETag), account,
+        # legs, prefetched legs, boundary balance
+        with self.assertNumQueries(8):
+            response = self.client.get(self.view_url)
+        page = response.context["page_obj"]
+        self.assertTrue(page.has_next())
+        self.assertFalse(page.has_previous())
+        first_page = response.context["legs"]
+        self.assertEqual(len(first_page), 4)
+        self.assertEqual(first_page[0].account_balance_after, Balance(15, "EUR"))
+
+        response = self.client.get(self.view_url, {"cursor": page.next_cursor})
+        second_page = response.context["legs"]
+        self.assertEqual(len(second_page), 2)
+        self.assertFalse(response.context["page_obj"].has_next())
+        self.assertTrue(response.context["page_obj"].has_previous())
+        self.assertEqual(
+            first_page[-1].account_balance_before,
+            second_page[0].account_balance_after,
+        )
+        self.assertEqual(second_page[-1].account_balance_before, Balance(0, "EUR"))
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.view_url, {"cursor": "foo"})
+        self.assertEqual(response.status_code, 404)
+
 
 class AccountListViewTestCase(DataProvider, TestCase):
     def setUp(self):
@@ -51,6 +118,60 @@ class AccountListViewTestCase(DataProvider, TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.context["accounts"].count(), 2)
 
+    def test_get_num_queries(self):
+        parent = self.account(name="Parent", type=AccountType.expense)
+        for _ in range(5):
+            self.account(parent=parent)
+        self.bank_account.transfer_to(
+            Account.objects.filter(parent=parent).first(), Money(10, "EUR")
+        )
+
+        # Session, user, watermark (for the ETag), accounts (with balances)
+        with self.assertNumQueries(4):
+            response = self.client.get(self.view_url)
+        self.assertEqual(response.context["accounts"].count(), 8)
+        self.assertContains(response, "€10.00")
+
+    def test_get_not_modified(self):
+        response = self.client.get(self.view_url)
+        etag = response["ETag"]
+
+        # Session, user, watermark
+        with self.assertNumQueries(3):
+            response = self.client.get(self.view_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.bank_account.transfer_to(self.income_account, Money(10, "EUR"))
+        response = self.client.get(self.view_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_get_max_level(self):
+        parent = self.account(name="Parent", type=AccountType.expense)
+        self.account(parent=parent, name="Child")
+
+        response = self.client.get(self.view_url, {"max_level": 0})
+        accounts = list(response.context["accounts"])
+        self.assertEqual(len(accounts), 3)
+        self.assertNotContains(response, "Child")
+        self.assertTrue([a for a in accounts if a.pk == parent.pk][0].is_collapsed)
+        self.assertContains(response, f"?parent={parent.uuid}")
+
+    def test_get_parent(self):
+        parent = self.account(name="Parent", type=AccountType.expense)
+        child = self.account(parent=parent, name="Child")
+        self.account(parent=child, name="Grandchild")
+
+        response = self.client.get(
+            self.view_url,
+            {"parent": parent.uuid},
+            headers={"x-requested-with": "XMLHttpRequest"},
+        )
+        self.assertTemplateUsed(response, "hordak/accounts/_account_list_rows.html")
+        self.assertTemplateNotUsed(response, "hordak/accounts/account_list.html")
+        self.assertEqual([a.name for a in response.context["accounts"]], ["Child"])
+        self.assertContains(response, f"?parent={child.uuid}")
+
 
 class AccountCreateViewTestCase(DataProvider, TestCase):
     def setUp(self):
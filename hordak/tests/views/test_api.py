@@ -0,0 +1,156 @@
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import translation
+from moneyed import Money
+
+from hordak.models import AccountType
+from hordak.tests.utils import DataProvider
+from hordak.utilities.pagination import encode_cursor
+
+
+class AccountBalancesApiViewTestCase(DataProvider, TestCase):
+    def setUp(self):
+        self.view_url = reverse("hordak:api_accounts")
+        self.login()
+        self.bank = self.account(type=AccountType.asset)
+        self.income = self.account(type=AccountType.income)
+        self.income.transfer_to(self.bank, Money(100, "EUR"))
+
+    def test_get(self):
+        response = self.client.get(self.view_url)
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual(
+            [(r["uuid"], r["balance"]) for r in results],
+            [
+                (str(self.bank.uuid), [{"amount": "100.00", "currency": "EUR"}]),
+                (str(self.income.uuid), [{"amount": "100.00", "currency": "EUR"}]),
+            ],
+        )
+
+    def test_fields(self):
+        response = self.client.get(self.view_url, data=dict(fields="uuid,name"))
+        self.assertEqual(set(response.json()["results"][0]), {"uuid", "name"})
+
+    def test_fields_unknown(self):
+        response = self.client.get(self.view_url, data=dict(fields="uuid,foo"))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"error": "Unknown fields: foo"})
+
+    def test_pagination(self):
+        response = self.client.get(self.view_url, data=dict(limit=1))
+        data = response.json()
+        self.assertEqual(data["results"][0]["uuid"], str(self.bank.uuid))
+        self.assertIsNone(data["previous"])
+
+        response = self.client.get(
+            self.view_url, data=dict(limit=1, cursor=data["next"])
+        )
+        data = response.json()
+        self.assertEqual(data["results"][0]["uuid"], str(self.income.uuid))
+        self.assertIsNone(data["next"])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.view_url, data=dict(cursor="foo"))
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(
+            self.view_url, data=dict(cursor=encode_cursor(["nope", "x"]))
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_etag(self):
+        response = self.client.get(self.view_url)
+        etag = response["ETag"]
+        response = self.client.get(self.view_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertIn("Accept-Language", response["Vary"])
+
+    def test_etag_language(self):
+        """The ETag changes with the active language"""
+        etag = self.client.get(self.view_url)["ETag"]
+        with translation.override("de"):
+            response = self.client.get(self.view_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.income.transfer_to(self.bank, Money(1, "EUR"))
+        response = self.client.get(self.view_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_not_logged_in(self):
+        self.client.logout()
+        response = self.client.get(self.view_url)
+        self.assertEqual(response.status_code, 403)
+
+
+class LegsApiViewTestCase(DataProvider, TestCase):
+    def setUp(self):
+        self.view_url = reverse("hordak:api_legs")
+        self.login()
+        self.bank = self.account(type=AccountType.asset)
+        self.income = self.account(type=AccountType.income)
+        self.income.transfer_to(self.bank, Money(100, "EUR"), date="2000-01-01")
+        self.income.transfer_to(self.bank, Money(20, "EUR"), date="2000-01-02")
+
+    def test_get(self):
+        response = self.client.get(self.view_url, data=dict(account=self.bank.uuid))
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual([r["date"] for r in results], ["2000-01-02", "2000-01-01"])
+        self.assertEqual(results[0]["debit"], "20.00")
+        self.assertNotIn("account_balance", results[0])
+
+    def test_account_balance(self):
+        response = self.client.get(
+            self.view_url,
+            data=dict(account=self.bank.uuid, fields="uuid,account_balance"),
+        )
+        results = response.json()["results"]
+        self.assertEqual(
+            [r["account_balance"][0]["amount"] for r in results],
+            ["120.00", "100.00"],
+        )
+
+    def test_account_not_found(self):
+        response = self.client.get(self.view_url, data=dict(account="foo"))
+        self.assertEqual(response.status_code, 404)
+
+
+class TransactionApiViewTestCase(DataProvider, TestCase):
+    def setUp(self):
+        self.login()
+        bank = self.account(type=AccountType.asset)
+        income = self.account(type=AccountType.income)
+        self.transaction = income.transfer_to(
+            bank, Money(100, "EUR"), description="Sale"
+        )
+
+    def test_get(self):
+        response = self.client.get(
+            reverse("hordak:api_transaction", args=[self.transaction.uuid]),
+            data=dict(fields="uuid,debit,credit"),
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["description"], "Sale")
+        legs = self.transaction.legs.order_by("pk")
+        self.assertEqual(
+            data["legs"],
+            [
+                {
+                    "uuid": str(leg.uuid),
+                    "debit": _amount(leg.debit),
+                    "credit": _amount(leg.credit),
+                }
+                for leg in legs
+            ],
+        )
+
+    def test_not_found(self):
+        response = self.client.get(reverse("hordak:api_transaction", args=["foo"]))
+        self.assertEqual(response.status_code, 404)
+
+
+def _amount(money):
+    return None if money is None else str(money.amount)
@@ -0,0 +1,50 @@
+import json
+
+from django.test import TestCase
+from django.urls import reverse
+from moneyed import Money
+
+from hordak.models import AccountType
+from hordak.tests.utils import DataProvider
+
+
+class ExportViewTestCase(DataProvider, TestCase):
+    def setUp(self):
+        self.login()
+        self.bank = self.account(type=AccountType.asset)
+        self.income = self.account(type=AccountType.income)
+        self.income.transfer_to(self.bank, Money(100, "EUR"), date="2000-01-01")
+
+    def test_account_statement_csv(self):
+        response = self.client.get(
+            reverse("hordak:accounts_export", args=[self.bank.uuid])
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        self.assertIn("attachment", response["Content-Disposition"])
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 4)
+
+    def test_account_statement_ndjson(self):
+        response = self.client.get(
+            reverse("hordak:accounts_export", args=[self.bank.uuid]),
+            data=dict(format="ndjson", date_from="2000-01-02"),
+        )
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in response.streaming_content]
+        self.assertEqual(
+            [(r["row_type"], r["balance"]) for r in rows],
+            [("opening", "100.00"), ("closing", "100.00")],
+        )
+
+    def test_general_ledger(self):
+        response = self.client.get(reverse("hordak:ledger_export"))
+        self.assertEqual(response.status_code, 200)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 7)
+
+    def test_invalid(self):
+        response = self.client.get(
+            reverse("hordak:ledger_export"), data=dict(format="xml")
+        )
+        self.assertEqual(response.status_code, 400)
@@ -1,16 +1,21 @@
 import logging
+from datetime import timedelta
+from unittest import mock
 
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase
 from django.urls import reverse
+from django.utils import timezone
 
+from hordak import defaults
 from hordak.models import (
     StatementLine,
     TransactionCsvImport,
     TransactionCsvImportColumn,
 )
 from hordak.tests.utils import DataProvider
-from hordak.views import CreateImportView
+from hordak.utilities.tasks import SynchronousTaskRunner
+from hordak.views import CreateImportView, ExecuteImportView
 
 
 class DryRunViewTestCase(DataProvider, TestCase):
@@ -84,6 +89,26 @@ class DryRunViewTestCase(DataProvider, TestCase):
         self.assertEqual(len(result.row_errors()), 1)
         self.assertEqual(StatementLine.objects.count(), 0)
 
+    def test_stale(self):
+        """An import which stopped without finishing can be started again"""
+        self.create_import()
+        self.transaction_import.state = "checking"
+        self.transaction_import.result = {"totals": {"new": 1}, "dry_run": True}
+        self.transaction_import.progress_updated = timezone.now() - timedelta(
+            seconds=defaults.IMPORT_TIMEOUT + 1
+        )
+        self.transaction_import.save()
+
+        response = self.client.get(self.view_url)
+        self.assertFalse(response.context["running"])
+        self.assertTrue(response.context["stale"])
+        self.assertIsNone(response.context["result"])
+        self.assertContains(response, "Check the data...")
+
+        response = self.client.post(self.view_url)
+        self.assertFalse(response.context["stale"])
+        self.assertEqual(response.context["result"].totals["new"], 1)
+
 
 class ExecuteViewTestCase(DataProvider, TestCase):
     def setUp(self):
@@ -155,6 +180,162 @@ class ExecuteViewTestCase(DataProvider, TestCase):
         self.assertEqual(len(result.row_errors()), 1)
         self.assertEqual(StatementLine.objects.count(), 0)
 
+    def test_post_batches(self):
+        """Files are imported in batches, with duplicates detected across batches"""
+        self.create_import()
+        self.transaction_import.file = SimpleUploadedFile(
+            "data.csv",
+            b"Number,Date,Account,Amount,Subcategory,Memo\n"
+            b"1,1/1/2000,123456789,123,OTH,Payment\n"
+            b"1,1/1/2000,123456789,123,OTH,Payment\n"
+            b"3,2/1/2000,123456789,0,OTH,Zero\n"
+            b"1,1/1/2000,123456789,123,OTH,Payment\n"
+            b"5,3/1/2000,123456789,5,OTH,Other\n",
+        )
+        self.transaction_import.save()
+
+        with mock.patch.object(ExecuteImportView, "batch_size", 2):
+            response = self.client.post(self.view_url)
+        result = response.context["result"]
+
+        # The error is reported against its position in the file
+        self.assertEqual([number for number, _ in result.row_errors()], [3])
+        self.assertEqual(len(result.failed_dataset), 1)
+        self.assertEqual(result.totals["new"], 4)
+        # The whole import is rolled back
+        self.assertEqual(StatementLine.objects.count(), 0)
+        self.transaction_import.refresh_from_db()
+        self.assertEqual(self.transaction_import.state, "failed")
+        self.assertEqual(self.transaction_import.progress, 5)
+
+        # Fix the error and import again
+        self.transaction_import.file = SimpleUploadedFile(
+            "data.csv",
+            b"Number,Date,Account,Amount,Subcategory,Memo\n"
+            b"1,1/1/2000,123456789,123,OTH,Payment\n"
+            b"1,1/1/2000,123456789,123,OTH,Payment\n"
+            b"1,1/1/2000,123456789,123,OTH,Payment\n",
+        )
+        self.transaction_import.save()
+        with mock.patch.object(ExecuteImportView, "batch_size", 2):
+            self.client.post(self.view_url)
+        self.assertEqual(StatementLine.objects.count(), 3)
+
+        # Importing again skips all rows, including those in the later batch
+        with mock.patch.object(ExecuteImportView, "batch_size", 2):
+            response = self.client.post(self.view_url)
+        self.assertEqual(response.context["result"].totals["skip"], 3)
+        self.assertEqual(StatementLine.objects.count(), 3)
+
+    def test_get_result(self):
+        """The result is saved, and shown when the page is loaded again"""
+        self.create_import()
+        self.client.post(self.view_url)
+
+        response = self.client.get(self.view_url)
+        result = response.context["result"]
+        self.assertEqual(result.totals["new"], 1)
+        self.assertEqual(result.base_errors, [])
+
+        # The dry run view does not show the result of the import
+        response = self.client.get(
+            reverse("hordak:import_dry_run", args=[self.transaction_import.uuid])
+        )
+        self.assertIsNone(response.context["result"])
+
+    def test_date_error_saved(self):
+        self.create_import(b"1")
+        self.client.post(self.view_url)
+
+        response = self.client.get(self.view_url)
+        result = response.context["result"]
+        self.assertEqual(
+            [str(e.error) for _, errors in result.row_errors() for e in errors],
+            ["Invalid value for date. Expected dd/mm/yyyy"],
+        )
+        self.assertEqual(
+            result.failed_dataset["Error"],
+            ["Invalid value for date. Expected dd/mm/yyyy"],
+        )
+        self.assertContains(response, "Invalid value for date")
+
+    def test_post_running(self):
+        """The progress is shown while the import runs in the background"""
+        self.create_import()
+        with mock.patch.object(SynchronousTaskRunner, "submit") as submit:
+            response = self.client.post(self.view_url)
+
+        self.assertEqual(submit.call_count, 1)
+        self.assertTrue(response.context["running"])
+        self.assertIsNone(response.context["result"])
+        self.assertContains(
+            response,
+            reverse("hordak:import_status", args=[self.transaction_import.uuid]),
+        )
+        self.assertEqual(StatementLine.objects.count(), 0)
+
+        # Now run the task
+        func, *args = submit.call_args[0]
+        func(*args)
+        response = self.client.get(self.view_url)
+        self.assertFalse(response.context["running"])
+        self.assertEqual(response.context["result"].totals["new"], 1)
+        self.assertEqual(StatementLine.objects.count(), 1)
+
+    def test_exception(self):
+        self.create_import()
+        with mock.patch(
+            "hordak.resources.BulkStatementLineResource.import_datasets",
+            side_effect=RuntimeError("Oh no"),
+        ):
+            response = self.client.post(self.view_url)
+
+        self.transaction_import.refresh_from_db()
+        self.assertEqual(self.transaction_import.state, "failed")
+        self.assertEqual(
+            [str(e.error) for e in response.context["result"].base_errors], ["Oh no"]
+        )
+
+
+class ImportStatusViewTestCase(DataProvider, TestCase):
+    def setUp(self):
+        self.transaction_import = TransactionCsvImport.objects.create(
+            hordak_import=self.statement_import(),
+            state="importing",
+            progress=2000,
+            result={"totals": {"new": 1500, "skip": 500}},
+        )
+        self.view_url = reverse(
+            "hordak:import_status", args=[self.transaction_import.uuid]
+        )
+        self.login()
+
+    def test_get(self):
+        response = self.client.get(self.view_url)
+        self.assertEqual(
+            response.json(),
+            {
+                "state": "importing",
+                "progress": 2000,
+                "totals": {"new": 1500, "skip": 500},
+                "finished": False,
+            },
+        )
+
+    def test_finished(self):
+        self.transaction_import.state = "done"
+        self.transaction_import.save()
+        response = self.client.get(self.view_url)
+        self.assertTrue(response.json()["finished"])
+
+    def test_stale(self):
+        self.transaction_import.progress_updated = timezone.now() - timedelta(
+            seconds=defaults.IMPORT_TIMEOUT + 1
+        )
+        self.transaction_import.save()
+        response = self.client.get(self.view_url)
+        self.assertTrue(response.json()["finished"])
+
 
 class CreateImportViewTestCase(DataProvider, TestCase):
     def setUp(self):
@@ -225,3 +406,29 @@ class SetupImportViewTestCase(DataProvider, TestCase):
         self.assertEqual(self.transaction_import.date_format, "%d-%m-%Y")
         self.assertEqual(column1.to_field, "date")
         self.assertEqual(column2.to_field, "amount")
+
+    def test_submit_clears_result(self):
+        """The result of a previous dry run is cleared"""
+        self.transaction_import.state = "checked"
+        self.transaction_import.progress = 1
+        self.transaction_import.result = {"totals": {"new": 1}, "dry_run": True}
+        self.transaction_import.save()
+
+        self.client.post(
+            self.view_url,
+            data={
+                "date_format": "%d/%m/%Y",
+                "columns-INITIAL_FORMS": "0",
+                "columns-TOTAL_FORMS": "0",
+            },
+        )
+        self.transaction_import.refresh_from_db()
+        self.assertEqual(self.transaction_import.state, "uploaded")
+        self.assertEqual(self.transaction_import.progress, 0)
+        self.assertEqual(self.transaction_import.result, {})
+
+        response = self.client.get(
+            reverse("hordak:import_dry_run", args=[self.transaction_import.uuid])
+        )
+        self.assertIsNone(response.context["result"])
+        self.assertContains(response, "Check the data...")
@@ -2,13 +2,23 @@ import warnings
 from decimal import Decimal
 from unittest.mock import patch
 
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from moneyed import Money
 
-from hordak.models import AccountType, StatementImport, StatementLine, Transaction
+from hordak.models import (
+    AccountType,
+    Leg,
+    StatementImport,
+    StatementLine,
+    Transaction,
+)
 from hordak.tests.utils import DataProvider
 from hordak.utilities.currency import Balance
+from hordak.utilities.pagination import encode_cursor
+from hordak.views.transactions import LegsListView, TransactionsListView
 
 warnings.simplefilter("ignore", category=DeprecationWarning)
 
@@ -59,6 +69,74 @@ class TransactionCreateViewTestCase(DataProvider, TestCase):
         self.assertEqual(transaction.description, "Test description")
 
 
+class TransactionsListViewTestCase(DataProvider, TestCase):
+    def setUp(self):
+        self.login()
+        account1 = self.account()
+        account2 = self.account()
+        for day in [1, 2, 2, 3, 4]:
+            account1.transfer_to(account2, Money(1, "EUR"), date=f"2000-01-0{day}")
+
+    def test_transaction_change_etag(self):
+        """Editing a transaction changes the ETag of the transaction & leg lists"""
+        for view_name in ("hordak:transactions_list", "hordak:legs_list"):
+            with self.subTest(view_name=view_name):
+                view_url = reverse(view_name)
+                etag = self.client.get(view_url)["ETag"]
+                response = self.client.get(view_url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+
+                with self.captureOnCommitCallbacks(execute=True):
+                    transaction = Transaction.objects.first()
+                    transaction.description = "Changed {}".format(view_name)
+                    transaction.save()
+                response = self.client.get(view_url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response["ETag"], etag)
+
+    @patch.object(TransactionsListView, "paginate_by", 3)
+    def test_transactions_pagination(self):
+        view_url = reverse("hordak:transactions_list")
+        expected = list(Transaction.objects.order_by("-date", "-pk"))
+
+        response = self.client.get(view_url)
+        self.assertEqual(response.status_code, 200)
+        page = response.context["page_obj"]
+        self.assertEqual(list(page), expected[:3])
+        self.assertTrue(response.context["show_estimated_count"])
+
+        response = self.client.get(view_url, data=dict(cursor=page.next_cursor))
+        self.assertEqual(list(response.context["page_obj"]), expected[3:])
+
+    @patch.object(LegsListView, "paginate_by", 4)
+    def test_legs_pagination(self):
+        view_url = reverse("hordak:legs_list")
+        expected = list(
+            Leg.objects.order_by("-transaction__date", "-transaction_id", "-pk")
+        )
+
+        response = self.client.get(view_url)
+        page = response.context["page_obj"]
+        self.assertEqual(list(page), expected[:4])
+
+        response = self.client.get(view_url, data=dict(cursor=page.next_cursor))
+        self.assertEqual(list(response.context["page_obj"]), expected[4:8])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(
+            reverse("hordak:transactions_list"), data=dict(cursor="foo")
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_invalid_cursor_values(self):
+        for view_name in ("transactions_list", "transactions_reconcile"):
+            response = self.client.get(
+                reverse("hordak:" + view_name),
+                data=dict(cursor=encode_cursor(["nope", "x"])),
+            )
+            self.assertEqual(response.status_code, 404)
+
+
 class TransactionDeleteViewTestCase(DataProvider, TestCase):
     def setUp(self):
         self.login()
@@ -184,7 +262,7 @@ class ReconcileTransactionsViewTestCase(DataProvider, TestCase):
 
         response = self.client.get(self.view_url)
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.context["statement_lines"].count(), 3)
+        self.assertEqual(len(response.context["statement_lines"]), 3)
         self.assertNotIn("transaction_form", response.context)
         self.assertNotIn("leg_formset", response.context)
 
@@ -193,7 +271,7 @@ class ReconcileTransactionsViewTestCase(DataProvider, TestCase):
 
         response = self.client.get(self.view_url, data=dict(reconcile=self.line1.uuid))
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.context["statement_lines"].count(), 3)
+        self.assertEqual(len(response.context["statement_lines"]), 3)
         self.assertTrue(response.context["transaction_form"])
         self.assertTrue(response.context["leg_formset"])
 
@@ -413,6 +491,106 @@ class ReconcileTransactionsViewTestCase(DataProvider, TestCase):
         transaction = Transaction.objects.get()
         self.assertEqual(transaction.legs.count(), 2)
 
+    def test_get_unreconciled(self):
+        """Only unreconciled lines are listed, unless reconciled lines are requested"""
+        self.create_statement_import()
+        self.line1.create_transaction(self.income_account)
+
+        response = self.client.get(self.view_url)
+        self.assertEqual(
+            list(response.context["statement_lines"]), [self.line3, self.line2]
+        )
+
+        response = self.client.get(self.view_url, data=dict(reconciled="on"))
+        self.assertEqual(len(response.context["statement_lines"]), 3)
+        self.assertContains(response, "Unreconcile")
+
+    def test_get_filtered(self):
+        self.create_statement_import()
+        other_bank = self.account(is_bank_account=True, type=AccountType.asset)
+        other_import = StatementImport.objects.create(
+            bank_account=other_bank, source="csv"
+        )
+        other_line = StatementLine.objects.create(
+            date="2000-01-02", statement_import=other_import, amount=Decimal("1")
+        )
+
+        response = self.client.get(self.view_url)
+        self.assertEqual(len(response.context["statement_lines"]), 4)
+
+        response = self.client.get(self.view_url, data=dict(account=other_bank.uuid))
+        self.assertEqual(list(response.context["statement_lines"]), [other_line])
+
+        response = self.client.get(
+            self.view_url,
+            data=dict(
+                account=self.bank_account.uuid,
+                date_from="2000-01-02",
+                date_to="2000-01-05",
+            ),
+        )
+        self.assertEqual(list(response.context["statement_lines"]), [self.line2])
+
+    def test_get_queries(self):
+        """The number of queries does not depend upon the number of lines, and rows are not counted"""
+        self.create_statement_import()
+        self.line1.create_transaction(self.income_account)
+
+        def get():
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(self.view_url, data=dict(reconciled="on"))
+            self.assertFalse([q for q in queries if "COUNT(" in q["sql"].upper()])
+            return len(queries)
+
+        num_queries = get()
+        self.line2.create_transaction(self.income_account)
+        self.assertEqual(get(), num_queries)
+
+    def test_post_reconcile_keeps_page(self):
+        self.create_statement_import()
+        for _ in range(50):
+            StatementLine.objects.create(
+                date="2000-01-07",
+                statement_import=self.line1.statement_import,
+                amount=Decimal("1"),
+            )
+        cursor = self.client.get(self.view_url).context["page_obj"].next_cursor
+
+        response = self.client.post(
+            self.view_url,
+            data={
+                "reconcile": self.line1.uuid,
+                "cursor": cursor,
+                "description": "Test transaction",
+                "legs-INITIAL_FORMS": "0",
+                "legs-TOTAL_FORMS": "2",
+                "legs-0-amount_0": "100.16",
+                "legs-0-amount_1": "EUR",
+                "legs-0-account": self.income_account.uuid,
+                "legs-0-id": "",
+            },
+        )
+        self.assertNotIn("transaction_form", response.context)
+        self.assertEqual(
+            list(response.context["statement_lines"]), [self.line3, self.line2]
+        )
+
+    def test_pagination_keeps_filters(self):
+        self.create_statement_import()
+        for _ in range(50):
+            StatementLine.objects.create(
+                date="2000-01-02",
+                statement_import=self.line1.statement_import,
+                amount=Decimal("1"),
+            )
+
+        response = self.client.get(
+            self.view_url, data=dict(date_from="2000-01-01", reconcile=self.line2.uuid)
+        )
+        self.assertTrue(response.context["page_obj"].has_next())
+        self.assertContains(response, "?date_from=2000-01-01&amp;cursor=")
+        self.assertNotContains(response, "reconcile={}".format(self.line2.uuid))
+
 
 class UnreconcileTransactionsViewTestCase(DataProvider, TestCase):
     def setUp(self):
@@ -445,3 +623,18 @@ class UnreconcileTransactionsViewTestCase(DataProvider, TestCase):
         self.assertEqual(response.status_code, 302)
         self.assertEqual(StatementLine.objects.get().transaction_id, None)
         self.assertEqual(Transaction.objects.count(), 0)
+
+    def test_post_bad_uuid(self):
+        response = self.client.post(
+            reverse(
+                "hordak:transactions_unreconcile",
+                args=["00000000-0000-0000-0000-000000000000"],
+            )
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    def test_post_unreconciled(self):
+        self.client.post(self.view_url)
+        response = self.client.post(self.view_url)
+        self.assertEqual(response.status_code, 302)
@@ -1,6 +1,6 @@
 from django.urls import path
 
-from hordak.views import accounts, statement_csv_import, transactions
+from hordak.views import accounts, api, export, statement_csv_import, transactions
 
 app_name = "hordak"
 
@@ -50,6 +50,21 @@ urlpatterns = [
         accounts.AccountTransactionsView.as_view(),
         name="accounts_transactions",
     ),
+    path(
+        "accounts/<str:uuid>/export/",
+        export.AccountStatementExportView.as_view(),
+        name="accounts_export",
+    ),
+    path(
+        "ledger/export/", export.GeneralLedgerExportView.as_view(), name="ledger_export"
+    ),
+    path("api/accounts/", api.AccountBalancesApiView.as_view(), name="api_accounts"),
+    path("api/legs/", api.LegsApiView.as_view(), name="api_legs"),
+    path(
+        "api/transactions/<str:uuid>/",
+        api.TransactionApiView.as_view(),
+        name="api_transaction",
+    ),
     path(
         "import/", statement_csv_import.CreateImportView.as_view(), name="import_create"
     ),
@@ -68,4 +83,9 @@ urlpatterns = [
         statement_csv_import.ExecuteImportView.as_view(),
         name="import_execute",
     ),
+    path(
+        "import/<str:uuid>/status/",
+        statement_csv_import.ImportStatusView.as_view(),
+        name="import_status",
+    ),
 ]
@@ -52,11 +52,9 @@ import logging
 from decimal import Decimal
 from typing import List
 
-import babel.numbers
 import requests
 from django.core.cache import cache
 from django.db import transaction as db_transaction
-from django.utils.translation import get_language, to_locale
 from moneyed import Money
 
 from hordak import defaults
@@ -67,6 +65,7 @@ from hordak.exceptions import (
     LossyCalculationError,
     TradingAccountRequiredError,
 )
+from hordak.utilities.formatting import format_monies
 
 logger = logging.getLogger(__name__)
 
@@ -440,14 +439,7 @@ class Balance(object):
             )
 
     def __str__(self):
-        def fmt(money):
-            locale = to_locale(get_language())
-
-            return babel.numbers.format_currency(
-                money.amount, currency=money.currency.code, locale=locale
-            )
-
-        return ", ".join(map(fmt, self._money_obs)) or "No values"
+        return ", ".join(format_monies(self._money_obs)) or "No values"
 
     def __repr__(self):
         return "Balance: {}".format(self.__str__())
@@ -1,12 +1,24 @@
 import json
-from typing import List, Union
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, List, Tuple, Union
 
 from django.core.exceptions import ValidationError
 from django.db import models
-from moneyed import Money
+from moneyed import Currency, Money, get_currency
 
+from hordak import defaults
 from hordak.utilities.currency import Balance
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+#: A balance in 'raw' form, as returned by :func:`json_to_raw_balance()`. For example:
+#: ``((Decimal("100.00"), "EUR"), (Decimal("-5.00"), "USD"))``
+RawBalance = Tuple[Tuple[Decimal, str], ...]
+
 
 class BalanceField(models.JSONField):
     def from_db_value(self, value, expression, connection):
@@ -42,10 +54,55 @@ class BalanceField(models.JSONField):
         return super().get_prep_value(value)
 
 
-def json_to_balance(json_: Union[str, List[dict]]) -> Balance:
-    if isinstance(json_, str):
-        json_ = json.loads(json_)
-    return Balance([Money(m["amount"], m["currency"]) for m in json_])
+def json_loads(value: Union[str, bytes, List[dict]]) -> Any:
+    """Parse balance JSON as returned by the database
+
+    Values which the database driver has already adapted into
+    Python objects are returned unchanged. Otherwise ``orjson`` is used
+    if it is installed, falling back to the standard library ``json`` module.
+    """
+    if not isinstance(value, (str, bytes, bytearray)):
+        return value
+    if orjson is not None:
+        return orjson.loads(value)
+    return json.loads(value)
+
+
+@lru_cache(maxsize=None)
+def get_interned_currency(code: str) -> Currency:
+    """Get the (shared) ``Currency`` instance for the given currency code"""
+    return get_currency(code.upper())
+
+
+def _to_decimal(amount) -> Decimal:
+    return amount if isinstance(amount, Decimal) else Decimal(str(amount))
+
+
+def json_to_balance(json_: Union[str, bytes, List[dict]]) -> Balance:
+    json_ = json_loads(json_)
+    return Balance(
+        [
+            Money(_to_decimal(m["amount"]), get_interned_currency(m["currency"]))
+            for m in json_
+        ]
+    )
+
+
+def json_to_raw_balance(json_: Union[str, bytes, List[dict]]) -> RawBalance:
+    """Decode balance JSON into ``(amount, currency_code)`` tuples
+
+    This avoids the cost of creating ``Money`` and ``Balance`` objects, which
+    is useful when processing a large number of balances.
+    """
+    json_ = json_loads(json_)
+    return tuple((_to_decimal(m["amount"]), m["currency"]) for m in json_)
+
+
+def zero_balance(raw: bool = False) -> Union[Balance, RawBalance]:
+    """Get a zero balance in the default currency"""
+    if raw:
+        return ((Decimal("0"), defaults.DEFAULT_CURRENCY),)
+    return Balance([Money("0", defaults.DEFAULT_CURRENCY)])
 
 
 def balance_to_json(balance: Balance) -> List[dict]:
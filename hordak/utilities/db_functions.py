@@ -1,15 +1,12 @@
-import json
 from datetime import date
 from functools import cached_property
-from typing import Union
+from typing import Callable, Union
 
 from django.db.models import Func
 from django.db.models.expressions import Combinable, Value
 from djmoney.models.fields import MoneyField
-from moneyed import Money
 
-from hordak import defaults
-from hordak.utilities.currency import Balance
+from hordak.utilities.db import json_to_balance, json_to_raw_balance, zero_balance
 
 
 class GetBalance(Func):
@@ -23,6 +20,8 @@ class GetBalance(Func):
         as_of: Union[Combinable, date, str] = None,
         as_of_leg_id: Union[Combinable, int] = None,
         output_field=None,
+        raw: bool = False,
+        decoder: Callable = None,
         **extra
     ):
         """Create a new GetBalance()
@@ -40,6 +39,15 @@ class GetBalance(Func):
                     balance=GetBalance(F("id"), as_of='2000-01-01')
                 )
 
+                # Get tuples of (Decimal, currency code) rather than Balance objects
+                GetBalance(account_id=5, raw=True)
+
+        Args:
+            raw (bool): Return balances as tuples of ``(amount, currency_code)`` rather than
+                as ``Balance`` objects. This is faster when processing many rows.
+            decoder (callable): Override the function used to decode the JSON returned by
+                the database. Will be called with the database value and should return the
+                decoded balance.
         """
         if as_of is not None:
             if not isinstance(as_of, Combinable):
@@ -48,6 +56,8 @@ class GetBalance(Func):
         if as_of is None and as_of_leg_id is not None:
             raise ValueError("as_of cannot be None when specifying as_of_leg_id")
 
+        self.raw = raw
+        self.decoder = decoder or (json_to_raw_balance if raw else json_to_balance)
         output_field = output_field or MoneyField()
         super().__init__(
             account_id, as_of, as_of_leg_id, output_field=output_field, **extra
@@ -57,10 +67,12 @@ class GetBalance(Func):
     def convert_value(self):
         # Convert the JSON output into a Balance object. Example of a JSON response:
         #    [{"amount": 100.00, "currency": "EUR"}]
+        raw = self.raw
+        decoder = self.decoder
+
         def convertor(value, expression, connection):
             if not value:
-                return Balance([Money("0", defaults.DEFAULT_CURRENCY)])
-            value = json.loads(value)
-            return Balance([Money(v["amount"], v["currency"]) for v in value])
+                return zero_balance(raw=raw)
+            return decoder(value)
 
         return convertor
@@ -0,0 +1,271 @@
+"""Streaming export of account statements and the general ledger
+
+Statements are generated as an iterator of rows, which are read from the
+database in chunks (using a server-side cursor where the database supports it).
+This means memory use remains constant no matter how many legs an account has.
+
+Each account produces:
+
+    1. An ``opening`` row per currency, containing the balance prior to ``date_from``
+    2. A ``leg`` row for each leg, containing the running balance after the leg
+    3. A ``closing`` row per currency, containing the balance as of ``date_to``
+
+The running balance is calculated in the currency of each leg, and is signed
+in the same way as :meth:`Account.get_balance() <hordak.models.Account.get_balance>`.
+
+Rows can then be serialised using :func:`iter_csv()` or :func:`iter_ndjson()`.
+
+Examples:
+
+    .. code-block:: python
+
+        from hordak.utilities.export import iter_account_statement, iter_csv
+
+        rows = iter_account_statement(account, date_from=date(2024, 1, 1))
+        with open("statement.csv", "w") as f:
+            f.writelines(iter_csv(rows))
+
+"""
+
+import csv
+import datetime
+from decimal import Decimal
+from typing import Dict, Iterable, Iterator, Optional
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import DecimalField, QuerySet, Sum
+from django.db.models.functions import Coalesce
+
+from hordak.models import Account, AccountType, Leg
+
+#: Columns included in exported rows
+EXPORT_FIELDS = (
+    "row_type",
+    "account",
+    "account_name",
+    "date",
+    "transaction",
+    "leg",
+    "description",
+    "debit",
+    "credit",
+    "currency",
+    "balance",
+)
+
+DEFAULT_CHUNK_SIZE = 2000
+
+_ACCOUNT_FIELDS = ("id", "uuid", "full_code", "name", "type", "currencies")
+_LEG_FIELDS = (
+    "account_id",
+    "uuid",
+    "transaction__uuid",
+    "transaction__date",
+    "transaction__description",
+    "description",
+    "debit",
+    "credit",
+    "currency",
+)
+
+
+def iter_account_statement(
+    account: Account,
+    date_from: Optional[datetime.date] = None,
+    date_to: Optional[datetime.date] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[dict]:
+    """Iterate over the rows of a statement for a single account
+
+    Args:
+        account (Account): The account to export
+        date_from (date): Export legs on or after this date. The opening
+            balance is the balance prior to this date.
+        date_to (date): Export legs on or before this date
+        chunk_size (int): Number of legs to fetch from the database at a time
+
+    Returns:
+        An iterator of ``dict`` rows, with keys as per ``EXPORT_FIELDS``
+    """
+    accounts = Account.objects.filter(pk=account.pk)
+    return iter_general_ledger(accounts, date_from, date_to, chunk_size)
+
+
+def iter_general_ledger(
+    accounts: Optional[QuerySet] = None,
+    date_from: Optional[datetime.date] = None,
+    date_to: Optional[datetime.date] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[dict]:
+    """Iterate over the rows of the general ledger
+
+    Accounts are exported in tree order. Accounts with no legs in the date range
+    and a zero opening balance are omitted.
+
+    Args:
+        accounts (QuerySet): The accounts to export. Defaults to all leaf accounts.
+        date_from (date): Export legs on or after this date. The opening
+            balances are the balances prior to this date.
+        date_to (date): Export legs on or before this date
+        chunk_size (int): Number of legs to fetch from the database at a time
+
+    Returns:
+        An iterator of ``dict`` rows, with keys as per ``EXPORT_FIELDS``
+    """
+    if accounts is None:
+        accounts = Account.objects.filter(children__isnull=True)
+    accounts = Account.objects.filter(pk__in=accounts.values("pk")).order_by(
+        "tree_id", "lft"
+    )
+    account_list = list(accounts.values(*_ACCOUNT_FIELDS))
+
+    opening = _get_opening_balances(accounts, date_from)
+
+    legs = Leg.objects.filter(account__in=accounts)
+    if date_from:
+        legs = legs.filter(transaction__date__gte=date_from)
+    if date_to:
+        legs = legs.filter(transaction__date__lte=date_to)
+    legs = legs.order_by(
+        "account__tree_id",
+        "account__lft",
+        "transaction__date",
+        "transaction_id",
+        "id",
+    ).values(*_LEG_FIELDS)
+    legs = _Peekable(legs.iterator(chunk_size=chunk_size))
+
+    for account in account_list:
+        balances = dict.fromkeys(account["currencies"], Decimal(0))
+        balances.update(opening.get(account["id"], {}))
+
+        has_legs = legs.peek() and legs.peek()["account_id"] == account["id"]
+        if not has_legs and not any(balances.values()):
+            continue
+
+        yield from _balance_rows("opening", account, date_from, balances)
+
+        debits_increase = account["type"] in (AccountType.asset, AccountType.expense)
+        while legs.peek() and legs.peek()["account_id"] == account["id"]:
+            leg = next(legs)
+            amount = leg["debit"] if leg["debit"] is not None else -leg["credit"]
+            if not debits_increase:
+                amount = -amount
+            currency = leg["currency"]
+            balances[currency] = balances.get(currency, Decimal(0)) + amount
+            yield {
+                "row_type": "leg",
+                "account": account["full_code"],
+                "account_name": account["name"],
+                "date": leg["transaction__date"],
+                "transaction": leg["transaction__uuid"],
+                "leg": leg["uuid"],
+                "description": leg["description"] or leg["transaction__description"],
+                "debit": leg["debit"],
+                "credit": leg["credit"],
+                "currency": currency,
+                "balance": balances[currency],
+            }
+
+        yield from _balance_rows("closing", account, date_to, balances)
+
+
+def _get_opening_balances(
+    accounts, date_from: Optional[datetime.date]
+) -> Dict[int, Dict[str, Decimal]]:
+    """Get the balance of each account prior to ``date_from``
+
+    Returns a dictionary of ``account_id`` to ``{currency: signed balance}``.
+    """
+    if not date_from:
+        return {}
+
+    results = (
+        Leg.objects.filter(account__in=accounts, transaction__date__lt=date_from)
+        .order_by()
+        .values("account_id", "account__type", "currency")
+        .annotate(
+            total_debit=Coalesce(Sum("debit"), 0, output_field=DecimalField()),
+            total_credit=Coalesce(Sum("credit"), 0, output_field=DecimalField()),
+        )
+    )
+    opening = {}
+    for r in results:
+        balance = r["total_debit"] - r["total_credit"]
+        if r["account__type"] not in (AccountType.asset, AccountType.expense):
+            balance = -balance
+        opening.setdefault(r["account_id"], {})[r["currency"]] = balance
+    return opening
+
+
+def _balance_rows(row_type, account, date, balances):
+    for currency, balance in balances.items():
+        yield {
+            "row_type": row_type,
+            "account": account["full_code"],
+            "account_name": account["name"],
+            "date": date,
+            "transaction": None,
+            "leg": None,
+            "description": "",
+            "debit": None,
+            "credit": None,
+            "currency": currency,
+            "balance": balance,
+        }
+
+
+class _Peekable(object):
+    """Iterator which allows viewing the next item without consuming it"""
+
+    _empty = object()
+
+    def __init__(self, iterator):
+        self.iterator = iterator
+        self.next_item = self._empty
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.next_item is self._empty:
+            return next(self.iterator)
+        item, self.next_item = self.next_item, self._empty
+        return item
+
+    def peek(self):
+        """Get the next item, or ``None`` if the iterator is exhausted"""
+        if self.next_item is self._empty:
+            self.next_item = next(self.iterator, None)
+        return self.next_item
+
+
+class _Echo(object):
+    """File-like object which returns the written value rather than storing it"""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(rows: Iterable[dict], fields=EXPORT_FIELDS) -> Iterator[str]:
+    """Serialise rows to CSV, yielding one line at a time (including a heading row)"""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow(
+            ["" if row[field] is None else row[field] for field in fields]
+        )
+
+
+def iter_ndjson(rows: Iterable[dict], fields=EXPORT_FIELDS) -> Iterator[str]:
+    """Serialise rows to newline-delimited JSON, yielding one line at a time"""
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode({field: row[field] for field in fields}) + "\n"
+
+
+#: Supported export formats, as ``format: (serialiser, content type, file extension)``
+EXPORT_FORMATS = {
+    "csv": (iter_csv, "text/csv", "csv"),
+    "ndjson": (iter_ndjson, "application/x-ndjson", "ndjson"),
+}
@@ -0,0 +1,199 @@
+"""Fast locale-aware formatting of monetary values
+
+Formatting values with ``babel.numbers.format_currency()`` is comparatively
+expensive, as babel needs to resolve the locale, load the number pattern and
+look up the currency symbol & precision for every value formatted. This adds up
+quickly when rendering pages containing thousands of values.
+
+The formatters provided here do this work once per ``(locale, currency)`` pair,
+and cache the result. The output is identical to that of babel.
+
+Examples:
+
+    .. code-block:: python
+
+        >>> from hordak.utilities.formatting import format_currency, format_monies
+        >>> format_currency(Decimal("1234.5"), "EUR", locale="en_US")
+        '€1,234.50'
+        >>> format_monies([Money(1, "EUR"), Money(-2, "USD")], locale="en_US")
+        ['€1.00', '-$2.00']
+
+"""
+
+import re
+from decimal import Decimal
+from functools import lru_cache
+from typing import Iterable, List, Optional, Tuple, Union
+
+import babel.numbers
+from babel import Locale
+from django.utils.translation import get_language, to_locale
+from moneyed import Money
+
+Amount = Union[Decimal, int, float, str]
+
+
+def get_current_locale() -> str:
+    """Get the babel locale for the currently active language"""
+    return to_locale(get_language() or "en-us")
+
+
+def _unquote(value: str) -> str:
+    # Remove single quotes around text, except for doubled single quotes
+    # which are replaced with a single quote (as per babel)
+    return re.sub(r"'([^']*)'", lambda m: m.group(1) or "'", value)
+
+
+class CurrencyFormatter(object):
+    """Formats values for a single locale & currency
+
+    Do not create these directly, instead use :func:`get_currency_formatter()`,
+    which will cache formatters for reuse.
+
+    If ``currency`` is ``None`` then values will be formatted as plain
+    decimals (as per ``babel.numbers.format_decimal()``).
+    """
+
+    def __init__(self, locale: str, currency: Optional[str] = None):
+        self.locale = Locale.parse(locale)
+        self.currency = currency
+
+        if currency:
+            self.pattern = self.locale.currency_formats["standard"]
+            precision = babel.numbers.get_currency_precision(currency)
+            self.frac_prec = (precision, precision)
+        else:
+            self.pattern = self.locale.decimal_formats[None]
+            self.frac_prec = self.pattern.frac_prec
+
+        # We only precompile plain number patterns. Anything more exotic
+        # (scientific notation, significant digits, currency names) is handed
+        # to babel as normal.
+        self.compiled = not (
+            self.pattern.scale
+            or self.pattern.exp_prec
+            or "@" in self.pattern.pattern
+            or "¤¤¤" in "".join(self.pattern.prefix + self.pattern.suffix)
+        )
+        if not self.compiled:
+            return
+
+        self.prefix = tuple(self._resolve_affix(a) for a in self.pattern.prefix)
+        self.suffix = tuple(self._resolve_affix(a) for a in self.pattern.suffix)
+        self.quantum = Decimal(10) ** -self.frac_prec[1]
+        self.min_int = self.pattern.int_prec[0]
+        self.grouping = self.pattern.grouping
+        self.group_symbol = babel.numbers.get_group_symbol(self.locale)
+        self.decimal_symbol = babel.numbers.get_decimal_symbol(self.locale)
+
+    def _resolve_affix(self, affix: str) -> str:
+        if "¤" in affix and self.currency is not None:
+            affix = affix.replace("¤¤", self.currency.upper())
+            affix = affix.replace(
+                "¤", babel.numbers.get_currency_symbol(self.currency, self.locale)
+            )
+        return _unquote(affix)
+
+    def format(self, value: Amount) -> str:
+        """Format the given value"""
+        if not isinstance(value, Decimal):
+            value = Decimal(str(value))
+
+        if not self.compiled or not value.is_finite():
+            return self.pattern.apply(value, self.locale, currency=self.currency)
+
+        is_negative = int(value.is_signed())
+        rounded = abs(value).normalize().quantize(self.quantum)
+        integer, _, fraction = f"{rounded:f}".partition(".")
+        return "".join(
+            (
+                self.prefix[is_negative],
+                self._format_int(integer),
+                self._format_frac(fraction or "0"),
+                self.suffix[is_negative],
+            )
+        )
+
+    def _format_int(self, value: str) -> str:
+        if len(value) < self.min_int:
+            value = "0" * (self.min_int - len(value)) + value
+        gsize = self.grouping[0]
+        ret = ""
+        while len(value) > gsize:
+            ret = self.group_symbol + value[-gsize:] + ret
+            value = value[:-gsize]
+            gsize = self.grouping[1]
+        return value + ret
+
+    def _format_frac(self, value: str) -> str:
+        min_, max_ = self.frac_prec
+        if len(value) < min_:
+            value += "0" * (min_ - len(value))
+        if max_ == 0 or (min_ == 0 and int(value) == 0):
+            return ""
+        while len(value) > min_ and value[-1] == "0":
+            value = value[:-1]
+        return self.decimal_symbol + value
+
+
+@lru_cache(maxsize=256)
+def get_currency_formatter(
+    locale: str, currency: Optional[str] = None
+) -> CurrencyFormatter:
+    """Get a (cached) formatter for the given locale and currency"""
+    return CurrencyFormatter(locale, currency)
+
+
+def format_currency(amount: Amount, currency: str, locale: Optional[str] = None) -> str:
+    """Format a monetary amount. Equivalent to ``babel.numbers.format_currency()``
+
+    ``locale`` defaults to that of the active language.
+    """
+    locale = locale or get_current_locale()
+    return get_currency_formatter(locale, currency).format(amount)
+
+
+def format_decimal(amount: Amount, locale: Optional[str] = None) -> str:
+    """Format a number. Equivalent to ``babel.numbers.format_decimal()``
+
+    ``locale`` defaults to that of the active language.
+    """
+    locale = locale or get_current_locale()
+    return get_currency_formatter(locale, None).format(amount)
+
+
+def format_monies(
+    values: Iterable[Union[Money, Tuple[Amount, str]]],
+    locale: Optional[str] = None,
+    accounting: bool = False,
+) -> List[str]:
+    """Format many monetary values at once
+
+    The locale is resolved once for the whole batch, so prefer this over
+    repeated calls to :func:`format_currency()`.
+
+    Args:
+        values: ``Money`` instances, or ``(amount, currency_code)`` tuples
+        locale (str): Locale to format for. Defaults to that of the active language.
+        accounting (bool): Format negative values as the absolute value
+            in parentheses, i.e. ``(€10.00)`` rather than ``-€10.00``.
+
+    Returns:
+        ([str]): The formatted values, in the same order as ``values``
+    """
+    locale = locale or get_current_locale()
+    formatted = []
+    for value in values:
+        if isinstance(value, Money):
+            amount, currency = value.amount, value.currency.code
+        else:
+            amount, currency = value
+
+        formatter = get_currency_formatter(locale, currency)
+        if not isinstance(amount, Decimal):
+            amount = Decimal(str(amount))
+        if accounting and amount < 0:
+            formatted.append("({})".format(formatter.format(abs(amount))))
+        else:
+            formatted.append(formatter.format(amount))
+    return formatted
@@ -0,0 +1,290 @@
+"""Keyset (aka 'seek') pagination
+
+Django's ``Paginator`` uses ``OFFSET`` to fetch pages, which requires the database to
+read & discard every row before the requested page. It also runs a ``COUNT(*)``
+in order to calculate the number of pages. Both of these become very slow on large tables.
+
+Keyset pagination instead remembers the position of the last row on the current
+page, and asks the database for rows which come after that position. Given an index
+matching the ordering, every page is equally fast to fetch.
+
+Positions are passed between requests as opaque cursor strings.
+
+As keyset pagination never counts rows, :func:`estimate_count()` can be used to
+get an approximate row count from the database's query planner. This is also used by
+:class:`EstimatedCountPaginator`, a drop-in replacement for Django's ``Paginator``
+(useful for the Django admin).
+
+Examples:
+
+    .. code-block:: python
+
+        from hordak.utilities.pagination import KeysetPaginator
+
+        paginator = KeysetPaginator(
+            Leg.objects.all(),
+            per_page=50,
+            ordering=("-transaction__date", "-id"),
+        )
+        page = paginator.page()
+        next_page = paginator.page(page.next_cursor)
+
+"""
+
+import base64
+import json
+from collections.abc import Sequence
+from functools import cached_property
+from typing import List, Optional, Tuple
+
+from django.core.exceptions import EmptyResultSet, FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import F, Q
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor cannot be decoded, or its values do not match the ordering"""
+
+    pass
+
+
+def encode_cursor(values: list, reverse: bool = False) -> str:
+    """Encode a position into an opaque cursor string"""
+    data = json.dumps([int(reverse), list(values)], cls=DjangoJSONEncoder)
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[list, bool]:
+    """Decode a cursor created by :func:`encode_cursor()`
+
+    Returns:
+        (list, bool): The cursor values, and whether the cursor points backwards
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        reverse, values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise InvalidCursor("Invalid cursor: {}".format(cursor))
+    if not isinstance(values, list):
+        raise InvalidCursor("Invalid cursor: {}".format(cursor))
+    return values, bool(reverse)
+
+
+def estimate_count(queryset) -> Optional[int]:
+    """Estimate the number of rows a queryset will return
+
+    The estimate is taken from the database's query planner (via ``EXPLAIN``),
+    so is very fast but may be inaccurate. This is supported for PostgreSQL
+    and MySQL/MariaDB. ``None`` is returned for other databases.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor not in ("postgresql", "mysql"):
+        return None
+
+    try:
+        sql, params = queryset.order_by().query.sql_with_params()
+    except EmptyResultSet:
+        return 0
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]["Plan"]["Plan Rows"])
+        else:
+            cursor.execute("EXPLAIN " + sql, params)
+            columns = [column[0] for column in cursor.description]
+            row = dict(zip(columns, cursor.fetchone()))
+            return int(row.get("rows") or 0)
+
+
+class EstimatedCountPaginator(Paginator):
+    """A Django ``Paginator`` which estimates the total count for large querysets
+
+    The estimate is provided by :func:`estimate_count()`. If the estimate is below
+    ``exact_count_threshold`` then an exact count will be performed as normal.
+    """
+
+    exact_count_threshold = 10_000
+
+    @cached_property
+    def count(self):
+        estimate = None
+        if hasattr(self.object_list, "query"):
+            estimate = estimate_count(self.object_list)
+        if estimate is None or estimate < self.exact_count_threshold:
+            return super().count
+        return estimate
+
+
+class KeysetPage(Sequence):
+    """A single page of results from a :class:`KeysetPaginator`"""
+
+    def __init__(
+        self,
+        object_list: list,
+        paginator: "KeysetPaginator",
+        next_cursor: Optional[str],
+        previous_cursor: Optional[str],
+        cursor: Optional[str] = None,
+    ):
+        self.object_list = object_list
+        self.paginator = paginator
+        #: The cursor used to fetch this page
+        self.cursor = cursor
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return "<KeysetPage ({} items)>".format(len(self.object_list))
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    def has_previous(self) -> bool:
+        return self.previous_cursor is not None
+
+    def has_other_pages(self) -> bool:
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator(object):
+    """Paginate a queryset using keyset pagination
+
+    The ``ordering`` must be unique across all rows, which is normally achieved by
+    ending it with the primary key. For best performance there should be an index
+    matching the ordering.
+
+    Args:
+        queryset (QuerySet): The queryset to paginate
+        per_page (int): Number of rows per page
+        ordering (tuple[str]): Fields to order by, in the form accepted by
+            ``QuerySet.order_by()``. Fields may span relationships.
+    """
+
+    def __init__(self, queryset, per_page: int, ordering=("-date", "-id")):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        # List of (field, descending)
+        self.fields = [(o.lstrip("-"), o.startswith("-")) for o in self.ordering]
+
+    @cached_property
+    def estimated_count(self) -> Optional[int]:
+        """Approximate number of rows in the queryset (see :func:`estimate_count()`)"""
+        return estimate_count(self.queryset)
+
+    def _annotation_name(self, index: int) -> str:
+        return "_keyset_{}".format(index)
+
+    def _get_model_field(self, name: str):
+        """Get the model field for an ordering field, which may span relationships
+
+        Returns ``None`` if the field is not a model field (e.g. an annotation)
+        """
+        model = self.queryset.model
+        field = None
+        for part in name.split("__"):
+            if model is None:
+                return None
+            try:
+                field = model._meta.pk if part == "pk" else model._meta.get_field(part)
+            except FieldDoesNotExist:
+                annotation = self.queryset.query.annotations.get(name)
+                return getattr(annotation, "output_field", None)
+            model = field.related_model
+        return field
+
+    def _convert_values(self, values: list) -> list:
+        """Convert the values from a cursor to the types of the ordering fields
+
+        Raises:
+            InvalidCursor: If the values do not match the ordering fields
+        """
+        if len(values) != len(self.fields):
+            raise InvalidCursor("Cursor does not match ordering")
+
+        converted = []
+        for (name, _), value in zip(self.fields, values):
+            field = self._get_model_field(name)
+            try:
+                converted.append(field.to_python(value) if field else value)
+            except (ValidationError, ValueError, TypeError):
+                raise InvalidCursor("Invalid cursor value for {}".format(name))
+        return converted
+
+    def _get_position_filter(self, values: list, forwards: bool) -> Q:
+        """Get a filter for all rows after (or before) the given position
+
+        For ordering ``(-date, -id)`` this is equivalent to:
+        ``date < v1 OR (date = v1 AND id < v2)``
+        """
+        q = Q()
+        for i in reversed(range(len(self.fields))):
+            field, descending = self.fields[i]
+            lookup = "lt" if descending == forwards else "gt"
+            after = Q(**{"{}__{}".format(field, lookup): values[i]})
+            if i == len(self.fields) - 1:
+                q = after
+            else:
+                q = after | (Q(**{field: values[i]}) & q)
+        return q
+
+    def _get_ordering(self, forwards: bool) -> List[str]:
+        ordering = []
+        for field, descending in self.fields:
+            descending = descending if forwards else not descending
+            ordering.append("-" + field if descending else field)
+        return ordering
+
+    def _get_values(self, obj) -> list:
+        names = [self._annotation_name(i) for i in range(len(self.fields))]
+        if isinstance(obj, dict):
+            # The queryset is a values() queryset
+            return [obj[name] for name in names]
+        return [getattr(obj, name) for name in names]
+
+    def page(self, cursor: Optional[str] = None) -> KeysetPage:
+        """Get the page starting at ``cursor``, or the first page if ``cursor`` is empty"""
+        values, reverse = decode_cursor(cursor) if cursor else (None, False)
+        if values is not None:
+            values = self._convert_values(values)
+        forwards = not reverse
+
+        queryset = self.queryset.annotate(
+            **{
+                self._annotation_name(i): F(field)
+                for i, (field, _) in enumerate(self.fields)
+            }
+        ).order_by(*self._get_ordering(forwards))
+        if values is not None:
+            queryset = queryset.filter(self._get_position_filter(values, forwards))
+
+        # Fetch one extra row so we know if there is another page
+        object_list = list(queryset[: self.per_page + 1])
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[: self.per_page]
+        if not forwards:
+            object_list.reverse()
+
+        next_cursor = previous_cursor = None
+        if object_list:
+            first_values = self._get_values(object_list[0])
+            last_values = self._get_values(object_list[-1])
+            if has_more or not forwards:
+                next_cursor = encode_cursor(last_values)
+            if values is not None and (has_more or forwards):
+                previous_cursor = encode_cursor(first_values, reverse=True)
+
+        return KeysetPage(
+            object_list, self, next_cursor, previous_cursor, cursor=cursor
+        )
@@ -0,0 +1,452 @@
+"""Automatic reconciliation of statement lines against existing transactions
+
+Unreconciled statement lines are matched to transactions which already exist
+on the line's bank account, and which are not yet reconciled to a statement line.
+A transaction is a candidate for a line when:
+
+    1. The transaction's legs on the bank account sum to the line's amount
+       (i.e. money into the bank account is a debit, as in
+       :meth:`StatementLine.create_transaction() <hordak.models.StatementLine.create_transaction>`)
+    2. The transaction's date is within ``date_window`` days of the line's date
+    3. The descriptions have a similarity of at least ``min_similarity``
+       (see :func:`description_similarity()`)
+
+Candidates are loaded with one query per bank account, and are then grouped
+by amount and sorted by date. Each line therefore only considers transactions
+of the same amount within its date window, rather than every transaction.
+
+The candidate with the most similar description (then the closest date) is matched.
+Where several candidates are equally good, or several lines are equally good matches
+for the same transaction, the lines are reported as ambiguous and left unreconciled.
+
+Examples:
+
+    .. code-block:: python
+
+        from hordak.utilities.reconciliation import reconcile_statement_lines
+
+        result = reconcile_statement_lines(
+            StatementLine.objects.filter(statement_import__bank_account=bank),
+            date_window=5,
+        )
+        print(len(result.matches), "lines reconciled")
+        for line_id, transaction_ids in result.ambiguous.items():
+            ...
+
+"""
+
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
+
+from django.db import connection
+from django.db import transaction as db_transaction
+from django.db.models import (
+    Case,
+    DecimalField,
+    Exists,
+    IntegerField,
+    OuterRef,
+    QuerySet,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce
+
+from hordak import exceptions
+from hordak.models import Account, Leg, StatementLine, Transaction
+from hordak.utilities.statement_import import normalise_description
+from hordak.utilities.watermark import ledger_changed
+
+#: The number of lines to link to transactions per query, for databases other than PostgreSQL
+LINK_BATCH_SIZE = 1000
+#: The number of transactions (or legs) to insert per query in :func:`create_transactions()`
+BULK_BATCH_SIZE = 2000
+
+
+class ReconciliationResult(NamedTuple):
+    """The result of :func:`match_statement_lines()`"""
+
+    #: Statement line ID → ID of the transaction it was matched to
+    matches: Dict[int, int]
+    #: Statement line ID → IDs of the transactions it could equally be matched to
+    ambiguous: Dict[int, List[int]]
+    #: IDs of statement lines with no candidate transactions
+    unmatched: List[int]
+
+
+def description_similarity(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    """Get the similarity of two descriptions, from 0 to 1
+
+    Descriptions are compared as sets of words (see :func:`description_words()`).
+    The similarity is the proportion of the words in the shorter description which
+    also appear in the longer description, so a short transaction description such
+    as ``"Acme Ltd"`` is similar to a statement line of ``"CARD PAYMENT ACME LTD 1234"``.
+    """
+    if not a or not b:
+        return 0.0
+    return len(a & b) / min(len(a), len(b))
+
+
+def description_words(description: str) -> FrozenSet[str]:
+    """Get the set of normalised words in a description"""
+    return frozenset(normalise_description(description).split())
+
+
+def match_statement_lines(
+    lines: Optional[QuerySet] = None,
+    date_window: int = 3,
+    min_similarity: float = 0.0,
+) -> ReconciliationResult:
+    """Find the transactions matching unreconciled statement lines
+
+    Args:
+        lines (QuerySet): The ``StatementLine`` objects to match. Defaults to all lines.
+            Lines which are already reconciled are ignored.
+        date_window (int): The maximum number of days between the line and the transaction
+        min_similarity (float): The minimum similarity of the descriptions,
+            from 0 (any description) to 1 (every word of the shorter description must match)
+
+    Returns:
+        ReconciliationResult: The matches found. Nothing is saved.
+    """
+    if lines is None:
+        lines = StatementLine.objects.all()
+    lines = lines.filter(transaction=None).values_list(
+        "id", "statement_import__bank_account_id", "date", "amount", "description"
+    )
+
+    lines_by_account = defaultdict(list)
+    for line_id, bank_account_id, date, amount, description in lines.iterator(
+        chunk_size=5000
+    ):
+        lines_by_account[bank_account_id].append(
+            (line_id, date, amount, description_words(description))
+        )
+
+    window = timedelta(days=date_window)
+    options = {}
+    for bank_account_id, account_lines in lines_by_account.items():
+        candidates = _get_candidates(
+            bank_account_id,
+            min(line[1] for line in account_lines) - window,
+            max(line[1] for line in account_lines) + window,
+        )
+        for line_id, date, amount, words in account_lines:
+            options[line_id] = _score_candidates(
+                candidates.get(amount), date, words, window, min_similarity
+            )
+
+    return _assign(options)
+
+
+@db_transaction.atomic()
+def reconcile_statement_lines(
+    lines: Optional[QuerySet] = None,
+    date_window: int = 3,
+    min_similarity: float = 0.0,
+) -> ReconciliationResult:
+    """Match unreconciled statement lines to transactions, and link them
+
+    Takes the same arguments as :func:`match_statement_lines()`. Matched lines
+    are linked to their transactions using :func:`link_statement_lines()`.
+
+    Returns:
+        ReconciliationResult: The matches found
+    """
+    result = match_statement_lines(
+        lines, date_window=date_window, min_similarity=min_similarity
+    )
+    link_statement_lines(result.matches)
+    return result
+
+
+def link_statement_lines(matches: Dict[int, int]) -> int:
+    """Set the transaction of many statement lines at once
+
+    Lines which have already been reconciled are not changed. On PostgreSQL
+    all lines are updated using a single ``UPDATE ... FROM`` query.
+
+    Args:
+        matches (dict): Statement line ID → transaction ID
+
+    Returns:
+        int: The number of lines updated
+    """
+    if not matches:
+        return 0
+
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "UPDATE {} AS line "
+                "SET transaction_id = matched.transaction_id "
+                "FROM unnest(%s::bigint[], %s::bigint[]) AS matched(id, transaction_id) "
+                "WHERE line.id = matched.id AND line.transaction_id IS NULL".format(
+                    connection.ops.quote_name(StatementLine._meta.db_table)
+                ),
+                [list(matches.keys()), list(matches.values())],
+            )
+            return cursor.rowcount
+
+    updated = 0
+    items = list(matches.items())
+    for start in range(0, len(items), LINK_BATCH_SIZE):
+        end = start + LINK_BATCH_SIZE
+        batch = items[start:end]
+        updated += StatementLine.objects.filter(
+            pk__in=[line_id for line_id, _ in batch], transaction=None
+        ).update(
+            transaction_id=Case(
+                *[When(pk=line_id, then=Value(txn_id)) for line_id, txn_id in batch],
+                output_field=IntegerField(),
+            )
+        )
+    return updated
+
+
+@db_transaction.atomic()
+def create_transactions(lines: Iterable[StatementLine], to_accounts: Dict[int, int]):
+    """Create transactions for many statement lines at once
+
+    This is the bulk equivalent of calling
+    :meth:`StatementLine.create_transaction() <hordak.models.StatementLine.create_transaction>`
+    for each line, and is used by :meth:`hordak.models.StatementLineQuerySet.create_transactions`.
+    On PostgreSQL the transactions & legs are created using ``bulk_create()``, and the
+    lines are linked using :func:`link_statement_lines()`. Other databases create
+    each transaction individually.
+
+    The lines' bank accounts are fetched in a single query. The transactions are identical
+    to those created by ``create_transaction()`` on every database, with legs from
+    :meth:`StatementLine.get_transaction_legs() <hordak.models.StatementLine.get_transaction_legs>`.
+
+    Args:
+        lines ([StatementLine]): The lines, ideally annotated with ``bank_account_id``
+            (otherwise ``statement_import`` will be loaded for each line).
+            Lines which are already reconciled are ignored.
+        to_accounts (dict): Statement line ID → ID of the account the transaction is into / out of.
+            Lines not in ``to_accounts`` are ignored.
+
+    Returns:
+        [Transaction]: The created transactions
+    """
+    lines = [
+        line for line in lines if line.transaction_id is None and line.pk in to_accounts
+    ]
+    if not lines:
+        return []
+    bank_account_ids = [get_bank_account_id(line) for line in lines]
+    accounts = Account.objects.in_bulk(
+        set(bank_account_ids) | set(to_accounts.values())
+    )
+
+    if connection.vendor != "postgresql":
+        transactions = []
+        for line, bank_account_id in zip(lines, bank_account_ids):
+            line.statement_import.bank_account = accounts[bank_account_id]
+            transactions.append(line.create_transaction(accounts[to_accounts[line.pk]]))
+        return transactions
+
+    # bulk_create() does not call Leg.save(), which would otherwise reject zero amounts
+    for line in lines:
+        if not line.amount:
+            raise exceptions.ZeroAmountError(
+                "Statement line {} has an amount of zero".format(line.uuid)
+            )
+
+    transactions = Transaction.objects.bulk_create(
+        [Transaction(date=line.date) for line in lines],
+        batch_size=BULK_BATCH_SIZE,
+    )
+    legs = []
+    for line, transaction, bank_account_id in zip(
+        lines, transactions, bank_account_ids
+    ):
+        legs.extend(
+            line.get_transaction_legs(
+                transaction, accounts[bank_account_id], accounts[to_accounts[line.pk]]
+            )
+        )
+    legs = Leg.objects.bulk_create(legs, batch_size=BULK_BATCH_SIZE)
+
+    link_statement_lines(
+        {line.pk: transaction.pk for line, transaction in zip(lines, transactions)}
+    )
+    for line, transaction in zip(lines, transactions):
+        line.transaction = transaction
+
+    ledger_changed(
+        account_ids={leg.account_id for leg in legs},
+        max_leg_id=max(leg.pk for leg in legs),
+    )
+    return transactions
+
+
+@db_transaction.atomic()
+def unreconcile_statement_lines(
+    lines: QuerySet, delete_transactions: bool = True
+) -> int:
+    """Unreconcile many statement lines at once
+
+    This is used by
+    :meth:`StatementLine.objects.unreconcile() <hordak.models.StatementLineQuerySet.unreconcile>`.
+    Rather than deleting each transaction individually, the lines are unlinked and their
+    transactions deleted using ``QuerySet.delete()``, which runs a few queries per
+    :data:`BULK_BATCH_SIZE` transactions. Legs are deleted along with their transactions,
+    and any relations to the transactions from other models are handled as per their
+    ``on_delete``.
+
+    Args:
+        lines (QuerySet): The ``StatementLine`` objects to unreconcile
+        delete_transactions (bool): Delete the lines' transactions, as per ``UnreconcileView``.
+            Set to ``False`` to keep the transactions and only unlink the lines, for example
+            where the lines were matched to existing transactions by :func:`reconcile_statement_lines()`.
+
+    Returns:
+        int: The number of lines unreconciled. When deleting transactions, this includes any
+        other lines linked to the same transactions.
+    """
+    lines = lines.exclude(transaction=None)
+    if not delete_transactions:
+        return lines.update(transaction=None)
+
+    transaction_ids = list(lines.values_list("transaction_id", flat=True).distinct())
+    count = 0
+    for start in range(0, len(transaction_ids), BULK_BATCH_SIZE):
+        end = start + BULK_BATCH_SIZE
+        batch = transaction_ids[start:end]
+        count += StatementLine.objects.filter(transaction_id__in=batch).update(
+            transaction=None
+        )
+        # The ledger watermarks are updated by the legs' post_delete signals
+        Transaction.objects.filter(pk__in=batch).delete()
+    return count
+
+
+def get_bank_account_id(line: StatementLine) -> int:
+    """Get the ID of a line's bank account
+
+    Uses the ``bank_account_id`` annotation added by
+    :meth:`hordak.models.StatementLineQuerySet.with_bank_account_id` if present,
+    to avoid loading the line's ``statement_import``.
+    """
+    bank_account_id = getattr(line, "bank_account_id", None)
+    if bank_account_id is None:
+        bank_account_id = line.statement_import.bank_account_id
+    return bank_account_id
+
+
+def _get_candidates(bank_account_id, date_from, date_to) -> Dict[Decimal, tuple]:
+    """Get unreconciled transactions on the bank account, grouped by amount
+
+    Returns a dict of amount → ``(dates, candidates)``, both sorted by date.
+    """
+    legs = (
+        Leg.objects.filter(
+            account_id=bank_account_id,
+            transaction__date__gte=date_from,
+            transaction__date__lte=date_to,
+        )
+        .exclude(
+            Exists(
+                StatementLine.objects.filter(transaction_id=OuterRef("transaction_id"))
+            )
+        )
+        .values("transaction_id", "transaction__date", "transaction__description")
+        .annotate(
+            total_debit=Coalesce(Sum("debit"), 0, output_field=DecimalField()),
+            total_credit=Coalesce(Sum("credit"), 0, output_field=DecimalField()),
+        )
+        .values_list(
+            "transaction_id",
+            "transaction__date",
+            "transaction__description",
+            "total_debit",
+            "total_credit",
+        )
+    )
+
+    grouped = defaultdict(list)
+    for transaction_id, date, description, debit, credit in legs:
+        amount = debit - credit
+        if amount:
+            grouped[amount].append(
+                (date, transaction_id, description_words(description))
+            )
+
+    candidates = {}
+    for amount, group in grouped.items():
+        group.sort(key=lambda candidate: candidate[:2])
+        candidates[amount] = ([candidate[0] for candidate in group], group)
+    return candidates
+
+
+def _score_candidates(
+    candidates, date, words, window, min_similarity
+) -> List[Tuple[tuple, int]]:
+    """Get the candidates within the date window, as ``(score, transaction ID)``, best first"""
+    if not candidates:
+        return []
+    dates, group = candidates
+    scored = []
+    for index in range(
+        bisect_left(dates, date - window), bisect_right(dates, date + window)
+    ):
+        candidate_date, transaction_id, candidate_words = group[index]
+        similarity = description_similarity(words, candidate_words)
+        if similarity >= min_similarity:
+            score = (similarity, -abs((candidate_date - date).days))
+            scored.append((score, transaction_id))
+    scored.sort(key=lambda option: option[0], reverse=True)
+    return scored
+
+
+def _assign(options: Dict[int, List[Tuple[tuple, int]]]) -> ReconciliationResult:
+    """Assign each line its best transaction, with each transaction used at most once
+
+    Each remaining line claims its best available transaction. A transaction
+    claimed by several lines goes to the line with the best score, and the other
+    lines try again with their next best transaction. Ties are ambiguous.
+    """
+    matches = {}
+    ambiguous = {}
+    unmatched = [line_id for line_id, scored in options.items() if not scored]
+    taken = set()
+    pending = [line_id for line_id, scored in options.items() if scored]
+
+    while pending:
+        claims = defaultdict(list)
+        for line_id in pending:
+            available = [
+                option for option in options[line_id] if option[1] not in taken
+            ]
+            if not available:
+                unmatched.append(line_id)
+                continue
+            best_score = available[0][0]
+            best = [txn_id for score, txn_id in available if score == best_score]
+            if len(best) > 1:
+                ambiguous[line_id] = best
+            else:
+                claims[best[0]].append((best_score, line_id))
+
+        pending = []
+        for txn_id, claimants in claims.items():
+            taken.add(txn_id)
+            best_score = max(score for score, _ in claimants)
+            best = [line_id for score, line_id in claimants if score == best_score]
+            if len(best) > 1:
+                for line_id in best:
+                    ambiguous[line_id] = [txn_id]
+            else:
+                matches[best[0]] = txn_id
+            pending.extend(
+                line_id for score, line_id in claimants if score != best_score
+            )
+
+    return ReconciliationResult(
+        matches=matches, ambiguous=ambiguous, unmatched=sorted(unmatched)
+    )
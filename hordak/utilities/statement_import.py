@@ -1,3 +1,27 @@
+import codecs
+import csv
+import hashlib
+import io
+import re
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal, DecimalException, InvalidOperation
+from functools import lru_cache
+from itertools import islice
+from typing import (
+    BinaryIO,
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    Union,
+)
+
 DATE_FORMATS = (
     ("%d-%m-%Y", "dd-mm-yyyy"),
     ("%d/%m/%Y", "dd/mm/yyyy"),
@@ -36,3 +60,390 @@ DATE_FORMATS = (
     ("%y/%m/%d", "yy/mm/dd"),
     ("%y.%m.%d", "yy.mm.dd"),
 )
+
+#: Number of values used to detect the date format of a column
+DATE_SAMPLE_SIZE = 1000
+
+#: Regular expressions for the ``strptime()`` directives used in ``DATE_FORMATS``.
+#: These are the same as those used by Python's ``strptime()``, which (unlike the
+#: C library's) requires exactly four digits for ``%Y``, and allows a space before
+#: single digit days.
+_DATE_DIRECTIVES = {
+    "%d": r"(?P<day>3[01]|[12]\d|0[1-9]|[1-9]| [1-9])",
+    "%m": r"(?P<month>1[0-2]|0[1-9]|[1-9])",
+    "%Y": r"(?P<year>\d\d\d\d)",
+    "%y": r"(?P<short_year>\d\d)",
+}
+
+#: Number of rows parsed by each task when parsing in parallel
+PARSE_CHUNK_SIZE = 500
+
+#: Number of bytes used to detect the encoding & CSV dialect of a file
+SNIFF_SIZE = 64 * 1024
+#: Number of bytes read from a file at a time
+CHUNK_SIZE = 64 * 1024
+#: Delimiters which will be detected when sniffing a CSV dialect
+CSV_DELIMITERS = ",;\t|"
+
+
+@lru_cache(maxsize=None)
+def get_date_parser(date_format: str) -> Callable[[str], date]:
+    """Get a function which parses strings in ``date_format`` into dates
+
+    This is equivalent to ``datetime.strptime(value, date_format).date()``, and accepts
+    the same values (see ``_DATE_DIRECTIVES``), but is several times faster for the formats
+    in ``DATE_FORMATS``. Other formats fall back to using ``strptime()``. Parsers are cached,
+    so this is cheap to call repeatedly.
+
+    A ``ValueError`` is raised if a value cannot be parsed.
+    """
+    parts = [part for part in re.split("(%.)", date_format) if part]
+    if not all(part in _DATE_DIRECTIVES for part in parts if part.startswith("%")):
+        return lambda value: datetime.strptime(value, date_format).date()
+
+    pattern = re.compile(
+        "".join(_DATE_DIRECTIVES.get(part) or re.escape(part) for part in parts)
+    )
+
+    def parse(value: str) -> date:
+        match = pattern.fullmatch(value)
+        if not match:
+            raise ValueError(
+                "{!r} does not match format {!r}".format(value, date_format)
+            )
+        values = match.groupdict()
+        if "year" in values:
+            year = int(values["year"])
+        else:
+            # As per strptime(), 69-99 are 1969-1999 and 0-68 are 2000-2068
+            year = int(values["short_year"])
+            year += 1900 if year >= 69 else 2000
+        return date(year, int(values["month"]), int(values["day"]))
+
+    return parse
+
+
+def detect_date_format(
+    values: Iterable[str], sample_size: int = DATE_SAMPLE_SIZE
+) -> Optional[str]:
+    """Detect which of ``DATE_FORMATS`` is used by ``values``
+
+    Up to ``sample_size`` non-empty values are parsed using each format, and the
+    format which can parse the most values is returned. ``None`` is returned if
+    no format matches, or if the best formats give different dates for the same
+    values (for example, if every value is similar to ``01/02/2000``).
+
+    Examples:
+
+        .. code-block:: python
+
+            >>> detect_date_format(["01/02/2000", "25/02/2000"])
+            '%d/%m/%Y'
+            >>> detect_date_format(["01/02/2000", "03/02/2000"]) is None
+            True
+    """
+    sample = list(islice(filter(None, (v.strip() for v in values)), sample_size))
+
+    best_format, best_dates, best_total = None, None, 0
+    ambiguous = False
+    for date_format, _ in DATE_FORMATS:
+        parse = get_date_parser(date_format)
+        dates = []
+        for value in sample:
+            try:
+                dates.append(parse(value))
+            except ValueError:
+                dates.append(None)
+        total = len(dates) - dates.count(None)
+
+        if total > best_total:
+            best_format, best_dates, best_total = date_format, dates, total
+            ambiguous = False
+        elif total and total == best_total and dates != best_dates:
+            ambiguous = True
+
+    return None if ambiguous else best_format
+
+
+def parse_statement_row(
+    row: Mapping[str, str], date_format: str
+) -> Tuple[date, Decimal, str]:
+    """Parse & validate an imported row, returning ``(date, amount, description)``
+
+    ``row`` is keyed by the names of the fields the columns are mapped to (see
+    ``TransactionCsvImportColumn.to_field``). Amounts may either be in a single
+    ``amount`` column, or split across ``amount_in`` & ``amount_out`` columns.
+
+    Raises a ``ValueError`` (or ``DecimalException``) describing the problem if
+    the row is invalid.
+    """
+    use_dual_amounts = "amount_out" in row and "amount_in" in row
+
+    if "date" not in row:
+        raise ValueError("No date column found")
+
+    try:
+        parsed_date = get_date_parser(date_format)(row["date"])
+    except ValueError:
+        raise ValueError(
+            "Invalid value for date. Expected {}".format(
+                dict(DATE_FORMATS)[date_format]
+            )
+        )
+
+    description = row["description"]
+
+    # Do we have in/out columns, or just one amount column?
+    if use_dual_amounts:
+        amount_out = row["amount_out"]
+        amount_in = row["amount_in"]
+
+        if amount_in and amount_out:
+            raise ValueError("Values found for both Amount In and Amount Out")
+        if not amount_in and not amount_out:
+            raise ValueError("Value required for either Amount In or Amount Out")
+
+        if amount_out:
+            try:
+                amount = abs(Decimal(amount_out)) * -1
+            except DecimalException:
+                raise ValueError("Invalid value found for Amount Out")
+        else:
+            try:
+                amount = abs(Decimal(amount_in))
+            except DecimalException:
+                raise ValueError("Invalid value found for Amount In")
+    else:
+        if "amount" not in row:
+            raise ValueError("No amount column found")
+        if not row["amount"]:
+            raise ValueError("No value found for amount")
+        try:
+            amount = Decimal(row["amount"])
+        except InvalidOperation:
+            raise DecimalException("Invalid value found for Amount")
+
+    if amount == Decimal("0"):
+        raise ValueError("Amount of zero not allowed")
+
+    return parsed_date, amount, description
+
+
+def normalise_description(description: str) -> str:
+    """Normalise a description for comparison, ignoring case & whitespace"""
+    return " ".join(description.split()).casefold()
+
+
+def statement_line_fingerprint(
+    bank_account_id: int,
+    date: date,
+    amount: Union[Decimal, str],
+    description: str,
+    ordinal: int,
+) -> str:
+    """Get the fingerprint of a statement line, as used to detect duplicates
+
+    Args:
+        bank_account_id (int): The ID of the bank account the line belongs to
+        date (date): The date of the line
+        amount (Decimal): The amount of the line. Trailing zeros are ignored.
+        description (str): The description. Case & whitespace are ignored
+            (see :func:`normalise_description`)
+        ordinal (int): The number of preceding lines within the bank account which
+            have the same date, amount and description. This allows genuinely
+            identical lines to be imported.
+
+    Returns:
+        str: A SHA-256 hex digest
+    """
+    value = "\x1f".join(
+        [
+            str(bank_account_id),
+            date.isoformat(),
+            "{:f}".format(Decimal(amount).normalize()),
+            normalise_description(description),
+            str(ordinal),
+        ]
+    )
+    return hashlib.sha256(value.encode("utf8")).hexdigest()
+
+
+def parse_statement_rows(
+    headers: Sequence[str], rows: Iterable[Sequence[str]], date_format: str
+) -> List[Union[Tuple[date, Decimal, str], Exception]]:
+    """Parse rows using :func:`parse_statement_row`, returning the exception for invalid rows
+
+    Values are stripped of whitespace before parsing. This is run by the
+    worker processes of :func:`iter_parsed_datasets`.
+    """
+    parsed = []
+    for values in rows:
+        row = dict(
+            zip(headers, (v.strip() if isinstance(v, str) else v for v in values))
+        )
+        try:
+            parsed.append(parse_statement_row(row, date_format))
+        except Exception as e:
+            parsed.append(e)
+    return parsed
+
+
+def iter_parsed_datasets(
+    datasets: Iterable,
+    date_format: str,
+    processes: int,
+    chunk_size: int = PARSE_CHUNK_SIZE,
+) -> Iterator[tuple]:
+    """Parse the rows of each dataset in a pool of ``processes`` worker processes
+
+    Yields each dataset along with a list containing the result of
+    :func:`parse_statement_rows` for each row, in the same order as the rows
+    of the dataset. Each dataset is split into tasks of ``chunk_size`` rows.
+
+    Datasets are parsed one ahead of the dataset being yielded, so the next dataset
+    can be parsed while the current one is saved.
+    """
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        pending = None
+        for dataset in datasets:
+            futures = []
+            for start in range(0, len(dataset), chunk_size):
+                end = start + chunk_size
+                futures.append(
+                    executor.submit(
+                        parse_statement_rows,
+                        dataset.headers,
+                        dataset[start:end],
+                        date_format,
+                    )
+                )
+            if pending:
+                yield _collect(*pending)
+            pending = dataset, futures
+        if pending:
+            yield _collect(*pending)
+
+
+def _collect(dataset, futures) -> tuple:
+    return dataset, [row for future in futures for row in future.result()]
+
+
+def sniff_encoding(prefix: bytes) -> str:
+    """Guess the text encoding of a file from its first few bytes
+
+    Byte order marks are respected. Otherwise files are assumed to be UTF-8, falling back
+    to Windows-1252 (as produced by many banks) and then Latin-1 if they cannot be decoded.
+    """
+    if prefix.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if prefix.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
+
+    for encoding in ("utf-8", "cp1252"):
+        try:
+            # Not final, as the prefix may end part-way through a character
+            codecs.getincrementaldecoder(encoding)().decode(prefix, final=False)
+        except UnicodeDecodeError:
+            continue
+        return encoding
+    return "latin-1"
+
+
+def sniff_dialect(sample: str) -> Type[csv.Dialect]:
+    """Guess the CSV dialect from a sample of the file's text
+
+    Only complete lines are considered. Falls back to ``csv.excel``
+    (i.e. comma separated) if the dialect cannot be determined.
+    """
+    end = max(sample.rfind("\n"), sample.rfind("\r"))
+    if end > 0:
+        sample = sample[:end]
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=CSV_DELIMITERS)
+    except csv.Error:
+        return csv.excel
+
+
+def iter_lines(
+    file: BinaryIO, encoding: str, chunk_size: int = CHUNK_SIZE
+) -> Iterator[str]:
+    """Decode a binary file into lines, reading ``chunk_size`` bytes at a time
+
+    Line endings are preserved, as required by ``csv.reader()``.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    pending = ""
+    while True:
+        chunk = file.read(chunk_size)
+        pending += decoder.decode(chunk, final=not chunk)
+        if not chunk:
+            break
+        # Split after the last complete line ending. A trailing '\r' may be
+        # followed by '\n' in the next chunk, so is left pending.
+        end = max(pending.rfind("\n"), pending.rfind("\r", 0, len(pending) - 1)) + 1
+        if end:
+            yield from io.StringIO(pending[:end], newline="")
+            pending = pending[end:]
+    if pending:
+        yield from io.StringIO(pending, newline="")
+
+
+def read_csv(
+    file: BinaryIO,
+    encoding: Optional[str] = None,
+    dialect: Optional[Type[csv.Dialect]] = None,
+    chunk_size: int = CHUNK_SIZE,
+    sniff_size: int = SNIFF_SIZE,
+) -> Iterator[List[str]]:
+    """Read rows from a CSV file of any size, using a bounded amount of memory
+
+    The file is decoded incrementally. The encoding & dialect are detected from
+    the first ``sniff_size`` bytes of the file, unless specified.
+
+    Examples:
+
+        .. code-block:: python
+
+            with open("statement.csv", "rb") as f:
+                for row in read_csv(f):
+                    print(row)
+
+    Args:
+        file: A file opened in binary mode, positioned at the start of the data
+        encoding (str): The text encoding. Detected using :func:`sniff_encoding()` if not specified
+        dialect (csv.Dialect): The CSV dialect. Detected using :func:`sniff_dialect()`
+            if not specified
+    """
+    prefix = file.read(sniff_size)
+    if encoding is None:
+        encoding = sniff_encoding(prefix)
+    if dialect is None:
+        sample = codecs.getincrementaldecoder(encoding)(errors="ignore").decode(prefix)
+        dialect = sniff_dialect(sample)
+
+    lines = iter_lines(_Prefixed(prefix, file), encoding, chunk_size)
+    return csv.reader(lines, dialect)
+
+
+def iter_batches(iterable: Iterable, batch_size: int) -> Iterator[list]:
+    """Split ``iterable`` into lists of at most ``batch_size`` items"""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+class _Prefixed(object):
+    """Replay bytes which have already been read from a file"""
+
+    def __init__(self, prefix: bytes, file: BinaryIO):
+        self.prefix = prefix
+        self.file = file
+
+    def read(self, size: int) -> bytes:
+        if self.prefix:
+            data, self.prefix = self.prefix[:size], self.prefix[size:]
+            return data
+        return self.file.read(size)
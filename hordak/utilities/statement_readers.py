@@ -0,0 +1,441 @@
+"""Readers for bank statement files
+
+Each reader parses a file incrementally, so statements of any size can be read
+using a bounded amount of memory. The reader for a file is chosen by
+:func:`get_statement_reader`, which tries each of the readers listed in the
+``HORDAK_STATEMENT_READERS`` setting in turn.
+
+:class:`CsvReader` yields the rows of the file as-is, and the columns are then
+mapped to statement line fields by the user (see ``TransactionCsvImportColumn``).
+Other readers understand the structure of the file, and yield rows of
+``date``, ``amount``, ``description`` and ``source_data``. ``source_data`` is
+a JSON object containing the original fields of the transaction, and is stored
+in ``StatementLine.source_data``.
+
+You can support other formats by subclassing :class:`StatementReader`:
+
+Examples:
+
+    .. code-block:: python
+
+        class MyBankReader(StatementReader):
+
+            @classmethod
+            def can_read(cls, prefix):
+                return prefix.startswith(b"MYBANK")
+
+            def iter_statement_rows(self):
+                for line in ...:
+                    yield StatementRow(date=..., amount=..., description=..., source_data={})
+
+    Then in your ``settings.py``:
+
+    .. code-block:: python
+
+        HORDAK_STATEMENT_READERS = [
+            "myapp.readers.MyBankReader",
+            *hordak.defaults.STATEMENT_READERS,
+        ]
+
+"""
+
+import codecs
+import html
+import json
+import re
+import xml.etree.ElementTree as ET
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from typing import BinaryIO, Iterator, List, NamedTuple, Optional, Tuple
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.module_loading import import_string
+
+from hordak import defaults
+from hordak.utilities.statement_import import (
+    CHUNK_SIZE,
+    DATE_SAMPLE_SIZE,
+    SNIFF_SIZE,
+    detect_date_format,
+    get_date_parser,
+    iter_lines,
+    read_csv,
+    sniff_encoding,
+)
+
+
+class StatementRow(NamedTuple):
+    """A single transaction read from a statement file"""
+
+    date: date
+    amount: Decimal
+    description: str
+    source_data: dict
+
+
+class StatementReader(object):
+    """Base class for statement file readers
+
+    Iterating over a reader yields lists of strings, one per row. These are
+    imported as per the rows of a CSV file, using the column names in ``headers``.
+
+    Args:
+        file: A file opened in binary mode, positioned at the start of the data
+    """
+
+    #: The name of the file format
+    name = None
+    #: The names of the columns yielded. ``None`` if the file contains its own headings.
+    headers = ("date", "amount", "description", "source_data")
+    #: The format of the dates yielded, for use by ``StatementLineResource``
+    date_format = "%Y-%m-%d"
+
+    def __init__(self, file: BinaryIO):
+        self.file = file
+
+    @classmethod
+    def can_read(cls, prefix: bytes) -> bool:
+        """Can this reader read a file which starts with ``prefix``?"""
+        raise NotImplementedError()
+
+    def iter_statement_rows(self) -> Iterator[StatementRow]:
+        """Parse the file, yielding each transaction"""
+        raise NotImplementedError()
+
+    def __iter__(self) -> Iterator[List[str]]:
+        for row in self.iter_statement_rows():
+            yield [
+                row.date.isoformat(),
+                str(row.amount),
+                row.description,
+                json.dumps(row.source_data, cls=DjangoJSONEncoder),
+            ]
+
+
+class CsvReader(StatementReader):
+    """Read CSV files (see :func:`~hordak.utilities.statement_import.read_csv`)
+
+    This reader accepts any file, so should be listed last.
+    """
+
+    name = "CSV"
+    headers = None
+    date_format = None
+
+    @classmethod
+    def can_read(cls, prefix: bytes) -> bool:
+        return True
+
+    def __iter__(self) -> Iterator[List[str]]:
+        return read_csv(self.file)
+
+
+class OfxReader(StatementReader):
+    """Read OFX files, both OFX 1.x (SGML) and OFX 2.x (XML)
+
+    Each ``<STMTTRN>`` element becomes a row. ``source_data`` contains the
+    transaction's fields, using lower case names (``fitid``, ``trntype``, etc).
+    """
+
+    name = "OFX"
+
+    _tag_re = re.compile(r"<(/?)([A-Za-z0-9.]+)[^>]*>([^<]*)")
+    _charsets = {"1252": "cp1252", "ISO-8859-1": "latin-1", "UTF-8": "utf-8"}
+
+    @classmethod
+    def can_read(cls, prefix: bytes) -> bool:
+        start = prefix[:1024].upper()
+        return b"OFXHEADER" in start or b"<OFX>" in start
+
+    def iter_statement_rows(self) -> Iterator[StatementRow]:
+        transaction = None
+        for closing, tag, text in self._iter_tags():
+            tag = tag.upper()
+            if tag == "STMTTRN":
+                if not closing:
+                    transaction = {}
+                elif transaction is not None:
+                    yield self._make_row(transaction)
+                    transaction = None
+            elif transaction is not None and not closing and text.strip():
+                transaction[tag.lower()] = html.unescape(text.strip())
+
+    def _iter_tags(self) -> Iterator[Tuple[str, str, str]]:
+        """Yield each tag in the file as ``(closing, tag, text)``"""
+        prefix = self.file.read(SNIFF_SIZE)
+        match = re.search(rb"CHARSET:\s*([\w-]+)|encoding=\"([\w-]+)\"", prefix)
+        charset = match and (match.group(1) or match.group(2)).decode("ascii")
+        encoding = self._charsets.get((charset or "").upper(), None) or sniff_encoding(
+            prefix
+        )
+
+        decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        pending = decoder.decode(prefix)
+        while True:
+            chunk = self.file.read(CHUNK_SIZE)
+            pending += decoder.decode(chunk, final=not chunk)
+            # Only parse up to the last tag, which may be incomplete
+            end = max(pending.rfind("<"), 0) if chunk else len(pending)
+            for match in self._tag_re.finditer(pending, 0, end):
+                yield match.groups()
+            pending = pending[end:]
+            if not chunk:
+                break
+
+    def _make_row(self, transaction: dict) -> StatementRow:
+        try:
+            amount = Decimal(transaction.get("trnamt", "").replace(",", "."))
+        except InvalidOperation:
+            raise ValueError(
+                "Invalid amount for transaction {}".format(transaction.get("fitid"))
+            )
+        posted = transaction.get("dtposted", "")
+        return StatementRow(
+            date=get_date_parser("%Y%m%d")(posted[:8]),
+            amount=amount,
+            description=transaction.get("name") or transaction.get("memo", ""),
+            source_data=transaction,
+        )
+
+
+class QifReader(StatementReader):
+    """Read QIF (Quicken Interchange Format) files
+
+    Transactions within ``!Type:Bank``, ``!Type:Cash``, ``!Type:CCard``,
+    ``!Type:Oth A`` and ``!Type:Oth L`` sections are read. QIF files do not specify
+    their date format, so this is detected from the first transactions in the file
+    (see :func:`~hordak.utilities.statement_import.detect_date_format`), assuming
+    US ordering (``mm/dd``) if it is ambiguous.
+    """
+
+    name = "QIF"
+
+    _sections = (
+        "!type:bank",
+        "!type:cash",
+        "!type:ccard",
+        "!type:oth a",
+        "!type:oth l",
+    )
+    _fields = {
+        "D": "date",
+        "T": "amount",
+        "U": "amount_u",
+        "P": "payee",
+        "M": "memo",
+        "N": "number",
+        "L": "category",
+        "C": "cleared",
+        "A": "address",
+    }
+
+    @classmethod
+    def can_read(cls, prefix: bytes) -> bool:
+        return prefix.lstrip(codecs.BOM_UTF8 + b" \r\n\t").startswith(
+            (b"!Type:", b"!Account", b"!Option")
+        )
+
+    def iter_statement_rows(self) -> Iterator[StatementRow]:
+        start = self.file.tell()
+        sample = []
+        for record in self._iter_records():
+            sample.append(record["date"])
+            if len(sample) >= DATE_SAMPLE_SIZE:
+                break
+        self.file.seek(start)
+
+        parse_date = get_date_parser(self._get_date_format(sample))
+        for record in self._iter_records():
+            amount = record.get("amount") or record.get("amount_u", "")
+            try:
+                amount = Decimal(amount.replace(",", ""))
+            except InvalidOperation:
+                raise ValueError("Invalid amount for QIF record: {}".format(record))
+            yield StatementRow(
+                date=parse_date(record["date"]),
+                amount=amount,
+                description=record.get("payee") or record.get("memo", ""),
+                source_data=record,
+            )
+
+    def _get_date_format(self, sample: List[str]) -> str:
+        date_format = detect_date_format(sample)
+        if date_format:
+            return date_format
+        four_digit_years = all(len(value.rsplit("/", 1)[-1]) == 4 for value in sample)
+        return "%m/%d/%Y" if four_digit_years else "%m/%d/%y"
+
+    def _iter_records(self) -> Iterator[dict]:
+        """Yield each transaction record, with normalised dates"""
+        prefix = self.file.read(SNIFF_SIZE)
+        encoding = sniff_encoding(prefix)
+        self.file.seek(self.file.tell() - len(prefix))
+
+        in_section = False
+        record = {}
+        for line in iter_lines(self.file, encoding):
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("!"):
+                in_section = line.lower() in self._sections
+            elif not in_section:
+                continue
+            elif line == "^":
+                if "date" in record:
+                    yield record
+                record = {}
+            else:
+                code, value = line[0], line[1:].strip()
+                name = self._fields.get(code, code)
+                if name == "date":
+                    # Quicken writes dates such as 1/ 2'01
+                    value = value.replace(" ", "").replace("'", "/").replace("-", "/")
+                if name in record:
+                    # Multi-line fields, such as addresses
+                    value = "{}\n{}".format(record[name], value)
+                record[name] = value
+
+
+class Camt053Reader(StatementReader):
+    """Read ISO 20022 CAMT.053 (bank to customer statement) XML files
+
+    The file is parsed incrementally, and each ``<Ntry>`` element is discarded
+    once read, so the document is never held in memory. Files containing a DOCTYPE
+    are rejected, to prevent entity expansion attacks. Only booked entries are read.
+    The description is taken from ``<AddtlNtryInf>``, falling back to the remittance
+    information and then the name of the counterparty.
+    """
+
+    name = "CAMT.053"
+
+    @classmethod
+    def can_read(cls, prefix: bytes) -> bool:
+        return b"camt.053" in prefix or b"BkToCstmrStmt" in prefix
+
+    def iter_statement_rows(self) -> Iterator[StatementRow]:
+        parents = []
+        for event, element in _iterparse(self.file):
+            if event == "start":
+                parents.append(element)
+                continue
+
+            parents.pop()
+            if _local_name(element.tag) != "Ntry":
+                continue
+
+            entry = self._parse_entry(element)
+            # Discard the entry, so memory use does not grow with the file
+            if parents:
+                parents[-1].remove(element)
+            if entry.source_data["status"] in ("", "BOOK"):
+                yield entry
+
+    def _parse_entry(self, entry: ET.Element) -> StatementRow:
+        def text(path: str) -> str:
+            value = entry.findtext("{*}" + path.replace("/", "/{*}"))
+            return value.strip() if value else ""
+
+        amount_element = entry.find("{*}Amt")
+        amount = Decimal(amount_element.text.strip())
+        if text("CdtDbtInd") == "DBIT":
+            amount = -amount
+
+        booking_date = (text("BookgDt/Dt") or text("BookgDt/DtTm"))[:10]
+        value_date = (text("ValDt/Dt") or text("ValDt/DtTm"))[:10]
+        remittance_info = [
+            element.text.strip()
+            for element in entry.iterfind(".//{*}RmtInf/{*}Ustrd")
+            if element.text
+        ]
+        # The other party is the creditor of payments, and the debtor of receipts
+        party = "NtryDtls/TxDtls/RltdPties/{}".format("Cdtr" if amount < 0 else "Dbtr")
+        counterparty = text(party + "/Nm") or text(party + "/Pty/Nm")
+        source_data = {
+            "entry_reference": text("NtryRef"),
+            "amount": str(amount),
+            "currency": amount_element.get("Ccy", ""),
+            "credit_debit": text("CdtDbtInd"),
+            "status": text("Sts") or text("Sts/Cd"),
+            "booking_date": booking_date,
+            "value_date": value_date,
+            "account_servicer_reference": text("AcctSvcrRef"),
+            "bank_transaction_code": text("BkTxCd/Prtry/Cd"),
+            "additional_info": text("AddtlNtryInf"),
+            "remittance_info": remittance_info,
+            "counterparty": counterparty,
+            "end_to_end_id": text("NtryDtls/TxDtls/Refs/EndToEndId"),
+        }
+        return StatementRow(
+            date=date.fromisoformat(booking_date or value_date),
+            amount=amount,
+            description=(
+                source_data["additional_info"]
+                or " ".join(remittance_info)
+                or counterparty
+            ),
+            source_data=source_data,
+        )
+
+
+class _EventTreeBuilder(ET.TreeBuilder):
+    """A ``TreeBuilder`` which records start & end events, and rejects DOCTYPEs
+
+    Entities can only be declared within a DOCTYPE, so rejecting them prevents
+    entity expansion attacks (such as "billion laughs").
+    """
+
+    def __init__(self):
+        super(_EventTreeBuilder, self).__init__()
+        self.events = []
+
+    def start(self, tag, attrs):
+        element = super(_EventTreeBuilder, self).start(tag, attrs)
+        self.events.append(("start", element))
+        return element
+
+    def end(self, tag):
+        element = super(_EventTreeBuilder, self).end(tag)
+        self.events.append(("end", element))
+        return element
+
+    def doctype(self, name, pubid, system):
+        raise ValueError("XML files containing a DOCTYPE are not supported")
+
+
+def _iterparse(file: BinaryIO) -> Iterator[Tuple[str, ET.Element]]:
+    """Yield ``(event, element)`` for the start & end of each element, as per ``iterparse()``"""
+    builder = _EventTreeBuilder()
+    parser = ET.XMLParser(target=builder)
+    while True:
+        chunk = file.read(CHUNK_SIZE)
+        if chunk:
+            parser.feed(chunk)
+        else:
+            parser.close()
+        yield from builder.events
+        builder.events.clear()
+        if not chunk:
+            break
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def get_statement_reader(file: BinaryIO, readers: Optional[List[str]] = None):
+    """Get a reader for ``file``, based upon its first few bytes
+
+    Args:
+        file: A file opened in binary mode, positioned at the start of the data
+        readers (list): Import paths of the reader classes to try, in order.
+            Defaults to the ``HORDAK_STATEMENT_READERS`` setting.
+    """
+    start = file.tell()
+    prefix = file.read(SNIFF_SIZE)
+    file.seek(start)
+    for path in readers or defaults.STATEMENT_READERS:
+        reader_class = import_string(path)
+        if reader_class.can_read(prefix):
+            return reader_class(file)
+    raise ValueError("Unsupported statement file format")
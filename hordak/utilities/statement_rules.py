@@ -0,0 +1,285 @@
+"""Automatic categorisation of statement lines using rules
+
+Each :class:`~hordak.models.StatementRule` has a description pattern, an optional
+amount range and a target account. Rather than testing every rule against every
+line, the rules are compiled into a single matcher (see :class:`CompiledRules`),
+which finds the first rule matching a line's description & amount.
+
+Transactions are then created for all matching lines at once using
+:func:`hordak.utilities.reconciliation.create_transactions`.
+
+Examples:
+
+    .. code-block:: python
+
+        from hordak.models import StatementRule
+        from hordak.utilities.statement_rules import apply_statement_rules
+
+        StatementRule.objects.create(
+            description_pattern=r"\\bacme\\b", max_amount=0, to_account=expenses
+        )
+        transactions = apply_statement_rules(
+            StatementLine.objects.filter(statement_import=statement_import)
+        )
+
+"""
+
+import re
+from collections import deque
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Set
+
+from django.db import transaction as db_transaction
+from django.db.models import QuerySet
+
+from hordak.models import StatementLine, StatementRule
+from hordak.utilities.reconciliation import create_transactions, get_bank_account_id
+from hordak.utilities.statement_import import iter_batches
+
+#: The number of lines to create transactions for at a time
+APPLY_BATCH_SIZE = 2000
+
+_QUANTIFIER = re.compile(r"\{\d*(,\d*)?\}")
+_ESCAPE = re.compile(
+    r"x[0-9a-fA-F]{0,2}|u[0-9a-fA-F]{0,4}|U[0-9a-fA-F]{0,8}|N\{[^}]*\}|\d{1,3}|."
+)
+# Characters which IGNORECASE matches to ASCII letters, but which lower() does not convert
+_CASE_FOLD = str.maketrans({"\u0130": "i", "\u0131": "i", "\u017f": "s"})
+
+
+class CompiledRules(object):
+    """A set of rules compiled into a single matcher
+
+    Most patterns contain some literal text which must appear in any matching
+    description, such as ``acme`` in ``\\bacme\\b``. The longest such text is
+    extracted from each pattern (see :func:`required_literal()`), and all of them
+    are compiled into a single Aho-Corasick automaton. Each description is scanned
+    once by the automaton to find which literals it contains, and only the rules
+    containing those literals (plus any rules without a literal) are then checked.
+    Matching therefore costs roughly the length of the description, rather than
+    the number of rules.
+
+    Rules are checked in order of priority, and the first rule whose pattern
+    and amount range match is used.
+
+    Args:
+        rules ([StatementRule]): The rules, in order of priority
+    """
+
+    def __init__(self, rules: Iterable[StatementRule]):
+        self.rules = list(rules)
+        self.patterns = [
+            re.compile(rule.description_pattern, re.IGNORECASE) for rule in self.rules
+        ]
+        # Rules which must always be checked, as they have no required literal
+        self.unfiltered = []
+        literals = {}
+        for index, rule in enumerate(self.rules):
+            literal = required_literal(rule.description_pattern)
+            if literal:
+                literals.setdefault(literal.lower(), []).append(index)
+            else:
+                self.unfiltered.append(index)
+        self.automaton = _Automaton(literals)
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    def match(self, description: str, amount: Decimal) -> Optional[StatementRule]:
+        """Get the first rule matching the given description & amount, or ``None``"""
+        candidates = self.automaton.search(description.translate(_CASE_FOLD).lower())
+        candidates.update(self.unfiltered)
+        for index in sorted(candidates):
+            rule = self.rules[index]
+            if rule.min_amount is not None and amount < rule.min_amount:
+                continue
+            if rule.max_amount is not None and amount > rule.max_amount:
+                continue
+            if self.patterns[index].search(description):
+                return rule
+        return None
+
+
+class _Automaton(object):
+    """An Aho-Corasick automaton, for finding many strings within a text at once
+
+    Args:
+        keywords (dict): Keyword → list of values to return when it is found
+    """
+
+    def __init__(self, keywords: Dict[str, List[int]]):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for keyword, values in keywords.items():
+            state = 0
+            for char in keyword:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.output[state].extend(values)
+
+        # Breadth first, so the failure state of each state's parent is already known
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fail = self.fail[state]
+                while fail and char not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[next_state] = self.goto[fail].get(char, 0)
+                self.output[next_state] = (
+                    self.output[next_state] + self.output[self.fail[next_state]]
+                )
+
+    def search(self, text: str) -> Set[int]:
+        """Get the values of all keywords found within ``text``"""
+        goto, fail, output = self.goto, self.fail, self.output
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
+
+
+def required_literal(pattern: str) -> str:
+    """Get the longest literal text which any match of ``pattern`` must contain
+
+    Only plain ASCII text outside of groups, character classes & optional
+    characters is considered. An empty string is returned if there is none,
+    or if the pattern contains alternatives (``|``).
+
+    For example, ``required_literal(r"^card payment to \\w+ ltd")`` is ``"card payment to "``.
+    """
+    if "|" in pattern or re.compile(pattern).flags & re.VERBOSE:
+        return ""
+
+    longest = ""
+    literal = ""
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        quantifier = _QUANTIFIER.match(pattern, i)
+        if char in "?*" or quantifier:
+            # The previous character is optional
+            literal = literal[:-1]
+            i = quantifier.end() - 1 if quantifier else i
+            char = None
+        elif char == "\\" and i + 1 < len(pattern):
+            i += 1
+            char = pattern[i]
+            if char.isalnum():
+                # A special sequence (such as \\b or \\d), escape or backreference
+                i = _ESCAPE.match(pattern, i).end() - 1
+                char = None
+        elif char == "[":
+            i = _skip_class(pattern, i)
+            char = None
+        elif char == "(":
+            i = _skip_group(pattern, i)
+            char = None
+        elif char in ".^$+)":
+            char = None
+
+        longest = max(longest, literal, key=len)
+        if char is None or not char.isascii() or not char.isprintable():
+            literal = ""
+        else:
+            literal += char
+        i += 1
+    return max(longest, literal, key=len)
+
+
+def _skip_class(pattern: str, i: int) -> int:
+    """Get the index of the ``]`` closing the character class starting at ``i``"""
+    i += 1
+    if i < len(pattern) and pattern[i] == "^":
+        i += 1
+    if i < len(pattern) and pattern[i] == "]":
+        i += 1
+    while i < len(pattern) and pattern[i] != "]":
+        i += 2 if pattern[i] == "\\" else 1
+    return i
+
+
+def _skip_group(pattern: str, i: int) -> int:
+    """Get the index of the end of the group starting at ``i``, including any quantifier"""
+    depth = 0
+    while i < len(pattern):
+        if pattern[i] == "\\":
+            i += 1
+        elif pattern[i] == "[":
+            i = _skip_class(pattern, i)
+        elif pattern[i] == "(":
+            depth += 1
+        elif pattern[i] == ")":
+            depth -= 1
+            if depth == 0:
+                break
+        i += 1
+    return i
+
+
+def compile_rules(rules: Optional[Iterable[StatementRule]] = None) -> CompiledRules:
+    """Compile the given rules (or all rules) into a :class:`CompiledRules`"""
+    if rules is None:
+        rules = StatementRule.objects.all()
+    return CompiledRules(rules)
+
+
+def match_statement_rules(
+    lines: Iterable[StatementLine], rules: CompiledRules
+) -> Dict[int, int]:
+    """Get the account for each line matching a rule
+
+    Returns:
+        dict: Statement line ID → ID of the rule's ``to_account``.
+        Lines which match no rule are omitted, as are rules targeting the line's own bank account.
+    """
+    to_accounts = {}
+    for line in lines:
+        rule = rules.match(line.description, line.amount)
+        if rule and rule.to_account_id != get_bank_account_id(line):
+            to_accounts[line.pk] = rule.to_account_id
+    return to_accounts
+
+
+@db_transaction.atomic()
+def apply_statement_rules(
+    lines: Optional[QuerySet] = None,
+    rules: Optional[CompiledRules] = None,
+    batch_size: int = APPLY_BATCH_SIZE,
+) -> List:
+    """Create transactions for the unreconciled lines which match a rule
+
+    Args:
+        lines (QuerySet): The ``StatementLine`` objects to categorise. Defaults to all lines.
+            Lines which are already reconciled are ignored.
+        rules (CompiledRules): The rules to apply. Defaults to all rules (see :func:`compile_rules()`)
+        batch_size (int): The number of lines to create transactions for at a time
+
+    Returns:
+        [Transaction]: The created transactions
+    """
+    if rules is None:
+        rules = compile_rules()
+    if not rules:
+        return []
+    if lines is None:
+        lines = StatementLine.objects.all()
+    lines = lines.filter(transaction=None).with_bank_account_id().order_by("pk")
+
+    transactions = []
+    for batch in iter_batches(lines.iterator(chunk_size=batch_size), batch_size):
+        transactions.extend(
+            create_transactions(batch, match_statement_rules(batch, rules))
+        )
+    return transactions
@@ -0,0 +1,113 @@
+"""Run long-running work (such as statement imports) outside of the request
+
+Hordak submits tasks to the task runner configured by the
+:ref:`HORDAK_TASK_RUNNER <settings>` setting. Two runners are provided:
+
+* :class:`SynchronousTaskRunner` (the default) runs each task immediately,
+  within the current request.
+* :class:`ThreadPoolTaskRunner` runs tasks in a pool of threads owned by Hordak,
+  once the current database transaction has committed.
+
+You can integrate with a task queue (Celery, Django-Q, RQ, etc) by implementing
+your own runner. Tasks are always module-level functions, and their arguments are
+always JSON serialisable, so a runner can pass them to a worker by name:
+
+Examples:
+
+    .. code-block:: python
+
+        from django.db import transaction
+        from django.utils.module_loading import import_string
+
+        from hordak.utilities.tasks import TaskRunner
+
+        @app.task
+        def run_hordak_task(func_path, args):
+            import_string(func_path)(*args)
+
+        class CeleryTaskRunner(TaskRunner):
+            def submit(self, func, *args):
+                path = "{}.{}".format(func.__module__, func.__qualname__)
+                transaction.on_commit(lambda: run_hordak_task.delay(path, args))
+
+    Then in your ``settings.py``:
+
+    .. code-block:: python
+
+        HORDAK_TASK_RUNNER = "myapp.tasks.CeleryTaskRunner"
+
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from django.db import close_old_connections, transaction
+from django.utils.module_loading import import_string
+
+from hordak import defaults
+
+logger = logging.getLogger(__name__)
+
+
+class TaskRunner(object):
+    """Base class for task runners"""
+
+    def submit(self, func: Callable, *args):
+        """Run ``func(*args)``, now or at some point in the future
+
+        Runners should not start the task until the current database
+        transaction has committed (see ``transaction.on_commit()``).
+        """
+        raise NotImplementedError()
+
+
+class SynchronousTaskRunner(TaskRunner):
+    """Run tasks immediately, in the current thread"""
+
+    def submit(self, func: Callable, *args):
+        func(*args)
+
+
+class ThreadPoolTaskRunner(TaskRunner):
+    """Run tasks in a pool of background threads
+
+    Tasks are started once the current database transaction commits. Each
+    thread uses its own database connection.
+
+    Note that tasks will be lost if the process exits before they complete.
+    """
+
+    #: The maximum number of tasks to run at once (per process)
+    max_workers = 2
+
+    _executor = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_executor(cls) -> ThreadPoolExecutor:
+        with cls._lock:
+            if cls._executor is None:
+                cls._executor = ThreadPoolExecutor(
+                    max_workers=cls.max_workers, thread_name_prefix="hordak"
+                )
+        return cls._executor
+
+    def submit(self, func: Callable, *args):
+        transaction.on_commit(lambda: self.get_executor().submit(_run, func, args))
+
+
+def _run(func: Callable, args: tuple):
+    close_old_connections()
+    try:
+        func(*args)
+    except Exception:
+        logger.exception("Task %s failed", func.__qualname__)
+    finally:
+        close_old_connections()
+
+
+def get_task_runner() -> TaskRunner:
+    """Get the task runner specified by the ``HORDAK_TASK_RUNNER`` setting"""
+    return import_string(defaults.TASK_RUNNER)()
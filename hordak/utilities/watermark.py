@@ -0,0 +1,158 @@
+"""Ledger watermarks, for caching content which depends upon the ledger
+
+A watermark is a short string which changes whenever the ledger changes.
+Watermarks are available for the entire ledger, or for a single account tree
+(i.e. an account and all accounts which share its root account).
+Fetching a watermark is a single query against a very small table, and does not
+touch the legs table.
+
+Watermarks can be used as (part of) a cache key, or as an HTTP ``ETag``. Many of
+Hordak's views use :class:`hordak.views.mixins.LedgerETagMixin` to respond with
+``304 Not Modified`` when the ledger has not changed.
+
+Watermarks are updated when each database transaction commits. Saving or deleting
+a ``Leg``, ``Transaction`` or ``Account`` is tracked automatically. If you change legs using
+``QuerySet.update()``, ``bulk_create()`` or raw SQL, call :func:`ledger_changed()`.
+
+Examples:
+
+    .. code-block:: python
+
+        from django.core.cache import cache
+        from hordak.utilities.watermark import watermark_cache_key
+
+        key = watermark_cache_key("balance-report", account=account)
+        report = cache.get_or_set(key, lambda: build_report(account))
+
+    Or in templates:
+
+    .. code-block:: html+django
+
+        {% load cache hordak %}
+        {% ledger_watermark as watermark %}
+        {% cache 3600 account_summary watermark %}
+            ...
+        {% endcache %}
+
+"""
+
+import functools
+import threading
+from typing import Iterable, Optional
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F, Max, Sum, Value
+from django.db.models.functions import Greatest
+
+from hordak.models import Account, LedgerWatermark
+
+_pending = threading.local()
+
+
+def get_watermark(account: Optional[Account] = None) -> str:
+    """Get the current watermark
+
+    Args:
+        account (Account): Get the watermark for the tree containing this account.
+            If not specified, get the watermark for the entire ledger.
+    """
+    if account is None:
+        result = LedgerWatermark.objects.aggregate(
+            max_leg_id=Max("max_leg_id"), version=Sum("version")
+        )
+        return "{}-{}".format(result["max_leg_id"] or 0, result["version"] or 0)
+
+    watermark = LedgerWatermark.objects.filter(tree_id=account.tree_id).first()
+    return "{}.{}".format(account.tree_id, watermark or "0-0")
+
+
+def watermark_cache_key(key: str, account: Optional[Account] = None) -> str:
+    """Get a cache key which will change whenever the ledger changes
+
+    Args:
+        key (str): The cache key to add the watermark to
+        account (Account): Only change the key when the tree containing this account changes
+    """
+    return "hordak:{}:{}".format(key, get_watermark(account))
+
+
+def ledger_changed(
+    account_ids: Iterable[int] = (),
+    tree_ids: Iterable[int] = (),
+    max_leg_id: int = 0,
+    all_trees: bool = False,
+    using: str = DEFAULT_DB_ALIAS,
+):
+    """Update the watermarks once the current database transaction commits
+
+    Changes are accumulated until the transaction commits, at which point
+    each affected watermark is updated once. Changes are applied immediately
+    if there is no transaction in progress. Changes made within a transaction
+    which is rolled back are applied along with the next commit, which only
+    causes the affected watermarks to change unnecessarily.
+
+    Args:
+        account_ids ([int]): IDs of accounts with changed legs
+        tree_ids ([int]): Tree IDs of changed account trees
+        max_leg_id (int): The highest ID of any created leg
+        all_trees (bool): Update the watermarks of all trees
+    """
+    pending = getattr(_pending, using, None)
+    if pending is None:
+        pending = {"account_ids": set(), "tree_ids": set(), "max_leg_id": 0}
+        pending["all_trees"] = False
+        setattr(_pending, using, pending)
+
+    pending["account_ids"].update(account_ids)
+    pending["tree_ids"].update(tree_ids)
+    pending["max_leg_id"] = max(pending["max_leg_id"], max_leg_id)
+    pending["all_trees"] = pending["all_trees"] or all_trees
+
+    # A callback is registered for every change, so that changes are still
+    # applied if an earlier savepoint (and its callback) is rolled back. Runs
+    # immediately if there is no transaction in progress. Only the first callback
+    # to run does any work.
+    transaction.on_commit(functools.partial(_apply_pending, using), using=using)
+
+
+def _apply_pending(using: str):
+    pending = getattr(_pending, using, None)
+    if not pending:
+        return
+    setattr(_pending, using, None)
+
+    tree_ids = set(pending["tree_ids"])
+    accounts = Account.objects.using(using)
+    if pending["all_trees"]:
+        tree_ids.update(accounts.filter(level=0).values_list("tree_id", flat=True))
+    elif pending["account_ids"]:
+        tree_ids.update(
+            accounts.filter(pk__in=pending["account_ids"]).values_list(
+                "tree_id", flat=True
+            )
+        )
+    bump_watermarks(tree_ids, pending["max_leg_id"], using=using)
+
+
+def bump_watermarks(
+    tree_ids: Iterable[int], max_leg_id: int = 0, using: str = DEFAULT_DB_ALIAS
+):
+    """Immediately update the watermarks for the given account trees
+
+    You will normally want to use :func:`ledger_changed()` instead.
+    """
+    tree_ids = sorted(set(tree_ids))
+    if not tree_ids:
+        return
+
+    watermarks = LedgerWatermark.objects.using(using)
+    watermarks.bulk_create(
+        [LedgerWatermark(tree_id=tree_id) for tree_id in tree_ids],
+        ignore_conflicts=True,
+    )
+    # Update one at a time, in a consistent order, to avoid deadlocks
+    for tree_id in tree_ids:
+        watermarks.filter(tree_id=tree_id).update(
+            version=F("version") + 1,
+            max_leg_id=Greatest(F("max_leg_id"), Value(max_leg_id)),
+        )
@@ -4,11 +4,14 @@ from .accounts import (  # noqa
     AccountTransactionsView,
     AccountUpdateView,
 )
+from .api import AccountBalancesApiView, LegsApiView, TransactionApiView  # noqa
+from .export import AccountStatementExportView, GeneralLedgerExportView  # noqa
 from .statement_csv_import import (  # noqa
     AbstractImportView,
     CreateImportView,
     DryRunImportView,
     ExecuteImportView,
+    ImportStatusView,
     SetupImportView,
 )
 from .transactions import (  # noqa
@@ -1,16 +1,32 @@
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.db.models import Prefetch, Q
+from django.shortcuts import get_object_or_404
 from django.urls.base import reverse_lazy
+from django.utils.functional import cached_property
 from django.views.generic.detail import SingleObjectMixin
 from django.views.generic.edit import CreateView, UpdateView
 from django.views.generic.list import ListView
+from mptt.utils import get_cached_trees
 
 from hordak.forms import accounts as account_forms
-from hordak.models import Account, Leg
+from hordak.models import Account, AccountType, Leg
+from hordak.utilities.currency import Balance
+from hordak.views.mixins import KeysetPaginationMixin, LedgerETagMixin
 
 
-class AccountListView(LoginRequiredMixin, ListView):
+class AccountListView(LoginRequiredMixin, LedgerETagMixin, ListView):
     """View for listing accounts
 
+    Accounts and their balances are fetched in a single query, and the account
+    tree is then built in memory. Rendering the list therefore does not
+    require any further queries, regardless of the number of accounts.
+
+    Large charts of accounts can be collapsed by specifying ``max_level``
+    (either as a class attribute or in the query string). Collapsed
+    subtrees can then be loaded on demand by requesting the view with
+    ``?parent=<account uuid>``. This will render ``partial_template_name``
+    for AJAX requests, or the full page otherwise.
+
     Examples:
 
         .. code-block:: python
@@ -24,7 +40,69 @@ class AccountListView(LoginRequiredMixin, ListView):
 
     model = Account
     template_name = "hordak/accounts/account_list.html"
+    partial_template_name = "hordak/accounts/_account_list_rows.html"
     context_object_name = "accounts"
+    #: Only show accounts at or above this level (0 = root accounts only).
+    #: ``None`` shows all accounts.
+    max_level = None
+    #: How many levels of descendants to show when expanding a parent account
+    expand_depth = 1
+
+    def get_watermark_account(self):
+        return self.parent
+
+    @cached_property
+    def parent(self):
+        return self.get_parent()
+
+    def get_parent(self):
+        uuid = self.request.GET.get("parent")
+        if not uuid:
+            return None
+        return get_object_or_404(Account, uuid=uuid)
+
+    def get_max_level(self):
+        max_level = self.request.GET.get("max_level", self.max_level)
+        if max_level in (None, ""):
+            return None
+        try:
+            return int(max_level)
+        except ValueError:
+            return self.max_level
+
+    def get_queryset(self):
+        queryset = Account.objects.with_balances().order_by("tree_id", "lft")
+        if self.parent:
+            queryset = queryset.filter(
+                tree_id=self.parent.tree_id,
+                lft__gt=self.parent.lft,
+                rght__lt=self.parent.rght,
+                level__lte=self.parent.level + self.expand_depth,
+            )
+        else:
+            max_level = self.get_max_level()
+            if max_level is not None:
+                queryset = queryset.filter(level__lte=max_level)
+        return queryset
+
+    def get_context_data(self, **kwargs):
+        context = super(AccountListView, self).get_context_data(**kwargs)
+        # Populate the parent/child caches so tree traversal needs no queries
+        context["account_tree"] = get_cached_trees(context["object_list"])
+        for account in context["object_list"]:
+            # Parent accounts whose children were not loaded can be expanded
+            account.is_collapsed = (
+                not account.is_leaf_node() and not account._cached_children
+            )
+        context["parent"] = self.parent
+        return context
+
+    def get_template_names(self):
+        if self.parent and self.request.headers.get("x-requested-with") == (
+            "XMLHttpRequest"
+        ):
+            return [self.partial_template_name]
+        return super(AccountListView, self).get_template_names()
 
 
 class AccountCreateView(LoginRequiredMixin, CreateView):
@@ -78,11 +156,33 @@ class AccountUpdateView(LoginRequiredMixin, UpdateView):
 
 
 # TODO: remove ignore comment once https://github.com/typeddjango/django-stubs/issues/873 is fixed
-class AccountTransactionsView(LoginRequiredMixin, SingleObjectMixin, ListView):  # type: ignore
+class AccountTransactionsView(  # type: ignore
+    LoginRequiredMixin,
+    LedgerETagMixin,
+    KeysetPaginationMixin,
+    SingleObjectMixin,
+    ListView,
+):
+    """View for listing the transaction legs of an account, with a running balance
+
+    Legs are paginated using keyset pagination (see
+    :class:`hordak.views.mixins.KeysetPaginationMixin`). The legs
+    of each transaction are prefetched for the page, and the running balance is
+    calculated from a single balance query for the first leg on the page.
+
+    Each leg in the ``legs`` context variable is given the following attributes:
+
+        * ``account_balance_after`` - The account balance after this leg
+        * ``account_balance_before`` - The account balance before this leg
+        * ``counterpart_names`` - Names of the accounts on the other side of the transaction
+    """
+
     template_name = "hordak/accounts/account_transactions.html"
     model = Leg
     slug_field = "uuid"
     slug_url_kwarg = "uuid"
+    paginate_by = 50
+    keyset_ordering = ("-transaction__date", "-pk")
 
     def get(self, request, *args, **kwargs):
         self.object = self.get_object()
@@ -90,17 +190,60 @@ class AccountTransactionsView(LoginRequiredMixin, SingleObjectMixin, ListView):
 
     def get_object(self, queryset=None):
         if queryset is None:
-            queryset = Account.objects.all()
+            queryset = Account.objects.with_balances()
         return super(AccountTransactionsView, self).get_object(queryset)
 
+    def get_watermark_account(self):
+        return self.get_object(Account.objects.all())
+
     def get_context_object_name(self, obj):
         return "legs" if hasattr(obj, "__iter__") else "account"
 
     def get_queryset(self):
-        queryset = super(AccountTransactionsView, self).get_queryset()
-        queryset = (
+        return (
             Leg.objects.filter(account=self.object)
-            .order_by("-transaction__date", "-pk")
             .select_related("transaction")
+            .prefetch_related(
+                Prefetch(
+                    "transaction__legs",
+                    queryset=Leg.objects.select_related("account"),
+                )
+            )
         )
-        return queryset
+
+    def get_context_data(self, **kwargs):
+        context = super(AccountTransactionsView, self).get_context_data(**kwargs)
+        legs = context["legs"]
+        self.set_running_balances(legs)
+        for leg in legs:
+            leg.counterpart_names = [
+                other.account.name
+                for other in leg.transaction.legs.all()
+                if other.type != leg.type
+            ]
+        return context
+
+    def get_boundary_balance(self, leg):
+        """Get the account balance immediately after ``leg``"""
+        date = leg.transaction.date
+        legs = Leg.objects.filter(account=self.object).filter(
+            Q(transaction__date__lt=date) | Q(transaction__date=date, pk__lte=leg.pk)
+        )
+        return (
+            legs.sum_to_balance(account_type=self.object.type)
+            + self.object._zero_balance()
+        )
+
+    def set_running_balances(self, legs):
+        if not legs:
+            return
+
+        balance = self.get_boundary_balance(legs[0])
+        debits_increase = self.object.type in (AccountType.asset, AccountType.expense)
+        for leg in legs:
+            leg.account_balance_after = balance
+            change = Balance([leg.amount])
+            if leg.is_debit() != debits_increase:
+                change = -change
+            balance = balance - change
+            leg.account_balance_before = balance
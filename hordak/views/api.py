@@ -0,0 +1,292 @@
+"""A lightweight, read-only JSON API
+
+All endpoints support:
+
+* Field selection via ``?fields=name,balance``. Expensive fields (such as balances)
+  are only calculated when requested.
+* Conditional GET. Responses include an ``ETag`` based upon the ledger watermark
+  (see :mod:`hordak.utilities.watermark`). Requests with a matching ``If-None-Match``
+  header will receive a ``304 Not Modified`` without any legs being queried.
+
+List endpoints are paginated using keyset pagination
+(see :mod:`hordak.utilities.pagination`). Each response contains ``next`` and
+``previous`` cursors, which should be passed back in the ``cursor`` parameter.
+
+Rows are read using ``QuerySet.values()`` and balances are decoded with
+``raw=True``, so no ``Money`` or ``Balance`` objects are created.
+"""
+
+import json
+from decimal import Decimal
+from functools import cached_property
+from typing import Dict, List, Optional
+
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.core.exceptions import BadRequest, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.http import Http404, HttpResponse
+from django.shortcuts import get_object_or_404
+from django.views.generic import View
+
+from hordak import defaults
+from hordak.models import Account, Leg, Transaction
+from hordak.utilities.db_functions import GetBalance
+from hordak.utilities.pagination import InvalidCursor, KeysetPaginator
+from hordak.views.mixins import LedgerETagMixin
+
+_QUANTUM = Decimal(10) ** -defaults.DECIMAL_PLACES
+
+
+def _balance_to_json(raw_balance) -> List[dict]:
+    # Amounts are quantized so they are output with the same
+    # number of decimal places as leg amounts
+    return [
+        {"amount": amount.quantize(_QUANTUM), "currency": currency}
+        for amount, currency in raw_balance
+    ]
+
+
+class JsonApiMixin(LoginRequiredMixin, LedgerETagMixin):
+    """Base class for the JSON API views
+
+    Subclasses define the fields they provide using:
+
+    * ``fields`` - A dictionary of output field name to ``values()`` lookup
+    * ``computed_fields`` - A dictionary of output field name to the name of a
+      method which annotates the field onto a queryset, called as
+      ``method(queryset, annotation_name)``. Computed fields are only
+      annotated when requested.
+    * ``default_fields`` - The fields to return if none are requested.
+      Defaults to all ``fields``.
+    """
+
+    raise_exception = True
+    fields: Dict[str, str] = {}
+    computed_fields: Dict[str, str] = {}
+    default_fields: Optional[List[str]] = None
+    fields_kwarg = "fields"
+
+    def get(self, request, *args, **kwargs):
+        try:
+            data = self.get_data()
+        except BadRequest as e:
+            return self.render_json({"error": str(e)}, status=400)
+        return self.render_json(data)
+
+    def get_data(self) -> dict:
+        raise NotImplementedError()
+
+    def get_fields(self) -> List[str]:
+        """Get the fields requested by the client"""
+        requested = self.request.GET.get(self.fields_kwarg)
+        if not requested:
+            return list(self.default_fields or self.fields)
+
+        names = [name.strip() for name in requested.split(",") if name.strip()]
+        unknown = [
+            name
+            for name in names
+            if name not in self.fields and name not in self.computed_fields
+        ]
+        if unknown:
+            raise BadRequest("Unknown fields: {}".format(", ".join(unknown)))
+        return names
+
+    def select_fields(self, queryset, fields: List[str]):
+        """Annotate & select only the given fields from ``queryset``"""
+        annotations = []
+        for name in fields:
+            if name in self.computed_fields:
+                annotation_name = "_api_{}".format(name)
+                annotate = getattr(self, self.computed_fields[name])
+                queryset = annotate(queryset, annotation_name)
+                annotations.append(annotation_name)
+        lookups = {self.fields[name] for name in fields if name in self.fields}
+        return queryset.values(*lookups, *annotations)
+
+    def to_json(self, values: dict, fields: List[str]) -> dict:
+        """Convert a row from ``select_fields()`` into the API representation"""
+        data = {}
+        for name in fields:
+            if name in self.fields:
+                data[name] = values[self.fields[name]]
+            else:
+                data[name] = values["_api_{}".format(name)]
+        return data
+
+    def render_json(self, data, status=200) -> HttpResponse:
+        content = json.dumps(data, cls=DjangoJSONEncoder)
+        return HttpResponse(content, status=status, content_type="application/json")
+
+
+class JsonApiListMixin(JsonApiMixin):
+    """Base class for paginated JSON API list views"""
+
+    paginate_by = 100
+    max_paginate_by = 1000
+    keyset_ordering = ("-pk",)
+    cursor_kwarg = "cursor"
+
+    def get_queryset(self):
+        raise NotImplementedError()
+
+    def get_paginate_by(self) -> int:
+        try:
+            paginate_by = int(self.request.GET.get("limit") or self.paginate_by)
+        except ValueError:
+            raise BadRequest("Invalid limit")
+        return max(1, min(paginate_by, self.max_paginate_by))
+
+    def get_data(self) -> dict:
+        fields = self.get_fields()
+        paginator = KeysetPaginator(
+            self.select_fields(self.get_queryset(), fields),
+            per_page=self.get_paginate_by(),
+            ordering=self.keyset_ordering,
+        )
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg) or None)
+        except InvalidCursor as e:
+            raise BadRequest(str(e))
+
+        return {
+            "results": [self.to_json(values, fields) for values in page],
+            "next": page.next_cursor,
+            "previous": page.previous_cursor,
+        }
+
+
+class AccountBalancesApiView(JsonApiListMixin, View):
+    """List accounts and their balances
+
+    Balances are calculated using :meth:`AccountQuerySet.with_balances()
+    <hordak.models.AccountQuerySet.with_balances>`. Filter the accounts
+    using ``?parent=<uuid>`` (direct children only) or ``?leaf=1``.
+    """
+
+    fields = {
+        "uuid": "uuid",
+        "name": "name",
+        "full_code": "full_code",
+        "type": "type",
+        "currencies": "currencies",
+        "is_bank_account": "is_bank_account",
+        "parent": "parent__uuid",
+    }
+    computed_fields = {"balance": "annotate_balance"}
+    default_fields = ["uuid", "name", "full_code", "type", "balance"]
+    keyset_ordering = ("tree_id", "lft")
+
+    def get_queryset(self):
+        queryset = Account.objects.all()
+        if self.parent:
+            queryset = queryset.filter(parent=self.parent)
+        if self.request.GET.get("leaf"):
+            queryset = queryset.filter(children__isnull=True)
+        return queryset
+
+    @cached_property
+    def parent(self) -> Optional[Account]:
+        parent_uuid = self.request.GET.get("parent")
+        return _get_or_404(Account, parent_uuid) if parent_uuid else None
+
+    def get_watermark_account(self):
+        return self.parent
+
+    def annotate_balance(self, queryset, name):
+        return queryset.with_balances(to_field_name=name, raw=True)
+
+    def to_json(self, values, fields):
+        data = super(AccountBalancesApiView, self).to_json(values, fields)
+        if "balance" in data:
+            data["balance"] = _balance_to_json(data["balance"])
+        return data
+
+
+class LegsApiView(JsonApiListMixin, View):
+    """List transaction legs, most recent first
+
+    Filter the legs using ``?account=<uuid>``. The ``account_balance`` field
+    (the account balance following each leg) is only calculated when requested.
+    """
+
+    fields = {
+        "uuid": "uuid",
+        "transaction": "transaction__uuid",
+        "date": "transaction__date",
+        "account": "account__uuid",
+        "account_full_code": "account__full_code",
+        "debit": "debit",
+        "credit": "credit",
+        "currency": "currency",
+        "description": "description",
+    }
+    computed_fields = {"account_balance": "annotate_account_balance"}
+    keyset_ordering = ("-transaction__date", "-transaction_id", "-pk")
+
+    def get_queryset(self):
+        queryset = Leg.objects.all()
+        if self.account:
+            queryset = queryset.filter(account=self.account)
+        return queryset
+
+    @cached_property
+    def account(self) -> Optional[Account]:
+        account_uuid = self.request.GET.get("account")
+        return _get_or_404(Account, account_uuid) if account_uuid else None
+
+    def get_watermark_account(self):
+        return self.account
+
+    def annotate_account_balance(self, queryset, name):
+        balance = GetBalance(
+            F("account_id"),
+            as_of=F("transaction__date"),
+            as_of_leg_id=F("id"),
+            raw=True,
+        )
+        return queryset.annotate(**{name: balance})
+
+    def to_json(self, values, fields):
+        data = super(LegsApiView, self).to_json(values, fields)
+        if "account_balance" in data:
+            data["account_balance"] = _balance_to_json(data["account_balance"])
+        return data
+
+
+class TransactionApiView(JsonApiMixin, View):
+    """Get a single transaction and its legs
+
+    Field selection (``?fields=``) applies to the transaction's legs.
+    """
+
+    fields = {
+        "uuid": "uuid",
+        "account": "account__uuid",
+        "account_full_code": "account__full_code",
+        "debit": "debit",
+        "credit": "credit",
+        "currency": "currency",
+        "description": "description",
+    }
+
+    def get_data(self) -> dict:
+        transaction = _get_or_404(Transaction, self.kwargs["uuid"])
+        fields = self.get_fields()
+        legs = self.select_fields(transaction.legs.order_by("pk"), fields)
+        return {
+            "uuid": transaction.uuid,
+            "date": transaction.date,
+            "timestamp": transaction.timestamp,
+            "description": transaction.description,
+            "legs": [self.to_json(values, fields) for values in legs],
+        }
+
+
+def _get_or_404(model, uuid):
+    try:
+        return get_object_or_404(model, uuid=uuid)
+    except ValidationError:
+        # Invalid UUID
+        raise Http404("{} not found".format(model._meta.verbose_name))
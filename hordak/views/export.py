@@ -0,0 +1,101 @@
+from django.contrib.auth.mixins import LoginRequiredMixin
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
+from django.views.generic import View
+from django.views.generic.detail import SingleObjectMixin
+
+from hordak.forms.export import ExportForm
+from hordak.models import Account
+from hordak.utilities.export import (
+    EXPORT_FORMATS,
+    iter_account_statement,
+    iter_general_ledger,
+)
+from hordak.views.mixins import LedgerETagMixin
+
+
+class StreamingExportMixin(object):
+    """Stream the rows returned by ``get_rows()`` as CSV or NDJSON
+
+    The format and date range are taken from the ``format``, ``date_from``
+    and ``date_to`` query parameters (see :class:`hordak.forms.export.ExportForm`).
+    Rows are read from the database in chunks of ``chunk_size``, so the response
+    can be of any size without a corresponding increase in memory use.
+    """
+
+    chunk_size = 2000
+    filename = "export"
+
+    def get(self, request, *args, **kwargs):
+        form = ExportForm(request.GET)
+        if not form.is_valid():
+            return HttpResponseBadRequest(form.errors.as_text())
+
+        serialise, content_type, extension = EXPORT_FORMATS[form.cleaned_data["format"]]
+        rows = self.get_rows(
+            date_from=form.cleaned_data["date_from"],
+            date_to=form.cleaned_data["date_to"],
+            chunk_size=self.chunk_size,
+        )
+        response = StreamingHttpResponse(serialise(rows), content_type=content_type)
+        response["Content-Disposition"] = 'attachment; filename="{}.{}"'.format(
+            self.get_filename(), extension
+        )
+        return response
+
+    def get_filename(self):
+        return self.filename
+
+    def get_rows(self, date_from, date_to, chunk_size):
+        raise NotImplementedError()
+
+
+class AccountStatementExportView(
+    LoginRequiredMixin, LedgerETagMixin, StreamingExportMixin, SingleObjectMixin, View
+):
+    """Export the statement for an account, including opening, running & closing balances
+
+    Examples:
+
+        .. code-block:: python
+
+            urlpatterns = [
+                ...
+                path(
+                    'accounts/<str:uuid>/export/',
+                    AccountStatementExportView.as_view(),
+                    name='accounts_export',
+                ),
+            ]
+
+        Then request ``/accounts/<uuid>/export/?format=ndjson&date_from=2024-01-01``
+    """
+
+    model = Account
+    slug_field = "uuid"
+    slug_url_kwarg = "uuid"
+
+    def get(self, request, *args, **kwargs):
+        self.object = self.get_object()
+        return super(AccountStatementExportView, self).get(request, *args, **kwargs)
+
+    def get_watermark_account(self):
+        return self.get_object(Account.objects.all())
+
+    def get_filename(self):
+        return "statement-{}".format(self.object.full_code or self.object.uuid)
+
+    def get_rows(self, date_from, date_to, chunk_size):
+        return iter_account_statement(self.object, date_from, date_to, chunk_size)
+
+
+class GeneralLedgerExportView(
+    LoginRequiredMixin, LedgerETagMixin, StreamingExportMixin, View
+):
+    """Export the general ledger for all leaf accounts"""
+
+    filename = "general-ledger"
+
+    def get_rows(self, date_from, date_to, chunk_size):
+        return iter_general_ledger(
+            date_from=date_from, date_to=date_to, chunk_size=chunk_size
+        )
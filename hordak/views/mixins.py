@@ -0,0 +1,103 @@
+import hashlib
+
+from django.http import Http404
+from django.utils import translation
+from django.utils.cache import get_conditional_response, patch_vary_headers
+
+from hordak.utilities.pagination import InvalidCursor, KeysetPaginator
+from hordak.utilities.watermark import get_watermark
+
+
+class KeysetPaginationMixin(object):
+    """Use keyset pagination in a ``ListView``
+
+    Pages are selected using the ``cursor`` query parameter rather than
+    a page number. The page is available in the template context as ``page_obj``,
+    and provides ``next_cursor`` & ``previous_cursor`` for building links.
+
+    Set ``keyset_ordering`` to the (unique) ordering of the list. For best
+    performance this should match an index on the table.
+
+    Set ``show_estimated_count`` to display an approximate number of rows
+    (see :func:`hordak.utilities.pagination.estimate_count()`).
+
+    Any other query parameters (such as filters) are kept when changing page, except
+    those listed in ``pagination_exclude_params``.
+    """
+
+    paginator_class = KeysetPaginator
+    paginate_by = 50
+    keyset_ordering = ("-date", "-pk")
+    cursor_kwarg = "cursor"
+    show_estimated_count = False
+    pagination_exclude_params = ()
+
+    def get_keyset_ordering(self):
+        return self.keyset_ordering
+
+    def get_cursor(self):
+        return self.request.GET.get(self.cursor_kwarg) or None
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = self.paginator_class(
+            queryset, per_page=page_size, ordering=self.get_keyset_ordering()
+        )
+        try:
+            page = paginator.page(self.get_cursor())
+        except InvalidCursor as e:
+            raise Http404(str(e))
+        return paginator, page, page.object_list, page.has_other_pages()
+
+    def get_pagination_querystring(self) -> str:
+        """Get the query parameters to keep when changing page, followed by ``&`` if not empty"""
+        params = self.request.GET.copy()
+        for name in (self.cursor_kwarg,) + tuple(self.pagination_exclude_params):
+            params.pop(name, None)
+        return params.urlencode() + "&" if params else ""
+
+    def get_context_data(self, **kwargs):
+        kwargs.setdefault("show_estimated_count", self.show_estimated_count)
+        kwargs.setdefault("pagination_querystring", self.get_pagination_querystring())
+        return super(KeysetPaginationMixin, self).get_context_data(**kwargs)
+
+
+class LedgerETagMixin(object):
+    """Respond with ``304 Not Modified`` if the ledger has not changed
+
+    The ``ETag`` is derived from the ledger watermark (see
+    :mod:`hordak.utilities.watermark`), so can be checked without querying
+    any legs. Override ``get_watermark_account()`` to only consider changes to
+    the tree containing a specific account.
+
+    The ``ETag`` also varies with the requesting user, the full request path and the
+    active language (as amounts & dates are formatted for the locale). Responses are
+    marked ``Vary: Accept-Language, Cookie`` accordingly.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return super(LedgerETagMixin, self).dispatch(request, *args, **kwargs)
+
+        etag = self.get_etag()
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = super(LedgerETagMixin, self).dispatch(request, *args, **kwargs)
+            if response.status_code == 200:
+                response.setdefault("ETag", etag)
+        patch_vary_headers(response, ("Accept-Language", "Cookie"))
+        return response
+
+    def get_watermark_account(self):
+        """Get the account whose tree should be watched for changes, or None for all accounts"""
+        return None
+
+    def get_etag(self) -> str:
+        parts = [
+            get_watermark(self.get_watermark_account()),
+            self.request.user.pk,
+            self.request.get_full_path(),
+            self.request.headers.get("X-Requested-With"),
+            translation.get_language(),
+        ]
+        digest = hashlib.md5(repr(parts).encode()).hexdigest()
+        return '"{}"'.format(digest)
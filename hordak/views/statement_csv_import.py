@@ -1,14 +1,15 @@
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import HttpResponseRedirect
+from django.http import HttpResponseRedirect, JsonResponse
 from django.urls import reverse
-from django.views.generic import CreateView, DetailView, UpdateView
+from django.views.generic import CreateView, DetailView, UpdateView, View
+from django.views.generic.detail import SingleObjectMixin
 
 from hordak.forms.statement_csv_import import (
     TransactionCsvImportColumnFormSet,
     TransactionCsvImportForm,
 )
 from hordak.models import TransactionCsvImport
-from hordak.resources import StatementLineResource
+from hordak.resources import BulkStatementLineResource
 
 
 class CreateImportView(LoginRequiredMixin, CreateView):
@@ -50,7 +51,10 @@ class SetupImportView(LoginRequiredMixin, UpdateView):
             return self.form_invalid(form, formset)
 
     def form_valid(self, form, formset):
-        self.object = form.save()
+        # Any previous dry run checked the old column mapping & date format
+        self.object = form.save(commit=False)
+        self.object.reset()
+        self.object.save()
         formset.instance = self.object
         formset.save()
         return HttpResponseRedirect(self.get_success_url())
@@ -65,33 +69,45 @@ class SetupImportView(LoginRequiredMixin, UpdateView):
 
 
 class AbstractImportView(LoginRequiredMixin, DetailView):
+    """Start a dry run or import, and display its progress & result
+
+    The import is run using ``TransactionCsvImport.start()``, so may run in the
+    background depending upon the ``HORDAK_TASK_RUNNER`` setting. While it runs
+    the page polls :class:`ImportStatusView` and reloads once the import finishes.
+    If the import stopped without finishing (see ``TransactionCsvImport.is_stale``)
+    then it can be started again.
+    """
+
     context_object_name = "transaction_import"
     slug_url_kwarg = "uuid"
     slug_field = "uuid"
     model = TransactionCsvImport
     dry_run = True
+    resource_class = BulkStatementLineResource
+    #: Number of rows to read from the file & import at a time
+    batch_size = 1000
 
     def get(self, request, **kwargs):
         return super(AbstractImportView, self).get(request, **kwargs)
 
     def post(self, request, **kwargs):
         transaction_import = self.get_object()
-        resource = StatementLineResource(
-            date_format=transaction_import.date_format,
-            statement_import=transaction_import.hordak_import,
-        )
-
-        self.result = resource.import_data(
-            dataset=transaction_import.get_dataset(),
+        transaction_import.start(
             dry_run=self.dry_run,
-            use_transactions=True,
-            collect_failed_rows=True,
+            resource_class="{}.{}".format(
+                self.resource_class.__module__, self.resource_class.__qualname__
+            ),
+            batch_size=self.batch_size,
         )
         return self.get(request, **kwargs)
 
     def get_context_data(self, **kwargs):
+        running = self.object.is_running
         return super(AbstractImportView, self).get_context_data(
-            result=getattr(self, "result", None), **kwargs
+            running=running,
+            stale=self.object.is_stale,
+            result=None if running else self.object.get_result(self.dry_run),
+            **kwargs,
         )
 
 
@@ -103,3 +119,22 @@ class DryRunImportView(AbstractImportView):
 class ExecuteImportView(AbstractImportView):
     template_name = "hordak/statement_import/import_execute.html"
     dry_run = False
+
+
+class ImportStatusView(LoginRequiredMixin, SingleObjectMixin, View):
+    """Get the state & progress of an import as JSON"""
+
+    slug_url_kwarg = "uuid"
+    slug_field = "uuid"
+    model = TransactionCsvImport
+
+    def get(self, request, **kwargs):
+        transaction_import = self.get_object()
+        return JsonResponse(
+            {
+                "state": transaction_import.state,
+                "progress": transaction_import.progress,
+                "totals": transaction_import.result.get("totals", {}),
+                "finished": not transaction_import.is_running,
+            }
+        )
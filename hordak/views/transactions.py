@@ -2,14 +2,14 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.db import transaction as db_transaction
 from django.http import Http404
 from django.http.response import HttpResponseRedirect
-from django.shortcuts import get_object_or_404
 from django.urls import reverse, reverse_lazy
 from django.views import View
 from django.views.generic import CreateView, DeleteView, ListView
 
 from hordak.forms import LegFormSet, SimpleTransactionForm, TransactionForm
-from hordak.forms.transactions import CurrencyTradeForm
+from hordak.forms.transactions import CurrencyTradeForm, StatementLineFilterForm
 from hordak.models import Leg, StatementLine, Transaction
+from hordak.views.mixins import KeysetPaginationMixin, LedgerETagMixin
 
 
 class TransactionCreateView(LoginRequiredMixin, CreateView):
@@ -44,22 +44,40 @@ class CurrencyTradeView(LoginRequiredMixin, CreateView):
         return kwargs
 
 
-class TransactionsListView(LoginRequiredMixin, ListView):
-    """View for listing transactions"""
+class TransactionsListView(
+    LoginRequiredMixin, LedgerETagMixin, KeysetPaginationMixin, ListView
+):
+    """View for listing transactions
+
+    Uses keyset pagination, see :class:`hordak.views.mixins.KeysetPaginationMixin`.
+    """
 
     model = Transaction
     template_name = "hordak/transactions/transaction_list.html"
     context_object_name = "transactions"
-    ordering = ["-date", "-pk"]
+    keyset_ordering = ("-date", "-pk")
+    show_estimated_count = True
+
+    def get_queryset(self):
+        return Transaction.objects.prefetch_related("legs__account")
+
 
+class LegsListView(
+    LoginRequiredMixin, LedgerETagMixin, KeysetPaginationMixin, ListView
+):
+    """View for listing legs
 
-class LegsListView(LoginRequiredMixin, ListView):
-    """View for listing legs"""
+    Uses keyset pagination, see :class:`hordak.views.mixins.KeysetPaginationMixin`.
+    """
 
     model = Leg
     template_name = "hordak/transactions/leg_list.html"
     context_object_name = "legs"
-    ordering = ["-transaction__date", "-transaction__pk", "-pk"]
+    keyset_ordering = ("-transaction__date", "-transaction_id", "-pk")
+    show_estimated_count = True
+
+    def get_queryset(self):
+        return Leg.objects.select_related("transaction", "account")
 
 
 class TransactionDeleteView(LoginRequiredMixin, DeleteView):
@@ -71,11 +89,18 @@ class TransactionDeleteView(LoginRequiredMixin, DeleteView):
     success_url = reverse_lazy("hordak:accounts_list")
 
 
-class TransactionsReconcileView(LoginRequiredMixin, ListView):
+class TransactionsReconcileView(LoginRequiredMixin, KeysetPaginationMixin, ListView):
     """Handle rendering and processing in the reconciliation view
 
     Note that this only extends ListView, and we implement the form
-    processing functionality manually.
+    processing functionality manually. Statement lines are paginated using
+    keyset pagination (see :class:`hordak.views.mixins.KeysetPaginationMixin`).
+
+    Only unreconciled lines are listed, which uses the partial indexes on
+    ``StatementLine``. Lines can be filtered by bank account & date using the
+    ``account``, ``date_from`` and ``date_to`` query parameters, and reconciled
+    lines included using ``reconciled=on`` (see
+    :class:`hordak.forms.transactions.StatementLineFilterForm`).
 
     Examples:
 
@@ -92,12 +117,31 @@ class TransactionsReconcileView(LoginRequiredMixin, ListView):
     model = StatementLine
     paginate_by = 50
     context_object_name = "statement_lines"
-    ordering = ["-date", "-pk"]
+    keyset_ordering = ("-date", "-pk")
+    pagination_exclude_params = ("reconcile",)
     success_url = reverse_lazy("hordak:accounts_list")
 
+    def get_filter_form(self):
+        if not hasattr(self, "filter_form"):
+            self.filter_form = StatementLineFilterForm(self.request.GET)
+        return self.filter_form
+
+    def get_queryset(self):
+        queryset = StatementLine.objects.select_related(
+            "statement_import__bank_account"
+        )
+        queryset = self.get_filter_form().filter(queryset)
+        # Reconciled lines show the legs of their transaction
+        return queryset.prefetch_related("transaction__legs__account")
+
     def get_uuid(self):
         return self.request.POST.get("reconcile") or self.request.GET.get("reconcile")
 
+    def get_cursor(self):
+        # The reconcile form submits the cursor of the current page
+        cursor = self.request.POST.get(self.cursor_kwarg)
+        return cursor or super(TransactionsReconcileView, self).get_cursor()
+
     def get_object(self, queryset=None):
         # Get any Statement Line instance that was specified
         if queryset is None:
@@ -167,8 +211,9 @@ class TransactionsReconcileView(LoginRequiredMixin, ListView):
             leg_formset.save()
 
             # Now point the statement line to the new transaction
-            self.object.transaction = transaction
-            self.object.save()
+            StatementLine.objects.filter(pk=self.object.pk).update(
+                transaction=transaction
+            )
 
         self.object = None
         return self.render_to_response(self.get_context_data())
@@ -189,6 +234,7 @@ class TransactionsReconcileView(LoginRequiredMixin, ListView):
                 leg_formset=self.get_leg_formset(),
                 reconcile_line=self.object,
             )
+        kwargs.setdefault("filter_form", self.get_filter_form())
         return super(TransactionsReconcileView, self).get_context_data(**kwargs)
 
     def get_transaction_form(self):
@@ -204,7 +250,13 @@ class TransactionsReconcileView(LoginRequiredMixin, ListView):
 
 
 class UnreconcileView(LoginRequiredMixin, View):
+    """Unreconcile a statement line, deleting its transaction
+
+    See :meth:`hordak.models.StatementLineQuerySet.unreconcile()`.
+    """
+
     def post(self, request, uuid):
-        statement_line = get_object_or_404(StatementLine, uuid=uuid)
-        statement_line.transaction.delete()
+        lines = StatementLine.objects.filter(uuid=uuid)
+        if not lines.unreconcile() and not lines.exists():
+            raise Http404("No statement line found for {}".format(uuid))
         return HttpResponseRedirect(reverse("hordak:transactions_reconcile"))